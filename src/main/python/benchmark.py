@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import struct
+import time
+
+from magnet.telemetry_analysis import percentile
+from protocol.constants import CMD_VIA_GET_PROTOCOL_VERSION, CMD_VIA_GET_KEYBOARD_VALUE, VIA_SWITCH_MATRIX_STATE, \
+    CMD_VIA_KEYMAP_GET_BUFFER, BUFFER_FETCH_CHUNK
+from util import MSG_LEN
+
+DEFAULT_ITERATIONS = 1000
+DEFAULT_MIX = ["protocol", "matrix", "keymap"]
+
+# every request is one report out and one report back
+BYTES_PER_REQUEST = 2 * MSG_LEN
+
+
+def bench_protocol(keyboard, iteration):
+    return struct.pack("B", CMD_VIA_GET_PROTOCOL_VERSION)
+
+
+def bench_matrix(keyboard, iteration):
+    return struct.pack("BB", CMD_VIA_GET_KEYBOARD_VALUE, VIA_SWITCH_MATRIX_STATE)
+
+
+def bench_keymap(keyboard, iteration):
+    # walk through the keymap buffer the way reload_keymap does
+    size = max(keyboard.layers * keyboard.rows * keyboard.cols * 2, 1)
+    offset = (iteration * BUFFER_FETCH_CHUNK) % size
+    return struct.pack(">BHB", CMD_VIA_KEYMAP_GET_BUFFER, offset, min(size - offset, BUFFER_FETCH_CHUNK))
+
+
+BENCHMARK_COMMANDS = {
+    "protocol": bench_protocol,
+    "matrix": bench_matrix,
+    "keymap": bench_keymap,
+}
+
+# Vial firmware answers these with id_unhandled while the keyboard is locked
+LOCKED_COMMANDS = {"matrix"}
+
+
+class BenchmarkResult:
+
+    """ Latencies and errors of every command in a benchmark run """
+
+    def __init__(self, mix):
+        self.mix = mix
+        self.latencies = {name: [] for name in mix}
+        self.errors = {name: 0 for name in mix}
+        self.elapsed = 0
+        self.notes = []
+
+    def requests(self):
+        return sum(len(x) for x in self.latencies.values()) + sum(self.errors.values())
+
+    def throughput(self):
+        """ Bytes per second moved by the successful requests """
+        if self.elapsed <= 0:
+            return 0
+        return sum(len(x) for x in self.latencies.values()) * BYTES_PER_REQUEST / self.elapsed
+
+    def report(self):
+        lines = ["{:<10} {:>7} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "command", "count", "errors", "p50 ms", "p90 ms", "p99 ms", "max ms", "mean ms")]
+        for name in self.mix:
+            ordered = sorted(self.latencies[name])
+            count = len(ordered) + self.errors[name]
+            mean = sum(ordered) / len(ordered) if ordered else 0
+            lines.append("{:<10} {:>7} {:>6.1f}% {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                name, count, 100 * self.errors[name] / count if count else 0,
+                percentile(ordered, 50) * 1000, percentile(ordered, 90) * 1000, percentile(ordered, 99) * 1000,
+                (ordered[-1] if ordered else 0) * 1000, mean * 1000))
+        requests = self.requests()
+        lines.append("")
+        lines.append("{} requests in {:.2f} s, {:.1f} requests/s, {:.0f} bytes/s, {:.1f}% errors".format(
+            requests, self.elapsed, requests / self.elapsed if self.elapsed > 0 else 0, self.throughput(),
+            100 * sum(self.errors.values()) / requests if requests else 0))
+        lines.extend(self.notes)
+        return "\n".join(lines)
+
+
+def run_benchmark(keyboard, iterations=DEFAULT_ITERATIONS, mix=None, progress=None):
+    """
+    Sends iterations requests through keyboard.usb_send, cycling through the command names in mix;
+    repeat a name to give it more weight. Commands the firmware refuses while locked are left out on a
+    locked keyboard. progress(done) is called every so often when given
+    """
+    mix = list(mix or DEFAULT_MIX)
+    for name in mix:
+        if name not in BENCHMARK_COMMANDS:
+            raise ValueError("unknown benchmark command {}, expected one of {}".format(
+                name, ", ".join(BENCHMARK_COMMANDS)))
+
+    notes = []
+    skipped = [name for name in dict.fromkeys(mix) if name in LOCKED_COMMANDS]
+    if skipped and keyboard.get_unlock_status() != 1:
+        mix = [name for name in mix if name not in LOCKED_COMMANDS]
+        if not mix:
+            raise ValueError("{} can only be benchmarked on an unlocked keyboard".format(", ".join(skipped)))
+        notes.append("Skipped {}: the keyboard is locked, unlock it to include them".format(", ".join(skipped)))
+
+    result = BenchmarkResult(list(dict.fromkeys(mix)))
+    result.notes = notes
+    start = time.perf_counter()
+    for x in range(iterations):
+        if progress is not None and x % 50 == 0:
+            progress(x)
+        name = mix[x % len(mix)]
+        msg = BENCHMARK_COMMANDS[name](keyboard, x // len(mix))
+        t = time.perf_counter()
+        try:
+            data = keyboard.usb_send(keyboard.dev, msg, retries=1)
+        except (RuntimeError, OSError):
+            result.errors[name] += 1
+            continue
+        latency = time.perf_counter() - t
+        # VIA echoes the command back, anything else means the report got lost or mixed up
+        if data[0] != msg[0]:
+            result.errors[name] += 1
+        else:
+            result.latencies[name].append(latency)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def benchmark_main(args):
+    """ Headless entry point: benchmark the first Vial keyboard found, args are [iterations [command,command,...]] """
+    from util import find_vial_devices
+    from vial_device import VialKeyboard
+
+    iterations = int(args[0]) if args else DEFAULT_ITERATIONS
+    mix = args[1].split(",") if len(args) > 1 else None
+
+    devices = [dev for dev in find_vial_devices({"definitions": {}}) if isinstance(dev, VialKeyboard)]
+    if not devices:
+        print("No Vial keyboard found")
+        return 1
+    device = devices[0]
+    print("Benchmarking {}, {} iterations".format(device.title(), iterations))
+    device.open()
+    try:
+        print(run_benchmark(device.keyboard, iterations, mix).report())
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        device.close()
+    return 0
@@ -0,0 +1,99 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import threading
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QVBoxLayout, QHBoxLayout, QLabel, QPlainTextEdit, QSpinBox, \
+    QLineEdit, QPushButton, QProgressBar
+
+from benchmark import run_benchmark, DEFAULT_ITERATIONS, DEFAULT_MIX, BENCHMARK_COMMANDS
+from util import tr
+
+
+class BenchmarkDialog(QDialog):
+
+    """ Runs the benchmark on a worker thread, the dialog can't be closed until it is done """
+
+    progress_signal = pyqtSignal(object)
+    complete_signal = pyqtSignal(object)
+
+    def __init__(self, device):
+        super().__init__()
+
+        self.keyboard = device.keyboard
+        self.running = False
+        self.progress_signal.connect(self.on_progress)
+        self.complete_signal.connect(self.on_complete)
+        self.setWindowTitle("Benchmark {}".format(device.title()))
+
+        self.iterations = QSpinBox()
+        self.iterations.setRange(1, 1000000)
+        self.iterations.setValue(DEFAULT_ITERATIONS)
+        self.mix = QLineEdit(",".join(DEFAULT_MIX))
+        self.mix.setToolTip(tr("Benchmark", "Commands to cycle through, repeat one to give it more weight: {}")
+                            .format(", ".join(BENCHMARK_COMMANDS)))
+        self.run_btn = QPushButton(tr("Benchmark", "Run"))
+        self.run_btn.clicked.connect(self.on_run)
+
+        options = QHBoxLayout()
+        options.addWidget(QLabel(tr("Benchmark", "Iterations:")))
+        options.addWidget(self.iterations)
+        options.addWidget(QLabel(tr("Benchmark", "Commands:")))
+        options.addWidget(self.mix)
+        options.addWidget(self.run_btn)
+
+        self.progress = QProgressBar()
+
+        font = QFont("monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        self.textarea = QPlainTextEdit()
+        self.textarea.setReadOnly(True)
+        self.textarea.setFont(font)
+        self.textarea.setMinimumWidth(600)
+
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.Ok)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        self.layout = QVBoxLayout()
+        self.layout.addLayout(options)
+        self.layout.addWidget(self.progress)
+        self.layout.addWidget(self.textarea)
+        self.layout.addWidget(self.buttonBox)
+        self.setLayout(self.layout)
+
+    def set_running(self, running):
+        self.running = running
+        self.run_btn.setEnabled(not running)
+        self.buttonBox.setEnabled(not running)
+        self.iterations.setEnabled(not running)
+        self.mix.setEnabled(not running)
+
+    def on_progress(self, done):
+        self.progress.setValue(done)
+
+    def on_complete(self, text):
+        self.progress.setValue(self.progress.maximum())
+        self.textarea.setPlainText(text)
+        self.set_running(False)
+
+    def on_run(self):
+        mix = [name.strip() for name in self.mix.text().split(",") if name.strip()]
+        iterations = self.iterations.value()
+        self.progress.setMaximum(iterations)
+        self.progress.setValue(0)
+        self.set_running(True)
+        threading.Thread(target=lambda: self.benchmark_thread(iterations, mix)).start()
+
+    def benchmark_thread(self, iterations, mix):
+        # usb_send is synchronized, so the rest of the app can keep talking to the keyboard meanwhile
+        try:
+            text = run_benchmark(self.keyboard, iterations, mix, self.progress_signal.emit).report()
+        except (ValueError, RuntimeError, OSError) as e:
+            text = str(e)
+        self.complete_signal.emit(text)
+
+    def reject(self):
+        # Escape or the window close button
+        if not self.running:
+            super().reject()
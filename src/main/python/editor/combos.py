@@ -7,7 +7,7 @@ from protocol.constants import VIAL_PROTOCOL_DYNAMIC
 from widgets.key_widget import KeyWidget
 from vial_device import VialKeyboard
 from editor.basic_editor import BasicEditor
-from widgets.tab_widget_keycodes import TabWidgetWithKeycodes
+from widgets.tab_widget_keycodes import LazyTabWidgetWithKeycodes
 
 
 class ComboEntryUI(QObject):
@@ -78,23 +78,20 @@ class Combos(BasicEditor):
         super().__init__()
         self.keyboard = None
 
-        self.combo_entries = []
-        self.combo_entries_available = []
-        self.tabs = TabWidgetWithKeycodes()
-        for x in range(128):
-            entry = ComboEntryUI(x)
-            entry.key_changed.connect(self.on_key_changed)
-            self.combo_entries_available.append(entry)
+        # entry pages are only built once their tab is opened
+        self.tabs = LazyTabWidgetWithKeycodes(self.create_entry, lambda x: str(x + 1))
 
         self.addWidget(self.tabs)
 
+    def create_entry(self, idx):
+        entry = ComboEntryUI(idx)
+        entry.load(self.keyboard.combo_get(idx))
+        entry.key_changed.connect(self.on_key_changed)
+        return entry
+
     def rebuild_ui(self):
-        while self.tabs.count() > 0:
-            self.tabs.removeTab(0)
-        self.combo_entries = self.combo_entries_available[:self.keyboard.combo_count]
-        for x, e in enumerate(self.combo_entries):
-            self.tabs.addTab(e.widget(), str(x + 1))
-        for x, e in enumerate(self.combo_entries):
+        self.tabs.set_count(self.keyboard.combo_count)
+        for x, e in self.tabs.built_entries():
             e.load(self.keyboard.combo_get(x))
 
     def rebuild(self, device):
@@ -109,5 +106,6 @@ class Combos(BasicEditor):
                 and self.device.keyboard.combo_count > 0)
 
     def on_key_changed(self):
-        for x, e in enumerate(self.combo_entries):
-            self.keyboard.combo_set(x, self.combo_entries[x].save())
+        for x, e in self.tabs.built_entries():
+            self.keyboard.combo_stage(x, e.save())
+        self.keyboard.combo_commit()
@@ -274,7 +274,8 @@ class FirmwareFlasher(BasicEditor):
             self.device = found
             self.log("Restoring saved layout...")
             QCoreApplication.processEvents()
-            found.keyboard.restore_layout(self.layout_restore)
+            for table, idx in found.keyboard.restore_layout(self.layout_restore):
+                self.log("Failed to restore {} entry {}".format(table, idx))
             found.keyboard.lock()
             found.close()
             self.log("Done!")
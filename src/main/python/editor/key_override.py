@@ -10,7 +10,7 @@ from protocol.key_override import KeyOverrideOptions, KeyOverrideEntry
 from vial_device import VialKeyboard
 from editor.basic_editor import BasicEditor
 from widgets.checkbox_no_padding import CheckBoxNoPadding
-from widgets.tab_widget_keycodes import TabWidgetWithKeycodes
+from widgets.tab_widget_keycodes import LazyTabWidgetWithKeycodes
 
 
 class ModsUI(QWidget):
@@ -264,23 +264,20 @@ class KeyOverride(BasicEditor):
         super().__init__()
         self.keyboard = None
 
-        self.key_override_entries = []
-        self.key_override_entries_available = []
-        self.tabs = TabWidgetWithKeycodes()
-        for x in range(128):
-            entry = KeyOverrideEntryUI(x)
-            entry.changed.connect(self.on_change)
-            self.key_override_entries_available.append(entry)
+        # entry pages are only built once their tab is opened
+        self.tabs = LazyTabWidgetWithKeycodes(self.create_entry, lambda x: str(x + 1))
 
         self.addWidget(self.tabs)
 
+    def create_entry(self, idx):
+        entry = KeyOverrideEntryUI(idx)
+        entry.load(self.keyboard.key_override_get(idx))
+        entry.changed.connect(self.on_change)
+        return entry
+
     def rebuild_ui(self):
-        while self.tabs.count() > 0:
-            self.tabs.removeTab(0)
-        self.key_override_entries = self.key_override_entries_available[:self.keyboard.key_override_count]
-        for x, e in enumerate(self.key_override_entries):
-            self.tabs.addTab(e.widget(), str(x + 1))
-        for x, e in enumerate(self.key_override_entries):
+        self.tabs.set_count(self.keyboard.key_override_count)
+        for x, e in self.tabs.built_entries():
             e.load(self.keyboard.key_override_get(x))
 
     def rebuild(self, device):
@@ -295,5 +292,6 @@ class KeyOverride(BasicEditor):
                 and self.device.keyboard.key_override_count > 0)
 
     def on_change(self):
-        for x, e in enumerate(self.key_override_entries):
-            self.keyboard.key_override_set(x, self.key_override_entries[x].save())
+        for x, e in self.tabs.built_entries():
+            self.keyboard.key_override_stage(x, e.save())
+        self.keyboard.key_override_commit()
@@ -141,8 +141,12 @@ class KeymapEditor(BasicEditor):
                                        QMessageBox.Yes | QMessageBox.No)
             if ret != QMessageBox.Yes:
                 return
-        self.keyboard.restore_layout(data)
+        failed = self.keyboard.restore_layout(data)
         self.refresh_layer_display()
+        if failed:
+            QMessageBox.warning(self.widget(), "",
+                                tr("KeymapEditor", "The keyboard rejected some entries of the saved layout:\n") +
+                                "\n".join("{} {}".format(table, idx) for table, idx in failed))
 
     def on_any_keycode(self):
         if self.container.active_key is None:
@@ -1,14 +1,14 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 import sys
 
-from PyQt5.QtWidgets import QPushButton, QHBoxLayout, QWidget, QLabel
+from PyQt5.QtWidgets import QPushButton, QHBoxLayout, QWidget, QLabel, QSpinBox, QMessageBox
 
 from editor.basic_editor import BasicEditor
-from macro.macro_action import ActionText, ActionTap, ActionDown, ActionUp
-from macro.macro_action_ui import ui_action
-from macro.macro_key import KeyString, KeyDown, KeyUp, KeyTap
-from macro.macro_optimizer import macro_optimize
+from macro.macro_action import ActionText, ActionTap, ActionDown, ActionUp, ActionDelay, SS_DELAY_MAX
+from macro.macro_key import KeyString, KeyDown, KeyUp, KeyTap, KeyDelay
+from macro.macro_optimizer import macro_optimize, insert_delays
 from macro.macro_tab import MacroTab
+from protocol.constants import VIAL_PROTOCOL_ADVANCED_MACROS
 from unlocker import Unlocker
 from util import tr
 from vial_device import VialKeyboard
@@ -39,7 +39,7 @@ class MacroRecorder(BasicEditor):
             self.recorder = WindowsRecorder()
 
         if self.recorder:
-            self.recorder.keystroke.connect(self.on_keystroke)
+            self.recorder.keystrokes.connect(self.on_keystrokes)
             self.recorder.stopped.connect(self.on_stop)
         self.recording = False
 
@@ -50,9 +50,24 @@ class MacroRecorder(BasicEditor):
 
         self.lbl_memory = QLabel()
 
+        # pauses at least this long while recording are kept as delays, 0 records no delays at all
+        self.lbl_delay_threshold = QLabel(tr("MacroRecorder", "Record pauses longer than"))
+        self.delay_threshold = QSpinBox()
+        self.delay_threshold.setMinimum(0)
+        self.delay_threshold.setMaximum(SS_DELAY_MAX)
+        self.delay_threshold.setSingleStep(50)
+        self.delay_threshold.setValue(250)
+        self.delay_threshold.setSuffix(" ms")
+        self.delay_threshold.setSpecialValueText(tr("MacroRecorder", "Off"))
+
         buttons = QHBoxLayout()
         buttons.addWidget(self.lbl_memory)
         buttons.addStretch()
+        buttons.addWidget(self.lbl_delay_threshold)
+        buttons.addWidget(self.delay_threshold)
+        btn_compact = QPushButton(tr("MacroRecorder", "Optimize memory"))
+        btn_compact.clicked.connect(self.on_compact)
+        buttons.addWidget(btn_compact)
         self.btn_save = QPushButton(tr("MacroRecorder", "Save"))
         self.btn_save.clicked.connect(self.on_save)
         btn_revert = QPushButton(tr("MacroRecorder", "Revert"))
@@ -88,6 +103,11 @@ class MacroRecorder(BasicEditor):
         for x, w in enumerate(self.macro_tab_w[:self.keyboard.macro_count]):
             self.tabs.addTab(w, "")
 
+        # delays need the advanced macro format
+        record_delays = self.recorder is not None and self.keyboard.vial_protocol >= VIAL_PROTOCOL_ADVANCED_MACROS
+        self.lbl_delay_threshold.setVisible(record_delays)
+        self.delay_threshold.setVisible(record_delays)
+
         # deserialize macros that came from keyboard
         self.deserialize(self.keyboard.macro)
 
@@ -127,22 +147,28 @@ class MacroRecorder(BasicEditor):
 
         self.recording_tab.post_record()
 
-        self.keystrokes = macro_optimize(self.keystrokes)
+        threshold = self.delay_threshold.value()
+        if threshold > 0 and self.keyboard.vial_protocol >= VIAL_PROTOCOL_ADVANCED_MACROS:
+            keystrokes = insert_delays(self.keystrokes, threshold)
+        else:
+            keystrokes = [k for _, k in self.keystrokes]
+        keystrokes = macro_optimize(keystrokes)
         actions = []
-        for k in self.keystrokes:
+        for k in keystrokes:
             if isinstance(k, KeyString):
                 actions.append(ActionText(k.string))
+            elif isinstance(k, KeyDelay):
+                actions.append(ActionDelay(k.delay))
             else:
                 cls = {KeyDown: ActionDown, KeyUp: ActionUp, KeyTap: ActionTap}[type(k)]
                 actions.append(cls([k.keycode.qmk_id]))
 
         # merge: i.e. replace multiple instances of KeyDown with a single multi-key ActionDown, etc
         actions = self.keyboard.macro_deserialize(self.keyboard.macro_serialize(actions))
-        for act in actions:
-            self.recording_tab.add_action(ui_action[type(act)](self.recording_tab.container, act))
+        self.recording_tab.append_actions(actions)
 
-    def on_keystroke(self, keystroke):
-        self.keystrokes.append(keystroke)
+    def on_keystrokes(self, keystrokes):
+        self.keystrokes.extend(keystrokes)
 
     def on_change(self):
         if self.suppress_change:
@@ -165,9 +191,9 @@ class MacroRecorder(BasicEditor):
         self.suppress_change = True
         macros = self.keyboard.macros_deserialize(data)
         for macro, tab in zip(macros, self.macro_tabs[:self.keyboard.macro_count]):
+            # rows are only created once the tab is shown and scrolled to
             tab.clear()
-            for act in macro:
-                tab.add_action(ui_action[type(act)](tab.container, act))
+            tab.append_actions(macro)
         self.suppress_change = False
 
     def on_revert(self):
@@ -175,6 +201,18 @@ class MacroRecorder(BasicEditor):
         self.deserialize(self.keyboard.macro)
         self.on_change()
 
+    def on_compact(self):
+        plan = self.keyboard.macro_compaction_plan(self.serialize())
+        if plan.saved() <= 0:
+            QMessageBox.information(self.widget(), "", tr("MacroRecorder", "Macros are already as small as they can be."))
+            return
+        if QMessageBox.question(self.widget(), "",
+                                tr("MacroRecorder", "Macros can be encoded in fewer bytes:") + "\n\n" + plan.report()
+                                + "\n\n" + tr("MacroRecorder", "Replace macros with the optimized version?"),
+                                QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+            self.deserialize(plan.data)
+            self.on_change()
+
     def on_save(self):
         Unlocker.unlock(self.device.keyboard)
         self.keyboard.set_macro(self.serialize())
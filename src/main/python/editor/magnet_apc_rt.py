@@ -1,13 +1,19 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
-from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QLabel, QSlider, QDoubleSpinBox, QCheckBox, QGridLayout, QProgressBar
+from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QLabel, QSlider, QDoubleSpinBox, QCheckBox, QGridLayout, QProgressBar, \
+    QFileDialog, QDialog, QComboBox, QInputDialog
 from PyQt5.QtCore import QSize, Qt, QCoreApplication, QTimer
 from PyQt5.QtGui import QPalette
 from PyQt5.QtWidgets import QApplication
 
-import math, struct
+import math, struct, sys
 
 from editor.basic_editor import BasicEditor
+from magnet.magnet_profile_store import MagnetProfileStore
+from magnet.magnet_telemetry import TelemetrySampler, TelemetryThread
+from protocol.magnet_profile import MagnetProfile
+from protocol.yr_mag import MAG_RECORD_APC, MAG_RECORD_RT_SW, MAG_RECORD_RT_RELEASE, MAG_RECORD_RT_PRESS
 from widgets.keyboard_widget import KeyboardWidget
+from widgets.telemetry_plot import TelemetryPlot, TELEMETRY_FULL_TRAVEL
 from util import tr, KeycodeDisplay
 from vial_device import VialKeyboard
 
@@ -42,8 +48,44 @@ class ApcRt(BasicEditor):
         self.keyboardWidget.clicked.connect(self.on_key_clicked)
         self.keyboardWidget.set_scale(2.3)
         self.keyboardWidget.magnet_text = True
+        self.keyboardWidget.multiselect = True
+
+        select_layout = QHBoxLayout()
+        select_layout.addStretch(1)
+        self.select_hint_lbl = QLabel(tr("ApcRt", "Ctrl+click or drag to select several keys"))
+        select_layout.addWidget(self.select_hint_lbl)
+        self.select_all_btn = QPushButton(tr("ApcRt", "Select all"))
+        self.select_all_btn.clicked.connect(self.keyboardWidget.select_all)
+        select_layout.addWidget(self.select_all_btn)
+        self.select_row_btn = QPushButton(tr("ApcRt", "Select row"))
+        self.select_row_btn.clicked.connect(self.on_select_row)
+        select_layout.addWidget(self.select_row_btn)
+        self.select_none_btn = QPushButton(tr("ApcRt", "Clear selection"))
+        self.select_none_btn.clicked.connect(self.keyboardWidget.deselect)
+        select_layout.addWidget(self.select_none_btn)
+        select_layout.addStretch(1)
+
+        profile_layout = QHBoxLayout()
+        profile_layout.addStretch(1)
+        profile_layout.addWidget(QLabel(tr("ApcRt", "Profile:")))
+        self.profile_cmb = QComboBox()
+        self.profile_cmb.setMinimumWidth(150)
+        self.profile_cmb.activated.connect(self.on_profile_activated)
+        profile_layout.addWidget(self.profile_cmb)
+        self.profile_save_btn = QPushButton(tr("ApcRt", "Save as..."))
+        self.profile_save_btn.clicked.connect(self.on_profile_save)
+        profile_layout.addWidget(self.profile_save_btn)
+        self.profile_delete_btn = QPushButton(tr("ApcRt", "Delete"))
+        self.profile_delete_btn.clicked.connect(self.on_profile_delete)
+        profile_layout.addWidget(self.profile_delete_btn)
+        self.profile_lbl = QLabel()
+        profile_layout.addWidget(self.profile_lbl)
+        profile_layout.addStretch(1)
+        self.profile_store = None
 
         layout = QVBoxLayout()
+        layout.addLayout(select_layout)
+        layout.addLayout(profile_layout)
         layout.addWidget(self.keyboardWidget)
         # layout.setAlignment(self.keyboardWidget, Qt.AlignCenter)
 
@@ -68,11 +110,24 @@ class ApcRt(BasicEditor):
         switch_show_layout.addLayout(show_pgb_layout)
         self.show_sw_lbl = QLabel(tr("Switch Travel: ", "Key travel: NAN"))
         switch_show_layout.addWidget(self.show_sw_lbl)
-        
-
+        self.telemetry_plot = TelemetryPlot()
+        switch_show_layout.addWidget(self.telemetry_plot)
+        self.telemetry_rate_lbl = QLabel()
+        switch_show_layout.addWidget(self.telemetry_rate_lbl)
+        self.heatmap_cbx = QCheckBox(tr("ApcRt", "Travel heatmap"))
+        self.heatmap_cbx.stateChanged.connect(self.on_heatmap_check)
+        switch_show_layout.addWidget(self.heatmap_cbx)
+        self.record_btn = QPushButton(tr("ApcRt", "Record..."))
+        self.record_btn.setCheckable(True)
+        self.record_btn.clicked.connect(self.on_record)
+        switch_show_layout.addWidget(self.record_btn)
+
+        # samples are taken by self.telemetry_thread, this timer only shows them
         self.show_sw_timer = QTimer()
-        self.show_sw_timer_interval = 200
+        self.show_sw_timer_interval = 33
         self.show_sw_timer.timeout.connect(self.show_sw_timer_cbk)
+        self.sampler = None
+        self.telemetry_thread = None
 
 
         apc_rt_layout = QGridLayout()
@@ -217,33 +272,113 @@ class ApcRt(BasicEditor):
     
     def show_sw_timer_cbk(self):
         if self.keyboardWidget.active_key is None:
-            self.show_sw_timer.stop()
+            self.stop_telemetry()
+            return
+        if self.telemetry_thread is None:
+            # no threads in the web build, sample from the UI instead
+            try:
+                self.sampler.sweep()
+            except Exception as e:
+                self.on_telemetry_failed(str(e))
+                return
+
+        key = (self.keyboardWidget.active_key.desc.row, self.keyboardWidget.active_key.desc.col)
+        sample = self.sampler.latest(key)
+        if sample is not None:
+            _, adc, travel = sample
+            self.switch_adc_lbl.setText("Current key adc: " + str(adc))
+            self.show_sw_pgb.setValue(travel)
+            self.show_sw_lbl.setText("Key travel: {:.2f}mm".format(min(travel * 0.02, 4.0)))
+            self.telemetry_rate_lbl.setText("Sample rate: {:.0f} Hz".format(self.sampler.rate(key)))
+
+        if self.heatmap_cbx.isChecked():
+            for widget in self.keyboardWidget.selected_keys():
+                sample = self.sampler.latest((widget.desc.row, widget.desc.col))
+                widget.setHeat(None if sample is None else sample[2] / TELEMETRY_FULL_TRAVEL)
+            self.keyboardWidget.update()
+        self.telemetry_plot.update()
+
+    def start_telemetry(self):
+        """ Starts sampling the selected keys, or changes which keys are sampled if already running """
+        if self.sampler is None:
+            return
+        keys = [(w.desc.row, w.desc.col) for w in self.keyboardWidget.selected_keys()]
+        if not keys:
+            self.stop_telemetry()
+            return
+        self.clear_heat()
+        self.sampler.set_keys(keys)
+        self.telemetry_plot.set_keys(keys)
+        if self.telemetry_thread is None and sys.platform != "emscripten":
+            self.telemetry_thread = TelemetryThread(self.sampler)
+            self.telemetry_thread.failed.connect(self.on_telemetry_failed)
+            self.telemetry_thread.start()
+        if not self.show_sw_timer.isActive():
+            self.show_sw_timer.start(self.show_sw_timer_interval)
+
+    def stop_telemetry(self):
+        self.show_sw_timer.stop()
+        if self.telemetry_thread is not None:
+            self.telemetry_thread.stop()
+            self.telemetry_thread = None
+        self.clear_heat()
+        self.stop_recording()
+
+    def on_record(self):
+        if not self.record_btn.isChecked():
+            self.stop_recording()
+            return
+
+        self.record_btn.setChecked(False)
+        if self.sampler is None or not self.keyboardWidget.selected_keys():
+            return
+        dialog = QFileDialog()
+        dialog.setDefaultSuffix("vmt")
+        dialog.setAcceptMode(QFileDialog.AcceptSave)
+        dialog.setNameFilters(["Vial magnet telemetry (*.vmt)"])
+        if dialog.exec_() != QDialog.Accepted:
             return
-        try:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            data = self.keyboard.get_adc(row, col)
-            txt = "Current key adc: " + str(data)
-            self.switch_adc_lbl.setText(txt)
-            data = self.keyboard.get_travel(row, col)
-            self.show_sw_pgb.setValue(data)
-            data = data*0.02
-            if data >= 4.0:
-                data = 4.0
-            txt = "Key travel: {:.2f}mm".format(data)
-            self.show_sw_lbl.setText(txt)
-        except:
-            print("excepttttttttttttttt")
-            self.show_sw_timer.stop()
-            self.switch_adc_lbl.setText("Current key adc: NAN")
-            self.show_sw_pgb.setValue(0)
-            self.show_sw_lbl.setText("Key travel: NAN")
+        self.sampler.start_recording(dialog.selectedFiles()[0],
+                                     (self.keyboard.top_deadband_lv, self.keyboard.bottom_deadband_lv))
+        self.record_btn.setChecked(True)
+        self.record_btn.setText(tr("ApcRt", "Stop recording"))
+        self.start_telemetry()
+
+    def stop_recording(self):
+        if self.sampler is not None:
+            sweeps = self.sampler.stop_recording()
+            if sweeps:
+                print("Magnet telemetry: recorded {} sweeps".format(sweeps))
+        self.record_btn.setChecked(False)
+        self.record_btn.setText(tr("ApcRt", "Record..."))
+
+    def on_telemetry_failed(self, error):
+        print("Magnet telemetry failed:", error)
+        self.stop_telemetry()
+        self.switch_adc_lbl.setText("Current key adc: NAN")
+        self.show_sw_pgb.setValue(0)
+        self.show_sw_lbl.setText("Key travel: NAN")
+        self.telemetry_rate_lbl.setText("")
+
+    def clear_heat(self):
+        for widget in self.keyboardWidget.widgets:
+            widget.setHeat(None)
+        self.keyboardWidget.update()
+
+    def on_heatmap_check(self):
+        if not self.heatmap_cbx.isChecked():
+            self.clear_heat()
 
     def rebuild(self, device):
         super().rebuild(device)
+        self.stop_telemetry()
+        self.sampler = None
         if self.valid():
             self.keyboard = device.keyboard
+            self.sampler = TelemetrySampler(self.keyboard)
+            self.telemetry_plot.set_sampler(self.sampler)
             self.keyboardWidget.set_keys(self.keyboard.keys, self.keyboard.encoders)
+            self.load_profiles()
         self.keyboardWidget.setEnabled(self.valid())
         self.reset_keyboard_widget()
 
@@ -251,18 +386,18 @@ class ApcRt(BasicEditor):
         # Check if vial protocol is v3 or later
         return isinstance(self.device, VialKeyboard) and \
                (self.device.keyboard and self.device.keyboard.keyboard_type == "magnet") and \
-               ((self.device.keyboard.cols // 8 + 1) * self.device.keyboard.rows <= 28)
+               self.device.keyboard.matrix_state_supported()
 
     def reset_keyboard_widget(self):
 
         self.keyboardWidget.update_layout()
 
         for widget in self.keyboardWidget.widgets:
-            apc_rt_display(widget, self.keyboard.mag_apc[(widget.desc.row, widget.desc.col)],
-                        self.keyboard.mag_rt[(widget.desc.row, widget.desc.col)])
+            apc_rt_display(widget, self.keyboard.mag.get_apc(widget.desc.row, widget.desc.col),
+                        self.keyboard.mag.get_rt(widget.desc.row, widget.desc.col))
             widget.setOn(False)
-        
-        self.show_sw_timer.stop()
+
+        self.stop_telemetry()
         
         if self.keyboard is not None:
             self.top_deadband_sld.blockSignals(True)
@@ -284,21 +419,81 @@ class ApcRt(BasicEditor):
         self.keyboardWidget.update()
         self.keyboardWidget.updateGeometry()
 
-    def reset_active_apcrt(self):
-        if self.keyboardWidget.active_key is None:
+    def load_profiles(self):
+        """ Merges profiles saved on disk with ones the keyboard got from a restored layout """
+        self.profile_store = MagnetProfileStore(self.keyboard.keyboard_id)
+        self.profile_store.merge(self.keyboard.magnet_profiles)
+        self.refresh_profiles()
+
+    def refresh_profiles(self, current=None):
+        self.profile_cmb.clear()
+        self.profile_cmb.addItems(sorted(self.keyboard.magnet_profiles))
+        if current is not None:
+            self.profile_cmb.setCurrentText(current)
+        self.profile_delete_btn.setEnabled(self.profile_cmb.count() > 0)
+
+    def on_profile_activated(self):
+        profile = self.keyboard.magnet_profiles.get(self.profile_cmb.currentText())
+        if profile is None:
+            return
+        changed = self.keyboard.apply_magnet_profile(profile)
+        self.profile_lbl.setText(tr("ApcRt", "{} settings changed").format(changed))
+        self.reset_keyboard_widget()
+        self.on_key_clicked()
+
+    def on_profile_save(self):
+        name, ok = QInputDialog.getText(self.widget(), "", tr("ApcRt", "Profile name:"),
+                                        text=self.profile_cmb.currentText())
+        name = name.strip()
+        if not ok or not name:
+            return
+        self.keyboard.magnet_profiles[name] = MagnetProfile.from_keyboard(name, self.keyboard)
+        self.profile_store.save(self.keyboard.magnet_profiles)
+        self.refresh_profiles(name)
+
+    def on_profile_delete(self):
+        name = self.profile_cmb.currentText()
+        if name not in self.keyboard.magnet_profiles:
             return
+        del self.keyboard.magnet_profiles[name]
+        self.profile_store.save(self.keyboard.magnet_profiles)
+        self.refresh_profiles()
 
-        widget = self.keyboardWidget.active_key
-        row = widget.desc.row
-        col = widget.desc.col
-        apc_rt_display(widget, self.keyboard.mag_apc[(row,col)], self.keyboard.mag_rt[(row,col)])
+    def reset_active_apcrt(self):
+        for widget in self.keyboardWidget.selected_keys():
+            row = widget.desc.row
+            col = widget.desc.col
+            apc_rt_display(widget, self.keyboard.mag.get_apc(row, col), self.keyboard.mag.get_rt(row, col))
+        active = self.keyboardWidget.active_key
+        if active is not None:
+            self.telemetry_plot.set_apc(self.keyboard.mag.get_apc(active.desc.row, active.desc.col))
         self.keyboardWidget.update()
 
+    def apply_selected(self, field, val):
+        """ Sets one field of the magnet settings on every selected key, written to the keyboard as one batch """
+        records = dict()
+        for widget in self.keyboardWidget.selected_keys():
+            row = widget.desc.row
+            col = widget.desc.col
+            record = list(self.keyboard.mag.get_key_record(row, col))
+            record[field] = val
+            records[(row, col)] = record
+        if records:
+            self.keyboard.apply_magnet(records)
+
+    def on_select_row(self):
+        """ Extends the selection to every key on the matrix row of the active key """
+        active = self.keyboardWidget.active_key
+        if active is None:
+            return
+        row = [w for w in self.keyboardWidget.widgets if w.desc.row == active.desc.row and w != active]
+        self.keyboardWidget.set_selection([active] + row)
+
     def activate(self):
         self.reset_keyboard_widget()
 
     def deactivate(self):
-        pass
+        self.stop_telemetry()
 
     def on_key_clicked(self):
         """ Called when a key on the keyboard widget is clicked """
@@ -308,8 +503,8 @@ class ApcRt(BasicEditor):
         row = self.keyboardWidget.active_key.desc.row
         col = self.keyboardWidget.active_key.desc.col
 
-        apc = self.keyboard.mag_apc.get((row, col), 100)
-        rt  = self.keyboard.mag_rt.get((row,col), [1, 50, 50])
+        apc = self.keyboard.mag.get_apc(row, col)
+        rt  = self.keyboard.mag.get_rt(row, col)
 
         self.apc_sld.blockSignals(True)
         self.apc_dpb.blockSignals(True)
@@ -321,11 +516,9 @@ class ApcRt(BasicEditor):
 
         self.apc_sld.setValue(apc)
         self.apc_dpb.setValue(apc*0.02)
+        self.telemetry_plot.set_apc(apc)
 
-        if self.show_sw_timer.isActive():
-            self.show_sw_timer.stop()
-        
-        self.show_sw_timer.start(self.show_sw_timer_interval)
+        self.start_telemetry()
 
         if rt[0] > 0:
             self.rt_cbx.setCheckState(Qt.Checked)
@@ -368,10 +561,9 @@ class ApcRt(BasicEditor):
             if self.keyboardWidget.active_key is not None:
                 row = self.keyboardWidget.active_key.desc.row
                 col = self.keyboardWidget.active_key.desc.col
-                rt = self.keyboard.mag_rt.get((row, col), [1,50,50])
+                rt = self.keyboard.mag.get_rt(row, col)
+                self.apply_selected(MAG_RECORD_RT_SW, 1)
                 if rt[0] == 0:
-                    #self.keyboard.amk_rt[(row,col)] = 1
-                    self.keyboard.apply_rt(row, col, [1, rt[1], rt[2]])
                     self.rt_sld.setValue(rt[1])
                     self.rt_dpb.setValue(rt[1]*0.02)
                     self.rt_set_sld.setValue(rt[2])
@@ -380,9 +572,9 @@ class ApcRt(BasicEditor):
             if self.keyboardWidget.active_key is not None:
                 row = self.keyboardWidget.active_key.desc.row
                 col = self.keyboardWidget.active_key.desc.col
-                rt = self.keyboard.mag_rt.get((row, col), [1,50,50])
+                rt = self.keyboard.mag.get_rt(row, col)
+                self.apply_selected(MAG_RECORD_RT_SW, 0)
                 if rt[0] > 0:
-                    self.keyboard.apply_rt(row, col, [0, rt[1], rt[2]])
                     self.rt_sld.setValue(rt[1])
                     self.rt_dpb.setValue(rt[1]*0.02)
                     self.rt_set_sld.setValue(rt[2])
@@ -435,10 +627,7 @@ class ApcRt(BasicEditor):
         self.apc_dpb.blockSignals(True)
         val = int(self.apc_dpb.value()/0.02)
         self.apc_sld.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            self.keyboard.apply_apc(row, col, val)
+        self.apply_selected(MAG_RECORD_APC, val)
         self.apc_dpb.blockSignals(False)
         self.apc_sld.blockSignals(False)
         self.reset_active_apcrt()
@@ -449,10 +638,7 @@ class ApcRt(BasicEditor):
         self.apc_dpb.blockSignals(True)
         val = self.apc_sld.value()*0.02
         self.apc_dpb.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            self.keyboard.apply_apc(row, col, self.apc_sld.value())
+        self.apply_selected(MAG_RECORD_APC, self.apc_sld.value())
         self.apc_dpb.blockSignals(False)
         self.apc_sld.blockSignals(False)
         self.reset_active_apcrt()
@@ -462,11 +648,7 @@ class ApcRt(BasicEditor):
         self.rt_dpb.blockSignals(True)
         val = int(self.rt_dpb.value()/0.02)
         self.rt_sld.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            vals = self.keyboard.mag_rt[(row, col)]
-            self.keyboard.apply_rt(row, col, [vals[0], val, vals[2]])
+        self.apply_selected(MAG_RECORD_RT_RELEASE, val)
         self.rt_dpb.blockSignals(False)
         self.rt_sld.blockSignals(False)
         self.reset_active_apcrt()
@@ -476,11 +658,7 @@ class ApcRt(BasicEditor):
         self.rt_dpb.blockSignals(True)
         val = self.rt_sld.value()*0.02
         self.rt_dpb.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            vals = self.keyboard.mag_rt[(row, col)]
-            self.keyboard.apply_rt(row, col, [vals[0], self.rt_sld.value(), vals[2]])
+        self.apply_selected(MAG_RECORD_RT_RELEASE, self.rt_sld.value())
         self.rt_dpb.blockSignals(False)
         self.rt_sld.blockSignals(False)
         self.reset_active_apcrt()
@@ -490,11 +668,7 @@ class ApcRt(BasicEditor):
         self.rt_set_dpb.blockSignals(True)
         val = int(self.rt_set_dpb.value()/0.02)
         self.rt_set_sld.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            vals = self.keyboard.mag_rt[(row, col)]
-            self.keyboard.apply_rt(row, col, [vals[0], vals[1], val])
+        self.apply_selected(MAG_RECORD_RT_PRESS, val)
         self.rt_set_dpb.blockSignals(False)
         self.rt_set_sld.blockSignals(False)
         self.reset_active_apcrt()
@@ -504,11 +678,7 @@ class ApcRt(BasicEditor):
         self.rt_set_dpb.blockSignals(True)
         val = self.rt_set_sld.value()*0.02
         self.rt_set_dpb.setValue(val)
-        if self.keyboardWidget.active_key is not None:
-            row = self.keyboardWidget.active_key.desc.row
-            col = self.keyboardWidget.active_key.desc.col
-            vals = self.keyboard.mag_rt[(row, col)]
-            self.keyboard.apply_rt(row, col, [vals[0], vals[1], self.rt_set_sld.value()])
+        self.apply_selected(MAG_RECORD_RT_PRESS, self.rt_set_sld.value())
         self.rt_set_dpb.blockSignals(False)
         self.rt_set_sld.blockSignals(False)
         self.reset_active_apcrt()
\ No newline at end of file
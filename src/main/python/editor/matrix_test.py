@@ -1,16 +1,63 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
-from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QLabel
+from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QLabel, QFileDialog, QDialog
 from PyQt5.QtCore import Qt, QTimer
 
-import math
+import time
+from collections import defaultdict
 
 from editor.basic_editor import BasicEditor
+from matrix_event_log import MatrixEventLog
 from protocol.constants import VIAL_PROTOCOL_MATRIX_TESTER
 from widgets.keyboard_widget import KeyboardWidget
 from util import tr
 from vial_device import VialKeyboard
 from unlocker import Unlocker
 
+# poll interval in ms while switches are changing and once the keyboard has been idle for POLL_IDLE_AFTER seconds,
+# the idle one still has to be shorter than a quick tap so the first key after a pause isn't missed
+POLL_FAST = 20
+POLL_IDLE = 35
+POLL_IDLE_AFTER = 1.0
+# poll interval in ms while waiting for the keyboard to be unlocked
+POLL_LOCKED = 100
+# how often, in seconds, to check whether the keyboard got locked
+UNLOCK_CHECK_INTERVAL = 1.0
+# how often, in seconds, to refresh the event log summary, at most
+SUMMARY_INTERVAL = 0.25
+
+
+class MatrixState:
+
+    """ Last switch matrix frame, as VIA reports it: every row is row_size bytes with column 0 in the last byte """
+
+    def __init__(self, rows, cols):
+        self.row_size = (cols + 7) // 8
+        self.size = rows * self.row_size
+        # byte offset -> [(row, col, bit mask)] of the switches stored in that byte
+        self.bits = defaultdict(list)
+        for row in range(rows):
+            for col in range(cols):
+                offset = row * self.row_size + self.row_size - 1 - col // 8
+                self.bits[offset].append((row, col, 1 << (col % 8)))
+        self.reset()
+
+    def reset(self):
+        self.frame = bytes(self.size)
+
+    def update(self, frame):
+        """ Takes a new frame, returns (row, col, pressed) for every switch that changed since the last one """
+        frame = bytes(frame)
+        changed = []
+        if frame != self.frame:
+            for offset, (old, new) in enumerate(zip(self.frame, frame)):
+                if old != new:
+                    diff = old ^ new
+                    for row, col, mask in self.bits[offset]:
+                        if diff & mask:
+                            changed.append((row, col, bool(new & mask)))
+        self.frame = frame
+        return changed
+
 
 class MatrixTest(BasicEditor):
 
@@ -39,9 +86,31 @@ class MatrixTest(BasicEditor):
         btn_layout.addWidget(self.reset_btn)
         self.addLayout(btn_layout)
 
+        log_layout = QHBoxLayout()
+        log_layout.addStretch()
+        self.log_lbl = QLabel()
+        log_layout.addWidget(self.log_lbl)
+        self.export_log_btn = QPushButton(tr("MatrixTest", "Export log..."))
+        self.export_log_btn.clicked.connect(self.on_export_log)
+        log_layout.addWidget(self.export_log_btn)
+        self.export_stats_btn = QPushButton(tr("MatrixTest", "Export statistics..."))
+        self.export_stats_btn.clicked.connect(self.on_export_stats)
+        log_layout.addWidget(self.export_stats_btn)
+        self.clear_log_btn = QPushButton(tr("MatrixTest", "Clear log"))
+        self.clear_log_btn.clicked.connect(self.clear_log)
+        log_layout.addWidget(self.clear_log_btn)
+        self.addLayout(log_layout)
+
         self.keyboard = None
         self.device = None
         self.polling = False
+        self.matrix = None
+        self.event_log = None
+        self.summary_updated = 0
+        self.key_widgets = dict()
+        self.unlocked = None
+        self.unlock_checked = 0
+        self.last_change = 0
 
         self.timer = QTimer()
         self.timer.timeout.connect(self.matrix_poller)
@@ -57,31 +126,50 @@ class MatrixTest(BasicEditor):
             self.keyboard = device.keyboard
 
             self.keyboardWidget.set_keys(self.keyboard.keys, self.keyboard.encoders)
+            self.matrix = MatrixState(self.keyboard.rows, self.keyboard.cols)
+            self.event_log = MatrixEventLog(self.keyboard.rows, self.keyboard.cols)
+            self.log_lbl.setText("")
+            self.key_widgets = defaultdict(list)
+            for w in self.keyboardWidget.common_widgets + self.keyboardWidget.widgets_for_layout:
+                if w.desc.row is not None and w.desc.col is not None:
+                    self.key_widgets[(w.desc.row, w.desc.col)].append(w)
+            self.unlocked = None
         self.keyboardWidget.setEnabled(self.valid())
 
     def valid(self):
         # Check if vial protocol is v3 or later
         return isinstance(self.device, VialKeyboard) and \
                (self.device.keyboard and self.device.keyboard.vial_protocol >= VIAL_PROTOCOL_MATRIX_TESTER) and \
-               ((self.device.keyboard.cols // 8 + 1) * self.device.keyboard.rows <= 28)
+               self.device.keyboard.matrix_state_supported()
 
     def reset_keyboard_widget(self):
         # reset keyboard widget
         for w in self.keyboardWidget.widgets:
             w.setPressed(False)
             w.setOn(False)
+        # forget the last frame too, so switches which are still held light up again on the next poll
+        if self.matrix is not None:
+            self.matrix.reset()
 
         self.keyboardWidget.update_layout()
         self.keyboardWidget.update()
         self.keyboardWidget.updateGeometry()
 
+    def check_unlocked(self):
+        """ Asks the keyboard whether it is unlocked at most once per UNLOCK_CHECK_INTERVAL """
+        now = time.monotonic()
+        if self.unlocked is None or now - self.unlock_checked >= UNLOCK_CHECK_INTERVAL:
+            self.unlocked = self.keyboard.get_unlock_status(3)
+            self.unlock_checked = now
+        return self.unlocked
+
     def matrix_poller(self):
         if not self.valid():
             self.timer.stop()
             return
 
         try:
-            unlocked = self.keyboard.get_unlock_status(3)
+            unlocked = self.check_unlocked()
         except (RuntimeError, ValueError):
             self.timer.stop()
             return
@@ -89,65 +177,80 @@ class MatrixTest(BasicEditor):
         if not unlocked:
             self.unlock_btn.show()
             self.unlock_lbl.show()
+            self.timer.setInterval(POLL_LOCKED)
             return
 
         # we're unlocked, so hide unlock button and label
         self.unlock_btn.hide()
         self.unlock_lbl.hide()
 
-        # Get size for matrix
-        rows = self.keyboard.rows
-        cols = self.keyboard.cols
-        # Generate 2d array of matrix
-        matrix = [[None] * cols for x in range(rows)]
-
-        # Get matrix data from keyboard
+        # Get matrix data from keyboard, large matrices take several reports
         try:
-            data = self.keyboard.matrix_poll()
+            data = self.keyboard.matrix_state()
         except (RuntimeError, ValueError):
             self.timer.stop()
             return
 
-        # Calculate the amount of bytes belong to 1 row, each bit is 1 key, so per 8 keys in a row,
-        # a byte is needed for the row.
-        row_size = math.ceil(cols / 8)
-
-        for row in range(rows):
-            # Make slice of bytes for the row (skip first 2 bytes, they're for VIAL)
-            row_data_start = 2 + (row * row_size)
-            row_data_end = row_data_start + row_size
-            row_data = data[row_data_start:row_data_end]
-
-            # Get each bit representing pressed state for col
-            for col in range(cols):
-                # row_data is array of bytes, calculate in which byte the col is located
-                col_byte = len(row_data) - 1 - math.floor(col / 8)
-                # since we select a single byte as slice of byte, mod 8 to get nth pos of byte
-                col_mod = (col % 8)
-                # write to matrix array
-                matrix[row][col] = (row_data[col_byte] >> col_mod) & 1
-
-        # write matrix state to keyboard widget
-        for w in self.keyboardWidget.widgets:
-            if w.desc.row is not None and w.desc.col is not None:
-                row = w.desc.row
-                col = w.desc.col
-
-                if row < len(matrix) and col < len(matrix[row]):
-                    w.setPressed(matrix[row][col])
-                    if matrix[row][col]:
-                        w.setOn(True)
+        changed = self.matrix.update(data)
+        now = time.monotonic()
+        if changed:
+            self.event_log.record(now, changed)
+        if now - self.summary_updated >= SUMMARY_INTERVAL:
+            self.log_lbl.setText(self.event_log.summary(now))
+            self.summary_updated = now
+
+        # write changed switches to keyboard widget, repainting only those keys
+        for row, col, pressed in changed:
+            for w in self.key_widgets.get((row, col), []):
+                w.setPressed(pressed)
+                if pressed:
+                    w.setOn(True)
+                self.keyboardWidget.update_key(w)
+
+        # poll fast while switches are changing, back off once the keyboard has been idle for a while
+        if changed:
+            self.last_change = now
+        self.timer.setInterval(POLL_FAST if now - self.last_change < POLL_IDLE_AFTER else POLL_IDLE)
+
+    def clear_log(self):
+        if self.keyboard is not None:
+            self.event_log = MatrixEventLog(self.keyboard.rows, self.keyboard.cols)
+            self.log_lbl.setText("")
+
+    def csv_path(self):
+        dialog = QFileDialog()
+        dialog.setDefaultSuffix("csv")
+        dialog.setAcceptMode(QFileDialog.AcceptSave)
+        dialog.setNameFilters(["CSV (*.csv)"])
+        if dialog.exec_() == QDialog.Accepted:
+            return dialog.selectedFiles()[0]
+        return None
+
+    def on_export_log(self):
+        if self.event_log is None:
+            return
+        path = self.csv_path()
+        if path is not None:
+            self.event_log.export_csv(path)
 
-        self.keyboardWidget.update_layout()
-        self.keyboardWidget.update()
-        self.keyboardWidget.updateGeometry()
+    def on_export_stats(self):
+        if self.event_log is None:
+            return
+        path = self.csv_path()
+        if path is not None:
+            self.event_log.export_stats_csv(path, time.monotonic())
 
     def unlock(self):
         Unlocker.unlock(self.keyboard)
+        self.unlocked = None
 
     def activate(self):
         self.grabber.grabKeyboard()
-        self.timer.start(20)
+        # layout options may have changed while another tab was open
+        self.keyboardWidget.update_layout()
+        self.unlocked = None
+        self.last_change = time.monotonic()
+        self.timer.start(POLL_FAST)
 
     def deactivate(self):
         self.grabber.releaseKeyboard()
@@ -10,7 +10,7 @@ from tabbed_keycodes import TabbedKeycodes
 from util import tr
 from vial_device import VialKeyboard
 from editor.basic_editor import BasicEditor
-from widgets.tab_widget_keycodes import TabWidgetWithKeycodes
+from widgets.tab_widget_keycodes import LazyTabWidgetWithKeycodes
 
 
 class TapDanceEntryUI(QObject):
@@ -104,14 +104,8 @@ class TapDance(BasicEditor):
         super().__init__()
         self.keyboard = None
 
-        self.tap_dance_entries = []
-        self.tap_dance_entries_available = []
-        self.tabs = TabWidgetWithKeycodes()
-        for x in range(128):
-            entry = TapDanceEntryUI(x)
-            entry.key_changed.connect(self.on_key_changed)
-            entry.timing_changed.connect(self.on_timing_changed)
-            self.tap_dance_entries_available.append(entry)
+        # entry pages are only built once their tab is opened
+        self.tabs = LazyTabWidgetWithKeycodes(self.create_entry)
 
         self.addWidget(self.tabs)
         buttons = QHBoxLayout()
@@ -124,22 +118,26 @@ class TapDance(BasicEditor):
         buttons.addWidget(btn_revert)
         self.addLayout(buttons)
 
+    def create_entry(self, idx):
+        entry = TapDanceEntryUI(idx)
+        entry.load(self.keyboard.tap_dance_get(idx))
+        entry.key_changed.connect(self.on_key_changed)
+        entry.timing_changed.connect(self.on_timing_changed)
+        return entry
+
     def rebuild_ui(self):
-        while self.tabs.count() > 0:
-            self.tabs.removeTab(0)
-        self.tap_dance_entries = self.tap_dance_entries_available[:self.keyboard.tap_dance_count]
-        for x, e in enumerate(self.tap_dance_entries):
-            self.tabs.addTab(e.widget(), str(x))
+        self.tabs.set_count(self.keyboard.tap_dance_count)
         self.reload_ui()
 
     def reload_ui(self):
-        for x, e in enumerate(self.tap_dance_entries):
+        for x, e in self.tabs.built_entries():
             e.load(self.keyboard.tap_dance_get(x))
         self.update_modified_state()
 
     def on_save(self):
-        for x, e in enumerate(self.tap_dance_entries):
-            self.keyboard.tap_dance_set(x, self.tap_dance_entries[x].save())
+        for x, e in self.tabs.built_entries():
+            self.keyboard.tap_dance_stage(x, e.save())
+        self.keyboard.tap_dance_commit()
         self.update_modified_state()
 
     def on_revert(self):
@@ -163,8 +161,8 @@ class TapDance(BasicEditor):
     def update_modified_state(self):
         """ Update indication of which tabs are modified, and keep Save button enabled only if it's needed """
         has_changes = False
-        for x, e in enumerate(self.tap_dance_entries):
-            if self.tap_dance_entries[x].save() != self.keyboard.tap_dance_get(x):
+        for x, e in self.tabs.built_entries():
+            if e.save() != self.keyboard.tap_dance_get(x):
                 has_changes = True
                 self.tabs.setTabText(x, "{}*".format(x))
             else:
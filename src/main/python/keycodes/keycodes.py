@@ -10,10 +10,16 @@ from keycodes.keycodes_v6 import keycodes_v6
 
 class Keycode:
 
+    __slots__ = ["qmk_id", "label", "tooltip", "masked", "printable", "alias"]
+
     masked_keycodes = set()
     recorder_alias_to_keycode = dict()
     qmk_id_to_keycode = dict()
     protocol = 0
+    # integer keycode -> qmk_id, only valid until keycodes are recreated
+    serialize_cache = dict()
+    # bumped every time keycodes are recreated, lets callers tell their cached labels are stale
+    generation = 0
 
     def __init__(self, qmk_id, label, tooltip=None, masked=False, printable=None, recorder_alias=None, alias=None):
         self.qmk_id = qmk_id
@@ -86,14 +92,14 @@ class Keycode:
         return cls.deserialize(qmk_id) < 0x00FF
 
     @classmethod
-    def label(cls, qmk_id):
+    def label_for(cls, qmk_id):
         keycode = cls.find_outer_keycode(qmk_id)
         if keycode is None:
             return qmk_id
         return keycode.label
 
     @classmethod
-    def tooltip(cls, qmk_id):
+    def tooltip_for(cls, qmk_id):
         keycode = cls.find_outer_keycode(qmk_id)
         if keycode is None:
             return None
@@ -105,6 +111,13 @@ class Keycode:
     @classmethod
     def serialize(cls, code):
         """ Converts integer keycode to string """
+        qmk_id = cls.serialize_cache.get(code)
+        if qmk_id is None:
+            qmk_id = cls.serialize_cache[code] = cls.serialize_uncached(code)
+        return qmk_id
+
+    @classmethod
+    def serialize_uncached(cls, code):
         if cls.protocol == 6:
             masked = keycodes_v6.masked
         else:
@@ -782,6 +795,8 @@ def recreate_keycodes():
                     KEYCODES_TAP_DANCE + KEYCODES_MACRO + KEYCODES_USER + KEYCODES_HIDDEN + KEYCODES_MIDI)
     KEYCODES_MAP.clear()
     RAWCODES_MAP.clear()
+    Keycode.serialize_cache.clear()
+    Keycode.generation += 1
     for keycode in KEYCODES:
         KEYCODES_MAP[keycode.qmk_id.replace("(kc)", "")] = keycode
         RAWCODES_MAP[Keycode.deserialize(keycode.qmk_id)] = keycode
@@ -2,8 +2,9 @@
 
 # Based on https://github.com/ijprest/kle-serial
 # & see https://github.com/ijprest/kle-serial/pull/1
+import hashlib
 import json
-from copy import copy
+from collections import OrderedDict
 
 
 class KeyDefaults:
@@ -15,6 +16,13 @@ class KeyDefaults:
 
 class Key:
 
+    __slots__ = ["color", "labels", "textColor", "textSize", "default", "x", "y", "width", "height", "x2", "y2",
+                 "width2", "height2", "rotation_x", "rotation_y", "rotation_angle", "decal", "ghost", "stepped", "nub",
+                 "profile", "sm", "sb", "st",
+                 # not part of KLE, filled in from the labels by whoever interprets the layout
+                 "row", "col", "encoder_idx", "encoder_dir", "layout_index", "layout_option",
+                 "__weakref__"]
+
     def __init__(self):
         self.color = "#cccccc"
         self.labels = []
@@ -41,6 +49,51 @@ class Key:
         self.sb = ""
         self.st = ""
 
+        self.row = self.col = None
+        self.encoder_idx = self.encoder_dir = None
+        self.layout_index = self.layout_option = -1
+
+    def clone(self):
+        """ Shallow copy, several times faster than copy.copy on a slotted class """
+        key = Key.__new__(Key)
+        key.color = self.color
+        key.labels = self.labels
+        key.textColor = self.textColor
+        key.textSize = self.textSize
+        key.default = self.default
+        key.x = self.x
+        key.y = self.y
+        key.width = self.width
+        key.height = self.height
+        key.x2 = self.x2
+        key.y2 = self.y2
+        key.width2 = self.width2
+        key.height2 = self.height2
+        key.rotation_x = self.rotation_x
+        key.rotation_y = self.rotation_y
+        key.rotation_angle = self.rotation_angle
+        key.decal = self.decal
+        key.ghost = self.ghost
+        key.stepped = self.stepped
+        key.nub = self.nub
+        key.profile = self.profile
+        key.sm = self.sm
+        key.sb = self.sb
+        key.st = self.st
+        key.row = self.row
+        key.col = self.col
+        key.encoder_idx = self.encoder_idx
+        key.encoder_dir = self.encoder_dir
+        key.layout_index = self.layout_index
+        key.layout_option = self.layout_option
+        return key
+
+    def drop_styling(self):
+        """ Forgets how KLE would color and style the key, leaving only labels and geometry """
+        self.color = self.profile = self.sm = self.sb = self.st = ""
+        self.textColor = self.textSize = self.default = None
+        self.ghost = self.stepped = self.nub = False
+
 
 class KeyboardMetadata:
 
@@ -93,37 +146,57 @@ class Serial:
     def deserializeError(self, msg, data):
         raise RuntimeError("Error: {} {}".format(msg, data))
     
-    def deserialize(self, rows):
+    def deserialize(self, rows, keep_styling=True):
+        """ Parses KLE rows, without keep_styling only the labels and geometry of the keys are kept """
         current = Key()
         cluster = Cluster()
         kbd = Keyboard()
+        keys = kbd.keys
         align = 4
         item = None
 
-        for r in range(len(rows)):
-            if isinstance(rows[r], list):
-                for k in range(len(rows[r])):
-                    item = rows[r][k]
+        for r, row in enumerate(rows):
+            if isinstance(row, list):
+                for k, item in enumerate(row):
                     if isinstance(item, str):
-                        newKey = copy(current)
+                        newKey = current.clone()
+                        label_map = self.labelMap[align]
 
                         # Calculate some generated values
-                        newKey.width2 = current.width if newKey.width2 == 0 else current.width2
-                        newKey.height2 = current.height if newKey.height2 == 0 else current.height2
-                        newKey.labels = self.reorderLabelsIn(item.split("\n"), align)
-                        newKey.textSize = self.reorderLabelsIn(newKey.textSize, align)
-
-                        # Clean up the data
-                        for i in range(12):
-                            if newKey.labels[i] is None:
-                                newKey.textSize[i] = newKey.textColor[i] = None
-                            if newKey.textSize[i] == newKey.default.textSize:
-                                newKey.textSize[i] = None
-                            if newKey.textColor[i] == newKey.default.textColor:
-                                newKey.textColor[i] = None
-                        
+                        if newKey.width2 == 0:
+                            newKey.width2 = current.width
+                        if newKey.height2 == 0:
+                            newKey.height2 = current.height
+                        labels = [None] * 12
+                        for i, label in enumerate(item.split("\n")):
+                            if label:
+                                labels[label_map[i]] = label
+                        newKey.labels = labels
+
+                        if keep_styling:
+                            textSize = [None] * 12
+                            for i, size in enumerate(current.textSize):
+                                if size:
+                                    textSize[label_map[i]] = size
+                            newKey.textSize = textSize
+
+                            # Clean up the data, textColor is shared with the following keys until a "t" and is
+                            # cleaned up in place, nothing to do when neither list has anything left in it
+                            textColor = newKey.textColor
+                            if textSize.count(None) != 12 or textColor.count(None) != 12:
+                                default = newKey.default
+                                for i in range(12):
+                                    if labels[i] is None:
+                                        textSize[i] = textColor[i] = None
+                                    if textSize[i] == default.textSize:
+                                        textSize[i] = None
+                                    if textColor[i] == default.textColor:
+                                        textColor[i] = None
+                        else:
+                            newKey.drop_styling()
+
                         # Add the key!
-                        kbd.keys.append(newKey)
+                        keys.append(newKey)
 
                         # Set up for the next key
                         current.x += current.width
@@ -198,7 +271,7 @@ class Serial:
                 current.x = current.rotation_x
             elif isinstance(item, dict):
                 if r != 0:
-                    self.deserializeError("keyboard metadata must the be first element", rows[r])
+                    self.deserializeError("keyboard metadata must the be first element", row)
                 # TODO: parse prop
             else:
                 pass
@@ -207,4 +280,32 @@ class Serial:
         return kbd
 
 
-# TODO: add tests
+def layout_digest(rows):
+    """ Identifies a KLE layout by its content, rows are either parsed json or json text """
+    if not isinstance(rows, str):
+        rows = json.dumps(rows, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(rows.encode("utf-8")).hexdigest()
+
+
+class LayoutCache:
+
+    """
+    Results of parse(rows) for the most recently used layouts, keyed by the layout digest so a layout
+    is only parsed again once it has been evicted. Callers share the parsed keys and must not modify them.
+    With size None nothing is ever evicted, only use that for a fixed set of layouts
+    """
+
+    def __init__(self, parse, size=None):
+        self.parse = parse
+        self.size = size
+        self.parsed = OrderedDict()
+
+    def get(self, rows):
+        digest = layout_digest(rows)
+        if digest in self.parsed:
+            self.parsed.move_to_end(digest)
+        else:
+            self.parsed[digest] = self.parse(json.loads(rows) if isinstance(rows, str) else rows)
+            if self.size is not None and len(self.parsed) > self.size:
+                self.parsed.popitem(last=False)
+        return self.parsed[digest]
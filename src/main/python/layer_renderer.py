@@ -0,0 +1,280 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import Qt, QRectF, QSize, QSizeF, QMarginsF
+from PyQt5.QtGui import QImage, QPainter, QPdfWriter, QPageSize, QPageLayout, QFontMetrics, QFontDatabase, QPalette
+from PyQt5.QtSvg import QSvgGenerator
+from PyQt5.QtWidgets import QApplication
+
+from constants import KEYBOARD_WIDGET_PADDING
+from keycodes.keycodes import Keycode, recreate_keyboard_keycodes
+from protocol.keyboard_comm import deserialize_layout
+from themes import Theme
+from util import KeycodeDisplay
+from widgets.keyboard_widget import KeyWidget, EncoderWidget, calculate_placement, paint_keys
+from widgets.keycap_cache import RenderPalette
+
+RENDER_FORMATS = ["png", "svg", "pdf"]
+# zoom of the keyboard in the output, raster images come out at twice the on-screen size
+RENDER_SCALE = 2
+
+
+class LayoutChoices:
+
+    """ Decodes VIA layout options the same way LayoutEditor does, without any widgets """
+
+    def __init__(self, layout_labels, layout_options):
+        self.choices = []
+
+        sizes = []
+        for item in layout_labels or []:
+            if isinstance(item, str):
+                sizes.append(1)
+            else:
+                sizes.append((len(item) - 2).bit_length())
+
+        # VIA stores option choices backwards, parse the bit string in reverse
+        value = "0" * 100 + bin(max(layout_options, 0))[2:]
+        for sz in sizes[::-1]:
+            self.choices.insert(0, int(value[-sz:], 2) if sz else 0)
+            value = value[:len(value) - sz]
+
+    def get_choice(self, index):
+        if index < len(self.choices):
+            return self.choices[index]
+        return 0
+
+
+class OfflineKeyboard:
+
+    """ The parts of a keyboard needed to rebuild its keycode tables from a definition and a saved layout """
+
+    def __init__(self, definition, layout):
+        self.vial_protocol = layout.get("vial_protocol", -1)
+        self.layers = len(layout["layout"])
+        self.macro_count = len(layout.get("macro", []))
+        self.tap_dance_count = len(layout.get("tap_dance", []))
+        self.custom_keycodes = definition.get("customKeycodes", None)
+        self.midi = definition.get("vial", {}).get("midi", None)
+
+
+class LayerSheet:
+
+    """ Keymap of every layer of one keyboard, independent of a connected device """
+
+    def __init__(self, name, keys, encoders, layout, encoder_layout, layers, layout_labels, layout_options,
+                 keycodes_source=None):
+        self.name = name
+        self.keys = keys
+        self.encoders = encoders
+        self.layout = layout
+        self.encoder_layout = encoder_layout
+        self.layers = layers
+        self.choices = LayoutChoices(layout_labels, layout_options)
+        # keyboard to rebuild the global keycode tables from before labelling keys, None if they are current
+        self.keycodes_source = keycodes_source
+
+    @classmethod
+    def from_keyboard(cls, keyboard, name):
+        return cls(name, keyboard.keys, keyboard.encoders, keyboard.layout, keyboard.encoder_layout,
+                   keyboard.layers, keyboard.layout_labels, keyboard.layout_options)
+
+    @classmethod
+    def from_files(cls, definition_path, layout_path):
+        """ Loads a keyboard definition .json together with a saved .vil layout """
+        with open(definition_path, "rb") as inf:
+            definition = json.loads(inf.read())
+        with open(layout_path, "rb") as inf:
+            data = json.loads(inf.read().decode("utf-8"))
+
+        keys, encoders = deserialize_layout(definition["layouts"]["keymap"])
+        source = OfflineKeyboard(definition, data)
+        recreate_keyboard_keycodes(source)
+
+        layout = dict()
+        for l, layer in enumerate(data["layout"]):
+            for r, row in enumerate(layer):
+                for c, code in enumerate(row):
+                    layout[(l, r, c)] = Keycode.serialize(Keycode.deserialize(code))
+        encoder_layout = dict()
+        for l, layer in enumerate(data.get("encoder_layout", [])):
+            for e, encoder in enumerate(layer):
+                for direction in range(2):
+                    encoder_layout[(l, e, direction)] = Keycode.serialize(Keycode.deserialize(encoder[direction]))
+
+        name = os.path.splitext(os.path.basename(layout_path))[0]
+        return cls(name, keys, encoders, layout, encoder_layout, source.layers,
+                   definition["layouts"].get("labels"), data.get("layout_options", -1), source)
+
+    def code_for(self, layer, desc):
+        if desc.row is not None:
+            return self.layout.get((layer, desc.row, desc.col), "KC_NO")
+        return self.encoder_layout.get((layer, desc.encoder_idx, desc.encoder_dir), "KC_NO")
+
+
+class LayerPage:
+
+    """ One layer laid out and labelled, ready to be painted from any thread """
+
+    def __init__(self, sheet, layer, font, scale):
+        self.title = "{} - Layer {}".format(sheet.name, layer)
+        self.font = font
+        self.scale = scale
+
+        scale_factor = QFontMetrics(font).height()
+        common, for_layout = [], []
+        for desc, cls in [(x, KeyWidget) for x in sheet.keys] + [(x, EncoderWidget) for x in sheet.encoders]:
+            (common if desc.layout_index == -1 else for_layout).append(cls(desc, scale_factor))
+
+        # keys go below the title
+        self.title_height = scale_factor * 1.5
+        self.widgets = []
+        for widget, shift_x, shift_y in calculate_placement(common, for_layout, sheet.choices.get_choice,
+                                                            scale_factor, KEYBOARD_WIDGET_PADDING):
+            if widget.desc.decal:
+                continue
+            widget.update_position(scale_factor, shift_x, shift_y + self.title_height)
+            KeycodeDisplay.display_keycode(widget, sheet.code_for(layer, widget.desc))
+            # geometry is shared, fill in its caches now rather than from the render threads
+            widget.paint_geometry(scale)
+            self.widgets.append(widget)
+
+        max_w = max_h = 0
+        for widget in self.widgets:
+            p = widget.polygon.boundingRect().bottomRight()
+            max_w, max_h = max(max_w, p.x()), max(max_h, p.y())
+        self.width = max_w + KEYBOARD_WIDGET_PADDING
+        self.height = max_h + KEYBOARD_WIDGET_PADDING
+
+    def size(self):
+        """ Output size in device pixels """
+        return QSize(round(self.width * self.scale), round(self.height * self.scale))
+
+    def paint(self, qp, palette, background):
+        qp.setRenderHint(QPainter.Antialiasing)
+        qp.setFont(self.font)
+        qp.fillRect(QRectF(0, 0, self.width * self.scale, self.height * self.scale), background)
+
+        qp.scale(self.scale, self.scale)
+        qp.setPen(palette.regular_pen)
+        qp.drawText(QRectF(KEYBOARD_WIDGET_PADDING, 0, self.width, self.title_height),
+                    Qt.AlignLeft | Qt.AlignVCenter, self.title)
+        qp.resetTransform()
+
+        paint_keys(qp, self.widgets, palette, self.scale, cached=False)
+
+
+def layer_paths(path, fmt, layers):
+    """ PDF puts every layer on a page of one document, images get one file per layer next to path """
+    if fmt == "pdf":
+        return [path]
+    stem = os.path.splitext(path)[0]
+    return ["{}_layer{}.{}".format(stem, layer, fmt) for layer in range(layers)]
+
+
+def render_png(pages, paths, palette, background):
+    for page, path in zip(pages, paths):
+        image = QImage(page.size(), QImage.Format_ARGB32_Premultiplied)
+        qp = QPainter(image)
+        page.paint(qp, palette, background)
+        qp.end()
+        if not image.save(path):
+            raise OSError("failed to write {}".format(path))
+
+
+def render_svg(pages, paths, palette, background):
+    for page, path in zip(pages, paths):
+        generator = QSvgGenerator()
+        generator.setFileName(path)
+        generator.setSize(page.size())
+        generator.setViewBox(QRectF(0, 0, page.size().width(), page.size().height()))
+        generator.setTitle(page.title)
+        qp = QPainter(generator)
+        page.paint(qp, palette, background)
+        qp.end()
+
+
+def render_pdf(pages, paths, palette, background):
+    writer = QPdfWriter(paths[0])
+    writer.setTitle(pages[0].title)
+    # one device pixel per point, so every page is exactly the size of the layer
+    writer.setResolution(72)
+    size = pages[0].size()
+    writer.setPageLayout(QPageLayout(QPageSize(QSizeF(size.width(), size.height()), QPageSize.Point),
+                                     QPageLayout.Portrait, QMarginsF()))
+    qp = QPainter(writer)
+    for x, page in enumerate(pages):
+        if x:
+            writer.newPage()
+        page.paint(qp, palette, background)
+    qp.end()
+
+
+renderers = {
+    "png": render_png,
+    "svg": render_svg,
+    "pdf": render_pdf,
+}
+
+
+def render_sheets(jobs, scale=RENDER_SCALE, workers=None):
+    """
+    Renders every layer of every (sheet, path, format) job and returns the written paths. Layers are laid
+    out here, in the GUI thread, and painted in parallel worker threads
+    """
+    font = QApplication.font()
+    palette = RenderPalette.get()
+    background = QApplication.palette().color(QPalette.Window)
+
+    tasks = []
+    written = []
+    for sheet, path, fmt in jobs:
+        if fmt not in renderers:
+            raise ValueError("unknown format {}, expected one of {}".format(fmt, ", ".join(RENDER_FORMATS)))
+        # keycode labels come from global tables, they must match this sheet's keyboard while it is labelled
+        if sheet.keycodes_source is not None:
+            recreate_keyboard_keycodes(sheet.keycodes_source)
+        pages = [LayerPage(sheet, layer, font, scale) for layer in range(sheet.layers)]
+        paths = layer_paths(path, fmt, sheet.layers)
+        if fmt == "pdf":
+            tasks.append((renderers[fmt], pages, paths))
+        else:
+            tasks += [(renderers[fmt], [page], [page_path]) for page, page_path in zip(pages, paths)]
+        written += paths
+
+    if QFontDatabase.supportsThreadedFontRendering():
+        with ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(fn, pages, paths, palette, background) for fn, pages, paths in tasks]
+            for future in futures:
+                future.result()
+    else:
+        for fn, pages, paths in tasks:
+            fn(pages, paths, palette, background)
+    return written
+
+
+def render_main(args):
+    """ Headless entry point, args are <png|svg|pdf> <output dir> <definition.json> <layout.vil> [...] """
+    if len(args) < 4 or len(args) % 2 != 0 or args[0] not in RENDER_FORMATS:
+        print("usage: --render-layers <{}> <output dir> <definition.json> <layout.vil> "
+              "[<definition.json> <layout.vil> ...]".format("|".join(RENDER_FORMATS)))
+        return 1
+    fmt, out_dir = args[0], args[1]
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication(sys.argv)
+    # cheat sheets get printed, always use the light theme
+    Theme.set_theme("Light")
+
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for definition_path, layout_path in zip(args[2::2], args[3::2]):
+        sheet = LayerSheet.from_files(definition_path, layout_path)
+        jobs.append((sheet, os.path.join(out_dir, "{}.{}".format(sheet.name, fmt)), fmt))
+    for path in render_sheets(jobs):
+        print(path)
+    app.quit()
+    return 0
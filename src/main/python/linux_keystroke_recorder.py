@@ -1,22 +1,49 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 import sys
+import threading
+import time
 
 import keyboard
 
+# how often buffered events are pushed to the GUI, in seconds
+FLUSH_INTERVAL = 0.05
+
+output_lock = threading.Lock()
+stop_event = threading.Event()
+
 
 def key_cb(key):
     names = keyboard._nixkeyboard.to_name[(key.scan_code, ())] or ["unknown"]
     name = names[0]
     name = keyboard.normalize_name(name)
 
-    sys.stdout.write("{}:{}\n".format(key.event_type, name))
-    sys.stdout.flush()
+    # key.time is wall-clock time, a clock step while recording would turn into a bogus delay
+    timestamp = time.monotonic()
+
+    # stdout is a block-buffered pipe here, events are only pushed out by flush_loop
+    # so fast typing reaches the GUI as a few large reads instead of one read per event
+    with output_lock:
+        sys.stdout.write("{}:{}:{:.6f}\n".format(key.event_type, name, timestamp))
+
+
+def flush_loop():
+    while not stop_event.wait(FLUSH_INTERVAL):
+        with output_lock:
+            sys.stdout.flush()
 
 
 def linux_keystroke_recorder():
+    flusher = threading.Thread(target=flush_loop, daemon=True)
+    flusher.start()
+
     keyboard.hook(key_cb)
     while True:
         ch = sys.stdin.read(1)
         if ch == "q":
             keyboard.unhook_all()
             break
+
+    stop_event.set()
+    flusher.join()
+    with output_lock:
+        sys.stdout.flush()
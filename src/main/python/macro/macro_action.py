@@ -14,6 +14,9 @@ VIAL_MACRO_EXT_TAP = 5
 VIAL_MACRO_EXT_DOWN = 6
 VIAL_MACRO_EXT_UP = 7
 
+# longest delay a single SS_DELAY can hold is 254 + 254 * 255 ms, the editor caps it at 64s
+SS_DELAY_MAX = 64000
+
 
 class BasicAction:
 
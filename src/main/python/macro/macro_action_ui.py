@@ -4,7 +4,8 @@ from PyQt5.QtWidgets import QLineEdit, QToolButton, QWidget, QSizePolicy, QSpinB
 from constants import KEY_SIZE_RATIO
 from tabbed_keycodes import TabbedKeycodes
 from widgets.flowlayout import FlowLayout
-from macro.macro_action import ActionText, ActionSequence, ActionDown, ActionUp, ActionTap, ActionDelay
+from macro.macro_action import ActionText, ActionSequence, ActionDown, ActionUp, ActionTap, ActionDelay, \
+    SS_DELAY_MAX
 from widgets.key_widget import KeyWidget
 
 
@@ -157,7 +158,7 @@ class ActionDelayUI(BasicActionUI):
         super().__init__(container, act)
         self.value = QSpinBox()
         self.value.setMinimum(0)
-        self.value.setMaximum(64000)  # up to 64s
+        self.value.setMaximum(SS_DELAY_MAX)
         self.value.setValue(self.act.delay)
         self.value.valueChanged.connect(self.on_change)
 
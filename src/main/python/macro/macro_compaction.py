@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+from keycodes.keycodes import Keycode
+from macro.macro_action import ActionText, ActionTap, ActionDown, ActionUp, ActionDelay, SS_DELAY_MAX
+
+# what QMK's send_string types with shift held, for the US layout it assumes
+SHIFTED = dict(zip("`1234567890-=[]\\;',./abcdefghijklmnopqrstuvwxyz",
+                   "~!@#$%^&*()_+{}|:\"<>?ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+seq_kinds = {ActionTap: "tap", ActionDown: "down", ActionUp: "up"}
+kind_to_action = {"tap": ActionTap, "down": ActionDown, "up": ActionUp}
+
+
+def keycode_char(qmk_id):
+    """ Returns the character send_string would use to type this keycode, or None if it cannot """
+    if qmk_id in ["KC_SPACE", "KC_SPC"]:
+        return " "
+    if Keycode.is_mask(qmk_id):
+        outer = Keycode.find_outer_keycode(qmk_id)
+        inner = Keycode.find_inner_keycode(qmk_id)
+        if outer is None or outer.qmk_id != "LSFT(kc)" or inner is None or not inner.printable:
+            return None
+        return SHIFTED.get(inner.printable)
+    kc = Keycode.find(qmk_id)
+    if kc is None:
+        return None
+    return kc.printable
+
+
+def flatten(macro):
+    """ Splits a macro into single events: (kind, char/qmk_id/delay) """
+    out = []
+    for act in macro:
+        if isinstance(act, ActionText):
+            out += [("char", ch) for ch in act.text]
+        elif isinstance(act, ActionDelay):
+            out.append(("delay", act.delay))
+        else:
+            out += [(seq_kinds[type(act)], kc) for kc in act.sequence]
+    return out
+
+
+def merge_delays(events):
+    """ Sums up back-to-back delays and drops the ones that do nothing """
+    out = []
+    for kind, value in events:
+        if kind == "delay":
+            if out and out[-1][0] == "delay":
+                value += out.pop()[1]
+            if value == 0:
+                continue
+        out.append((kind, value))
+
+    # a merged delay may need more than one SS_DELAY again
+    split = []
+    for kind, value in out:
+        while kind == "delay" and value > SS_DELAY_MAX:
+            split.append(("delay", SS_DELAY_MAX))
+            value -= SS_DELAY_MAX
+        split.append((kind, value))
+    return split
+
+
+def down_up_to_tap(events):
+    """ Replaces a key going down and immediately up with a tap """
+    out = []
+    for kind, value in events:
+        if kind == "up" and out and out[-1] == ("down", value):
+            out[-1] = ("tap", value)
+        else:
+            out.append((kind, value))
+    return out
+
+
+def taps_to_chars(events):
+    """ Replaces taps send_string can type with a character, 1 byte instead of 2-4 """
+    out = []
+    for kind, value in events:
+        if kind == "tap":
+            ch = keycode_char(value)
+            if ch is not None:
+                kind, value = "char", ch
+        out.append((kind, value))
+    return out
+
+
+def regroup(events):
+    """ Turns single events back into macro actions, one action per run of the same kind """
+    out = []
+    for kind, value in events:
+        if kind == "delay":
+            out.append(ActionDelay(value))
+        elif kind == "char":
+            if out and isinstance(out[-1], ActionText):
+                out[-1].text += value
+            else:
+                out.append(ActionText(value))
+        else:
+            cls = kind_to_action[kind]
+            if out and type(out[-1]) == cls:
+                out[-1].sequence.append(value)
+            else:
+                out.append(cls([value]))
+    return out
+
+
+def macro_compact(macro):
+    """ Returns a macro which does the same as the given one but takes as few bytes as possible """
+    events = flatten(macro)
+    events = merge_delays(events)
+    events = down_up_to_tap(events)
+    events = taps_to_chars(events)
+    return regroup(events)
+
+
+class MacroCompactionPlan:
+
+    """ Proposed compacted encoding of a macro buffer together with a per-macro before/after report """
+
+    def __init__(self, keyboard, data):
+        self.before = []
+        self.after = []
+        self.macros = []
+
+        raw = data.split(b"\x00") + [b""] * keyboard.macro_count
+        out = []
+        for macro, encoded in zip(keyboard.macros_deserialize(data), raw):
+            compacted = macro_compact(macro)
+            compacted_encoded = keyboard.macro_serialize(compacted)
+            self.before.append(len(encoded))
+            # never propose something that doesn't save memory
+            if len(compacted_encoded) < len(encoded):
+                macro, encoded = compacted, compacted_encoded
+            self.macros.append(macro)
+            self.after.append(len(encoded))
+            out.append(encoded)
+
+        self.data = b"\x00".join(out) + b"\x00"
+        self.total_before = sum(self.before) + keyboard.macro_count
+        self.total_after = len(self.data)
+
+    def saved(self):
+        return self.total_before - self.total_after
+
+    def report(self):
+        lines = []
+        for x, (before, after) in enumerate(zip(self.before, self.after)):
+            if before != after:
+                lines.append("M{}: {} -> {} bytes".format(x, before, after))
+        lines.append("Total: {} -> {} bytes".format(self.total_before, self.total_after))
+        return "\n".join(lines)
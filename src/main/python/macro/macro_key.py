@@ -18,7 +18,7 @@ class BasicKeycode(BasicKey):
 class KeyDown(BasicKeycode):
 
     def __repr__(self):
-        return "Down({})".format(Keycode.label(self.keycode.qmk_id))
+        return "Down({})".format(Keycode.label_for(self.keycode.qmk_id))
 
     def __eq__(self, other):
         return isinstance(other, KeyDown) and other.keycode == self.keycode
@@ -27,7 +27,7 @@ class KeyDown(BasicKeycode):
 class KeyUp(BasicKeycode):
 
     def __repr__(self):
-        return "Up({})".format(Keycode.label(self.keycode.qmk_id))
+        return "Up({})".format(Keycode.label_for(self.keycode.qmk_id))
 
     def __eq__(self, other):
         return isinstance(other, KeyUp) and other.keycode == self.keycode
@@ -36,12 +36,24 @@ class KeyUp(BasicKeycode):
 class KeyTap(BasicKeycode):
 
     def __repr__(self):
-        return "Tap({})".format(Keycode.label(self.keycode.qmk_id))
+        return "Tap({})".format(Keycode.label_for(self.keycode.qmk_id))
 
     def __eq__(self, other):
         return isinstance(other, KeyTap) and other.keycode == self.keycode
 
 
+class KeyDelay(BasicKey):
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __repr__(self):
+        return "Delay({})".format(self.delay)
+
+    def __eq__(self, other):
+        return isinstance(other, KeyDelay) and other.delay == self.delay
+
+
 class KeyString(BasicKey):
 
     def __init__(self, string):
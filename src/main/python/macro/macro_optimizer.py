@@ -1,5 +1,9 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
-from macro.macro_key import KeyUp, KeyDown, KeyTap, KeyString
+from macro.macro_action import SS_DELAY_MAX
+from macro.macro_key import KeyUp, KeyDown, KeyTap, KeyString, KeyDelay
+
+# recorded delays are rounded to this many milliseconds
+DELAY_QUANTUM = 10
 
 
 def remove_repeats(sequence):
@@ -12,6 +16,36 @@ def remove_repeats(sequence):
     return out
 
 
+def quantize_delay(delay, quantum=DELAY_QUANTUM):
+    """ Rounds a delay in ms to the quantum and splits it into as many delays as SS_DELAY needs to hold it """
+    delay = int(round(delay / quantum)) * quantum
+    out = []
+    while delay > 0:
+        out.append(KeyDelay(min(delay, SS_DELAY_MAX)))
+        delay -= SS_DELAY_MAX
+    return out
+
+
+def insert_delays(timed_sequence, threshold, quantum=DELAY_QUANTUM):
+    """
+    Turns a sequence of (timestamp in seconds, key) into a sequence of keys with a delay
+    wherever the gap between two events is at least threshold ms
+    """
+    out = []
+    last = None
+    for timestamp, k in timed_sequence:
+        # drop repeats before measuring gaps so a held key is one long delay rather than autorepeat noise
+        if out and (isinstance(k, KeyDown) or isinstance(k, KeyUp)) and k == out[-1]:
+            continue
+        if last is not None:
+            gap = (timestamp - last) * 1000
+            if gap >= threshold:
+                out += quantize_delay(gap, quantum)
+        out.append(k)
+        last = timestamp
+    return out
+
+
 def replace_with_tap(sequence):
     """ Replaces a sequence of Down/Up with a Tap """
     out = []
@@ -14,12 +14,16 @@ from util import tr
 
 class LinuxRecorder(QWidget):
 
-    keystroke = pyqtSignal(object)
+    # emits a list of (timestamp, KeyDown/KeyUp) tuples for every chunk of output read from the recorder
+    keystrokes = pyqtSignal(object)
     stopped = pyqtSignal()
 
     def __init__(self):
         super().__init__()
 
+        # partial line left over from the previous read
+        self.pending = b""
+
         self.process = QProcess()
         self.process.readyReadStandardOutput.connect(self.on_output)
 
@@ -47,6 +51,7 @@ class LinuxRecorder(QWidget):
             args += sys.argv
         args += ["--linux-recorder"]
 
+        self.pending = b""
         self.process.start("pkexec", args, QProcess.Unbuffered | QProcess.ReadWrite)
 
     def on_stop(self):
@@ -55,15 +60,29 @@ class LinuxRecorder(QWidget):
     def stop(self):
         self.process.write(b"q")
         self.process.waitForFinished()
+        # the recorder flushes whatever it still buffered on exit, make sure that is not lost
+        self.on_output()
         self.process.close()
         self.hide()
         self.stopped.emit()
 
     def on_output(self):
-        if self.process.canReadLine():
-            line = bytes(self.process.readLine()).decode("utf-8")
-            action, key = line.strip().split(":")
+        data = self.pending + bytes(self.process.readAllStandardOutput())
+        lines = data.split(b"\n")
+        self.pending = lines.pop()
+
+        action2cls = {"down": KeyDown, "up": KeyUp}
+        batch = []
+        for line in lines:
+            try:
+                action, key = line.decode("utf-8").strip().split(":", 1)
+                key, timestamp = key.rsplit(":", 1)
+                timestamp = float(timestamp)
+            except ValueError:
+                continue
             code = Keycode.find_by_recorder_alias(key)
-            if code is not None:
-                action2cls = {"down": KeyDown, "up": KeyUp}
-                self.keystroke.emit(action2cls[action](code))
+            if code is not None and action in action2cls:
+                batch.append((timestamp, action2cls[action](code)))
+
+        if batch:
+            self.keystrokes.emit(batch)
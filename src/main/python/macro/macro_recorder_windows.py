@@ -1,4 +1,6 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
+import time
+
 import keyboard
 
 from PyQt5 import QtCore
@@ -12,7 +14,8 @@ from util import tr
 
 class WindowsRecorder(QWidget):
 
-    keystroke = pyqtSignal(object)
+    # emits a list of (timestamp, KeyDown/KeyUp) tuples, same as LinuxRecorder
+    keystrokes = pyqtSignal(object)
     stopped = pyqtSignal()
 
     def __init__(self):
@@ -51,7 +54,9 @@ class WindowsRecorder(QWidget):
         self.stopped.emit()
 
     def on_key(self, ev):
+        # ev.time is wall-clock time, stamp the event with a monotonic clock as it is captured instead
+        timestamp = time.monotonic()
         code = Keycode.find_by_recorder_alias(ev.name)
         if code is not None:
             action2cls = {"down": KeyDown, "up": KeyUp}
-            self.keystroke.emit(action2cls[ev.event_type](code))
+            self.keystrokes.emit([(timestamp, action2cls[ev.event_type](code))])
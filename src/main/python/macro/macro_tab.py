@@ -1,7 +1,7 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 import json
 
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QEvent
 from PyQt5.QtWidgets import QPushButton, QGridLayout, QHBoxLayout, QToolButton, QVBoxLayout, \
     QWidget, QMenu, QScrollArea, QFrame
 
@@ -17,6 +17,9 @@ from textbox_window import TextboxWindow
 
 class MacroTab(QVBoxLayout):
 
+    # how many action rows are created at once, the rest only when scrolled into view
+    LINES_BATCH = 40
+
     changed = pyqtSignal()
     record = pyqtSignal(object, bool)
     record_stop = pyqtSignal()
@@ -27,6 +30,8 @@ class MacroTab(QVBoxLayout):
         self.parent = parent
 
         self.lines = []
+        # actions which don't have a MacroLine yet, they always come after self.lines
+        self.pending = []
 
         self.container = QGridLayout()
 
@@ -72,20 +77,56 @@ class MacroTab(QVBoxLayout):
         vbox.addLayout(self.container)
         vbox.addStretch()
 
-        self.addWidget(make_scrollable(vbox))
+        self.scroll = make_scrollable(vbox)
+        scrollbar = self.scroll.verticalScrollBar()
+        scrollbar.valueChanged.connect(self.on_scroll)
+        scrollbar.rangeChanged.connect(self.on_scroll)
+        self.scroll.installEventFilter(self)
+        self.addWidget(self.scroll)
         self.addLayout(layout_buttons)
 
         self.dlg_textbox = None
 
-    def add_action(self, act):
+    def add_line(self, act):
         if self.parent.keyboard.vial_protocol < VIAL_PROTOCOL_EXT_MACROS:
             act.set_keycode_filter(keycode_filter_masked)
         line = MacroLine(self, act)
         line.changed.connect(self.on_change)
         self.lines.append(line)
         line.insert(len(self.lines) - 1)
+
+    def add_action(self, act):
+        # new actions go to the very end, so everything before them has to be shown
+        self.materialize(len(self.pending))
+        self.add_line(act)
         self.changed.emit()
 
+    def append_actions(self, actions):
+        """ Appends a list of BasicAction, rows are only created for them once they are about to be seen """
+        self.pending += actions
+        self.on_scroll()
+        self.changed.emit()
+
+    def materialize(self, count):
+        """ Creates rows for the next count pending actions """
+        batch, self.pending = self.pending[:count], self.pending[count:]
+        for act in batch:
+            self.add_line(ui_action[type(act)](self.container, act))
+
+    def on_scroll(self):
+        if not self.pending or not self.scroll.isVisible():
+            return
+        scrollbar = self.scroll.verticalScrollBar()
+        # keep a page worth of rows ready below the visible area
+        if scrollbar.value() >= scrollbar.maximum() - scrollbar.pageStep():
+            self.materialize(self.LINES_BATCH)
+
+    def eventFilter(self, obj, ev):
+        # the first rows of a tab are created when it is shown for the first time
+        if obj == self.scroll and ev.type() == QEvent.Show:
+            self.on_scroll()
+        return False
+
     def on_add(self):
         self.add_action(ActionTextUI(self.container))
 
@@ -102,13 +143,19 @@ class MacroTab(QVBoxLayout):
         self.changed.emit()
 
     def clear(self):
-        for line in self.lines[:]:
-            self.on_remove(line)
+        for line in self.lines:
+            line.remove()
+            line.delete()
+        self.lines = []
+        self.pending = []
+        self.changed.emit()
 
     def on_move(self, obj, offset):
         if offset == 0:
             return
         index = self.lines.index(obj)
+        if index + offset >= len(self.lines):
+            self.materialize(self.LINES_BATCH)
         if index + offset < 0 or index + offset >= len(self.lines):
             return
         other = self.lines.index(self.lines[index + offset])
@@ -143,12 +190,13 @@ class MacroTab(QVBoxLayout):
             self.clear()
 
             # add each action from the json to this tab
+            actions = []
             for act in macro_load:
                 if act[0] in tag_to_action:
                     obj = tag_to_action[act[0]]()
-                    actionUI = ui_action[type(obj)]
                     obj.restore(act)
-                    self.add_action(actionUI(self.container, obj))
+                    actions.append(obj)
+            self.append_actions(actions)
 
     def on_change(self):
         self.changed.emit()
@@ -171,4 +219,4 @@ class MacroTab(QVBoxLayout):
         self.btn_record_stop.hide()
 
     def actions(self):
-        return [line.action.act for line in self.lines]
+        return [line.action.act for line in self.lines] + self.pending
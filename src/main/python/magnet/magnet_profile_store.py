@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import json
+import os
+import pathlib
+
+from PyQt5.QtCore import QStandardPaths
+
+from protocol.magnet_profile import MagnetProfile
+
+
+class MagnetProfileStore:
+
+    """ Keeps the magnet profiles of one keyboard in a json file in the app data directory """
+
+    def __init__(self, keyboard_id, directory=None):
+        if directory is None:
+            directory = os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppLocalDataLocation),
+                                     "magnet_profiles")
+        self.path = os.path.join(directory, "{:016x}.json".format(keyboard_id & 0xFFFFFFFFFFFFFFFF))
+
+    def load(self):
+        """ Returns {name: MagnetProfile}, empty if nothing was saved yet or the file is unreadable """
+        try:
+            with open(self.path, "r") as inf:
+                data = json.load(inf)
+            return {p["name"]: MagnetProfile.load(p) for p in data["profiles"]}
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            if os.path.exists(self.path):
+                print("Failed to load magnet profiles from {}: {}".format(self.path, e))
+            return dict()
+
+    def merge(self, profiles):
+        """
+        Adds the stored profiles missing from profiles, then saves profiles back if they have anything the
+        store doesn't, e.g. a profile restored from a layout file replacing a stored one of the same name
+        """
+        stored = self.load()
+        for name, profile in stored.items():
+            profiles.setdefault(name, profile)
+        if profiles != stored:
+            self.save(profiles)
+
+    def save(self, profiles):
+        pathlib.Path(os.path.dirname(self.path)).mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so a crash never leaves a truncated store behind
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as outf:
+            json.dump({"profiles": [p.save() for p in profiles.values()]}, outf)
+        os.replace(tmp, self.path)
@@ -0,0 +1,163 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import threading
+import time
+from array import array
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from magnet.telemetry_capture import TelemetryRecorder
+
+# samples kept per key, at a few hundred sweeps per second this is several seconds of history
+TELEMETRY_CAPACITY = 4096
+
+
+class TelemetryBuffer:
+
+    """ Fixed-size ring of (time, adc, travel) samples for one key """
+
+    def __init__(self, capacity=TELEMETRY_CAPACITY):
+        self.capacity = capacity
+        self.time = array("d", bytes(8 * capacity))
+        self.adc = array("H", bytes(2 * capacity))
+        self.travel = array("B", bytes(capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, adc, travel):
+        self.time[self.head] = timestamp
+        self.adc[self.head] = adc
+        self.travel[self.head] = travel
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        """ Returns the newest (time, adc, travel) or None if nothing was sampled yet """
+        if self.count == 0:
+            return None
+        x = self.head - 1
+        return self.time[x], self.adc[x], self.travel[x]
+
+    def snapshot(self, since=0):
+        """ Returns (times, adcs, travels) of the samples taken at or after since, oldest first """
+        start = self.head - self.count
+        order = list(range(start, self.head))
+        # samples are in time order so skip the old ones with a binary search
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time[order[mid]] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        order = order[lo:]
+        return [self.time[x] for x in order], [self.adc[x] for x in order], [self.travel[x] for x in order]
+
+    def rate(self):
+        """ Returns the sample rate over the buffered history, in Hz """
+        if self.count < 2:
+            return 0
+        first = self.time[self.head - self.count]
+        last = self.time[self.head - 1]
+        if last <= first:
+            return 0
+        return (self.count - 1) / (last - first)
+
+
+class TelemetrySampler:
+
+    """
+    Samples ADC and travel of a set of keys into per-key ring buffers. sweep() can run on any thread,
+    readers take snapshots under the same lock so they never see a half-written sweep
+    """
+
+    def __init__(self, keyboard, capacity=TELEMETRY_CAPACITY):
+        self.keyboard = keyboard
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.keys = []
+        self.buffers = dict()
+        self.recorder = None
+        self.clock = time.monotonic
+
+    def set_keys(self, keys):
+        """ Changes the sampled (row, col) keys, history of keys still sampled is kept """
+        with self.lock:
+            self.keys = list(keys)
+            self.buffers = {key: self.buffers.get(key) or TelemetryBuffer(self.capacity) for key in self.keys}
+
+    def sweep(self):
+        """ Samples every key once in a single batch, returns the number of keys sampled """
+        with self.lock:
+            keys = list(self.keys)
+        if not keys:
+            return 0
+
+        samples = self.keyboard.get_adc_travel(keys)
+        now = self.clock()
+
+        with self.lock:
+            for key, (adc, travel) in zip(keys, samples):
+                if key in self.buffers:
+                    self.buffers[key].append(now, adc, travel)
+            if self.recorder is not None:
+                self.recorder.write(now, keys, samples)
+        return len(keys)
+
+    def start_recording(self, path, deadband=(0, 0)):
+        """ Saves every following sweep to a capture file, see telemetry_capture """
+        recorder = TelemetryRecorder(path, deadband)
+        with self.lock:
+            previous, self.recorder = self.recorder, recorder
+        if previous is not None:
+            previous.close()
+
+    def stop_recording(self):
+        """ Closes the capture file, returns the number of sweeps recorded """
+        with self.lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return 0
+        recorder.close()
+        return recorder.sweeps
+
+    def latest(self, key):
+        with self.lock:
+            if key not in self.buffers:
+                return None
+            return self.buffers[key].latest()
+
+    def snapshot(self, key, since=0):
+        with self.lock:
+            if key not in self.buffers:
+                return [], [], []
+            return self.buffers[key].snapshot(since)
+
+    def rate(self, key):
+        with self.lock:
+            if key not in self.buffers:
+                return 0
+            return self.buffers[key].rate()
+
+
+class TelemetryThread(QThread):
+
+    """ Runs sweeps back-to-back so sampling is limited by the link rather than by the UI """
+
+    failed = pyqtSignal(str)
+
+    def __init__(self, sampler):
+        super().__init__()
+        self.sampler = sampler
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                if self.sampler.sweep() == 0:
+                    self.msleep(20)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
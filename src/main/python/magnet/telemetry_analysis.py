@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import math
+import statistics
+
+from magnet.telemetry_capture import load_capture
+
+# travel is in 0.02mm units; below this a key counts as released
+REST_TRAVEL = 5
+# a press is a run of samples deeper than this
+PRESS_TRAVEL = 20
+# suggestions keep this many times the measured spread as headroom
+NOISE_MARGIN = 3
+DEADBAND_MAX = 50
+RT_MIN = 5
+RT_MAX = 150
+
+
+def percentile(ordered, pct):
+    """ Nearest-rank percentile of an already sorted sequence """
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def press_depths(travel):
+    """ Returns the deepest travel of every press """
+    depths = []
+    depth = None
+    for value in travel:
+        if value > PRESS_TRAVEL:
+            depth = value if depth is None else max(depth, value)
+        elif depth is not None:
+            depths.append(depth)
+            depth = None
+    if depth is not None:
+        depths.append(depth)
+    return depths
+
+
+class KeyAnalysis:
+
+    """ Noise, jitter and bottom-out statistics of one key, with deadband and RT suggestions derived from them """
+
+    def __init__(self, key, capture):
+        self.key = key
+        self.samples = len(capture.time)
+
+        intervals = [b - a for a, b in zip(capture.time, capture.time[1:])]
+        self.interval_jitter = statistics.pstdev(intervals) * 1000 if len(intervals) > 1 else 0
+
+        rest = [x for x, travel in enumerate(capture.travel) if travel < REST_TRAVEL]
+        rest_adc = [capture.adc[x] for x in rest]
+        rest_travel = sorted(capture.travel[x] for x in rest)
+        self.rest_samples = len(rest)
+        self.noise_floor = statistics.pstdev(rest_adc) if len(rest_adc) > 1 else 0
+        self.adc_p2p = max(rest_adc) - min(rest_adc) if rest_adc else 0
+        self.travel_jitter = percentile(rest_travel, 99) - percentile(rest_travel, 50)
+
+        self.bottom_out = sorted(press_depths(capture.travel))
+        self.presses = len(self.bottom_out)
+
+    def bottom_out_stats(self):
+        """ Returns (min, p5, median, p95, max) of the bottom-out depth """
+        return tuple(percentile(self.bottom_out, pct) for pct in [0, 5, 50, 95, 100])
+
+    def suggested_top_deadband(self):
+        return min(DEADBAND_MAX, math.ceil(self.travel_jitter * NOISE_MARGIN))
+
+    def suggested_bottom_deadband(self):
+        """ Deep enough that the shallowest regular bottom-out still reaches it """
+        if not self.bottom_out:
+            return None
+        _, p5, median, _, _ = self.bottom_out_stats()
+        return min(DEADBAND_MAX, math.ceil((median - p5) + self.travel_jitter * NOISE_MARGIN))
+
+    def suggested_rt(self):
+        """ Smallest RT release/press threshold that noise can't trigger on its own """
+        return max(RT_MIN, min(RT_MAX, math.ceil(self.travel_jitter * NOISE_MARGIN)))
+
+
+def analyze_capture(path):
+    """ Returns (list of KeyAnalysis ordered by key, (top deadband, bottom deadband) used while recording) """
+    captures, deadband = load_capture(path)
+    return [KeyAnalysis(key, captures[key]) for key in sorted(captures)], deadband
+
+
+def analysis_report(analyses, deadband):
+    lines = ["Recorded with deadband top={} bottom={} (0.02mm units)".format(*deadband),
+             "key      samples  noise(adc)  p2p(adc)  jitter  dt-jitter(ms)  presses  bottom min/p5/med/p95/max"
+             "  deadband top/bottom  rt"]
+    for a in analyses:
+        bottom = "/".join(str(x) for x in a.bottom_out_stats()) if a.presses else "-"
+        bottom_deadband = a.suggested_bottom_deadband()
+        lines.append("{:<8} {:>7}  {:>10.2f}  {:>8}  {:>6}  {:>13.3f}  {:>7}  {:<27}  {:>8}/{:<10}  {}".format(
+            "{},{}".format(*a.key), a.samples, a.noise_floor, a.adc_p2p, a.travel_jitter, a.interval_jitter,
+            a.presses, bottom, a.suggested_top_deadband(), "-" if bottom_deadband is None else bottom_deadband,
+            a.suggested_rt()))
+
+    # deadband is a global setting, it has to suit the worst key
+    if analyses:
+        top = max(a.suggested_top_deadband() for a in analyses)
+        bottoms = [a.suggested_bottom_deadband() for a in analyses if a.presses]
+        lines.append("Suggested global deadband: top={} bottom={}".format(top, max(bottoms) if bottoms else "-"))
+    return "\n".join(lines)
+
+
+def analyze_telemetry(path):
+    analyses, deadband = analyze_capture(path)
+    print(analysis_report(analyses, deadband))
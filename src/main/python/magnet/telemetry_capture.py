@@ -0,0 +1,112 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import struct
+import time
+from array import array
+
+# file layout, little endian:
+#   magic
+#   segment: b"S", u16 key count, count * (u8 row, u8 col), u8 top deadband, u8 bottom deadband
+#   sweep:   b"W", f64 time, count * u16 adc, count * u8 travel
+# a new segment starts whenever the set of sampled keys changes, sweeps always belong to the last segment.
+# A recording cut short (crash, unplugged keyboard) ends in a partial segment or sweep, which is ignored
+CAPTURE_MAGIC = b"VIALMT01"
+SEGMENT_HEADER = struct.Struct("<cH")
+SEGMENT_DEADBAND = struct.Struct("<BB")
+
+# seconds of sweeps that may be lost if the app dies while recording
+FLUSH_INTERVAL = 1.0
+
+
+def sweep_struct(count):
+    return struct.Struct("<cd{}H{}B".format(count, count))
+
+
+class TelemetryRecorder:
+
+    """ Appends telemetry sweeps to a capture file """
+
+    def __init__(self, path, deadband=(0, 0)):
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_MAGIC)
+        self.deadband = deadband
+        self.keys = None
+        self.sweep = None
+        self.sweeps = 0
+        self.flushed = time.monotonic()
+
+    def write(self, timestamp, keys, samples):
+        """ Records one sweep, samples is a list of (adc, travel) in the same order as keys """
+        if keys != self.keys:
+            self.keys = list(keys)
+            self.sweep = sweep_struct(len(keys))
+            self.file.write(SEGMENT_HEADER.pack(b"S", len(keys)))
+            self.file.write(bytes(x for key in keys for x in key))
+            self.file.write(SEGMENT_DEADBAND.pack(*self.deadband))
+        self.file.write(self.sweep.pack(b"W", timestamp, *[adc for adc, _ in samples],
+                                        *[travel for _, travel in samples]))
+        self.sweeps += 1
+        now = time.monotonic()
+        if now - self.flushed >= FLUSH_INTERVAL:
+            self.file.flush()
+            self.flushed = now
+
+    def close(self):
+        self.file.close()
+
+
+class KeyCapture:
+
+    """ All samples of one key, one array per column """
+
+    def __init__(self):
+        self.time = array("d")
+        self.adc = array("H")
+        self.travel = array("B")
+
+
+def load_capture(path):
+    """ Reads a capture file, returns ({(row, col): KeyCapture}, (top deadband, bottom deadband)) """
+    with open(path, "rb") as inf:
+        data = memoryview(inf.read())
+    if bytes(data[:len(CAPTURE_MAGIC)]) != CAPTURE_MAGIC:
+        raise RuntimeError("{} is not a telemetry capture".format(path))
+
+    captures = dict()
+    deadband = (0, 0)
+    off = len(CAPTURE_MAGIC)
+    truncated = False
+    while off < len(data) and not truncated:
+        if off + SEGMENT_HEADER.size > len(data):
+            break
+        tag, count = SEGMENT_HEADER.unpack_from(data, off)
+        if tag != b"S":
+            raise RuntimeError("corrupted telemetry capture at offset {}".format(off))
+        if off + SEGMENT_HEADER.size + 2 * count + SEGMENT_DEADBAND.size > len(data):
+            break
+        off += SEGMENT_HEADER.size
+        raw = bytes(data[off:off + 2 * count])
+        keys = list(zip(raw[0::2], raw[1::2]))
+        off += 2 * count
+        deadband = SEGMENT_DEADBAND.unpack_from(data, off)
+        off += SEGMENT_DEADBAND.size
+
+        # sweeps of a segment have a fixed size, find where they stop and unpack them all in one go
+        sweep = sweep_struct(count)
+        end = off
+        while end + sweep.size <= len(data) and data[end] == ord("W"):
+            end += sweep.size
+        # a sweep that doesn't fit is where the recording was cut
+        truncated = end < len(data) and data[end] == ord("W")
+        columns = list(zip(*sweep.iter_unpack(data[off:end])))
+        off = end
+        if not columns:
+            continue
+
+        times = columns[1]
+        for x, key in enumerate(keys):
+            capture = captures.setdefault(key, KeyCapture())
+            capture.time.extend(times)
+            capture.adc.extend(columns[2 + x])
+            capture.travel.extend(columns[2 + count + x])
+
+    return captures, deadband
@@ -75,6 +75,18 @@ if __name__ == '__main__':
         from linux_keystroke_recorder import linux_keystroke_recorder
 
         linux_keystroke_recorder()
+    elif len(sys.argv) == 3 and sys.argv[1] == "--analyze-telemetry":
+        from magnet.telemetry_analysis import analyze_telemetry
+
+        analyze_telemetry(sys.argv[2])
+    elif len(sys.argv) >= 2 and sys.argv[1] == "--render-layers":
+        from layer_renderer import render_main
+
+        sys.exit(render_main(sys.argv[2:]))
+    elif len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        from benchmark import benchmark_main
+
+        sys.exit(benchmark_main(sys.argv[2:]))
     else:
         appctxt = VialApplicationContext()       # 1. Instantiate ApplicationContext
         init_logger()
@@ -11,6 +11,8 @@ import os
 import sys
 
 from about_keyboard import AboutKeyboard
+from benchmark_dialog import BenchmarkDialog
+from layer_renderer import LayerSheet, render_sheets
 from autorefresh.autorefresh import Autorefresh
 from editor.combos import Combos
 from constants import WINDOW_WIDTH, WINDOW_HEIGHT
@@ -156,6 +158,9 @@ class MainWindow(QMainWindow):
         layout_save_act.setShortcut("Ctrl+S")
         layout_save_act.triggered.connect(self.on_layout_save)
 
+        self.export_layers_act = QAction(tr("MenuFile", "Export layer sheets..."), self)
+        self.export_layers_act.triggered.connect(self.on_export_layers)
+
         sideload_json_act = QAction(tr("MenuFile", "Sideload VIA JSON..."), self)
         sideload_json_act.triggered.connect(self.on_sideload_json)
 
@@ -173,6 +178,7 @@ class MainWindow(QMainWindow):
             file_menu = self.menuBar().addMenu(tr("Menu", "File"))
             file_menu.addAction(layout_load_act)
             file_menu.addAction(layout_save_act)
+            file_menu.addAction(self.export_layers_act)
             file_menu.addSeparator()
             file_menu.addAction(sideload_json_act)
             file_menu.addAction(download_via_stack_act)
@@ -233,8 +239,11 @@ class MainWindow(QMainWindow):
         about_vial_act.triggered.connect(self.about_vial)
         self.about_keyboard_act = QAction("", self)
         self.about_keyboard_act.triggered.connect(self.about_keyboard)
+        self.benchmark_act = QAction(tr("MenuAbout", "Benchmark..."), self)
+        self.benchmark_act.triggered.connect(self.benchmark)
         self.about_menu = self.menuBar().addMenu(tr("Menu", "About"))
         self.about_menu.addAction(self.about_keyboard_act)
+        self.about_menu.addAction(self.benchmark_act)
         self.about_menu.addAction(about_vial_act)
 
     def on_layout_load(self):
@@ -257,6 +266,21 @@ class MainWindow(QMainWindow):
             with open(dialog.selectedFiles()[0], "wb") as outf:
                 outf.write(self.keymap_editor.save_layout())
 
+    def on_export_layers(self):
+        if not isinstance(self.autorefresh.current_device, VialKeyboard):
+            return
+
+        filters = {"PNG images (*.png)": "png", "SVG images (*.svg)": "svg", "PDF document (*.pdf)": "pdf"}
+        dialog = QFileDialog()
+        dialog.setDefaultSuffix("png")
+        dialog.setAcceptMode(QFileDialog.AcceptSave)
+        dialog.setNameFilters(list(filters))
+        dialog.filterSelected.connect(lambda f: dialog.setDefaultSuffix(filters[f]))
+        if dialog.exec_() == QDialog.Accepted:
+            device = self.autorefresh.current_device
+            sheet = LayerSheet.from_keyboard(device.keyboard, device.title())
+            render_sheets([(sheet, dialog.selectedFiles()[0], filters[dialog.selectedNameFilter()])])
+
     def on_click_refresh(self):
         self.autorefresh.update(quiet=False, hard=True)
 
@@ -301,10 +325,14 @@ class MainWindow(QMainWindow):
         # don't show "Security" menu for bootloader mode, as the bootloader is inherently insecure
         self.security_menu.menuAction().setVisible(isinstance(self.autorefresh.current_device, VialKeyboard))
 
+        self.export_layers_act.setEnabled(isinstance(self.autorefresh.current_device, VialKeyboard))
+
         self.about_keyboard_act.setVisible(False)
+        self.benchmark_act.setVisible(False)
         if isinstance(self.autorefresh.current_device, VialKeyboard):
             self.about_keyboard_act.setText("About {}...".format(self.autorefresh.current_device.title()))
             self.about_keyboard_act.setVisible(True)
+            self.benchmark_act.setVisible(True)
 
         # if unlock process was interrupted, we must finish it first
         if isinstance(self.autorefresh.current_device, VialKeyboard) and self.autorefresh.current_device.keyboard.get_unlock_in_progress():
@@ -435,6 +463,11 @@ class MainWindow(QMainWindow):
         self.about_dialog.setModal(True)
         self.about_dialog.show()
 
+    def benchmark(self):
+        self.benchmark_dialog = BenchmarkDialog(self.autorefresh.current_device)
+        self.benchmark_dialog.setModal(True)
+        self.benchmark_dialog.show()
+
     def closeEvent(self, e):
         self.settings.setValue("size", self.size())
         self.settings.setValue("pos", self.pos())
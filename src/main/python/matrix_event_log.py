@@ -0,0 +1,146 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import csv
+from array import array
+
+# events kept before the oldest ones get overwritten
+LOG_CAPACITY = 100000
+# release and press closer together than this (seconds) is reported as suspected chatter
+CHATTER_INTERVAL = 0.03
+# keys held longer than this (seconds) are reported as stuck
+STUCK_TIME = 5.0
+
+
+class MatrixEventLog:
+
+    """
+    Timestamped press/release events of a switch matrix together with running per-key statistics.
+    All storage is allocated up front, recording an event only writes into preallocated arrays
+    """
+
+    def __init__(self, rows, cols, capacity=LOG_CAPACITY):
+        self.rows = rows
+        self.cols = cols
+        self.capacity = capacity
+
+        # event ring
+        self.time = array("d", bytes(8 * capacity))
+        self.key = array("H", bytes(2 * capacity))
+        self.pressed = array("B", bytes(capacity))
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+        # per-key statistics, indexed by row * cols + col
+        keys = rows * cols
+        self.held = array("B", bytes(keys))
+        self.last_event = array("d", [-1.0] * keys)
+        self.pressed_at = array("d", bytes(8 * keys))
+        self.press_count = array("I", bytes(4 * keys))
+        self.min_interval = array("d", [float("inf")] * keys)
+        self.chatter = array("I", bytes(4 * keys))
+        self.ghost = array("I", bytes(4 * keys))
+        self.start = None
+
+        # running totals for summary()
+        self.total_chatter = 0
+        self.total_ghost = 0
+        self.held_count = 0
+
+    def record(self, timestamp, changes):
+        """ Logs (row, col, pressed) changes seen in one frame taken at timestamp """
+        if self.start is None:
+            self.start = timestamp
+        for row, col, pressed in changes:
+            if row >= self.rows or col >= self.cols:
+                continue
+            idx = row * self.cols + col
+
+            if self.count == self.capacity:
+                self.dropped += 1
+            else:
+                self.count += 1
+            self.time[self.head] = timestamp
+            self.key[self.head] = idx
+            self.pressed[self.head] = pressed
+            self.head = (self.head + 1) % self.capacity
+
+            last = self.last_event[idx]
+            if last >= 0:
+                interval = timestamp - last
+                self.min_interval[idx] = min(self.min_interval[idx], interval)
+                if pressed and interval < CHATTER_INTERVAL:
+                    self.chatter[idx] += 1
+                    self.total_chatter += 1
+            self.last_event[idx] = timestamp
+
+            self.held_count += bool(pressed) - self.held[idx]
+            self.held[idx] = pressed
+            if pressed:
+                self.press_count[idx] += 1
+                self.pressed_at[idx] = timestamp
+                if self.is_ghost(row, col):
+                    self.ghost[idx] += 1
+                    self.total_ghost += 1
+
+    def is_ghost(self, row, col):
+        """ A press completing a rectangle of three held keys is what matrix ghosting looks like """
+        cols = self.cols
+        for c in range(cols):
+            if c == col or not self.held[row * cols + c]:
+                continue
+            for r in range(self.rows):
+                if r != row and self.held[r * cols + col] and self.held[r * cols + c]:
+                    return True
+        return False
+
+    def events(self):
+        """ Yields (time since start, row, col, pressed), oldest first """
+        for x in range(self.head - self.count, self.head):
+            row, col = divmod(self.key[x], self.cols)
+            yield self.time[x] - self.start, row, col, bool(self.pressed[x])
+
+    def stuck(self, now):
+        """ Returns (row, col) of the keys held for longer than STUCK_TIME """
+        return [divmod(idx, self.cols) for idx in range(self.rows * self.cols)
+                if self.held[idx] and now - self.pressed_at[idx] > STUCK_TIME]
+
+    def stats(self, now):
+        """ Returns one row per key that saw any event: row, col, presses, min interval, chatter, ghost, stuck """
+        out = []
+        for idx in range(self.rows * self.cols):
+            if self.last_event[idx] < 0:
+                continue
+            row, col = divmod(idx, self.cols)
+            min_interval = self.min_interval[idx] if self.min_interval[idx] != float("inf") else None
+            stuck = bool(self.held[idx]) and now - self.pressed_at[idx] > STUCK_TIME
+            out.append((row, col, self.press_count[idx], min_interval, self.chatter[idx], self.ghost[idx], stuck))
+        return out
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as outf:
+            writer = csv.writer(outf)
+            writer.writerow(["time", "row", "col", "event"])
+            for timestamp, row, col, pressed in self.events():
+                writer.writerow(["{:.6f}".format(timestamp), row, col, "press" if pressed else "release"])
+
+    def export_stats_csv(self, path, now):
+        with open(path, "w", newline="") as outf:
+            writer = csv.writer(outf)
+            writer.writerow(["row", "col", "presses", "min_interval_ms", "chatter", "ghost", "stuck"])
+            for row, col, presses, min_interval, chatter, ghost, stuck in self.stats(now):
+                writer.writerow([row, col, presses, "" if min_interval is None else "{:.1f}".format(min_interval * 1000),
+                                 chatter, ghost, int(stuck)])
+
+    def stuck_count(self, now):
+        if not self.held_count:
+            return 0
+        count = 0
+        for idx in range(self.rows * self.cols):
+            if self.held[idx] and now - self.pressed_at[idx] > STUCK_TIME:
+                count += 1
+        return count
+
+    def summary(self, now):
+        """ Formats the running totals, only walks the matrix while some key is held """
+        return "{} events, {} chatter, {} ghosting, {} stuck".format(
+            self.count + self.dropped, self.total_chatter, self.total_ghost, self.stuck_count(now))
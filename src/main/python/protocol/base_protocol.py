@@ -1,27 +1,92 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 import struct
+import threading
 
 from protocol.constants import CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP
+from unlocker import Unlocker
 
 
 class BaseProtocol:
     vial_protocol = None
     usb_send = NotImplemented
+    # pipelined variant of usb_send, None when the transport can only do one request at a time
+    usb_send_batch = None
+    # held for every request and batch, so requests from other threads (magnet telemetry) don't interleave
+    usb_lock = threading.RLock()
     dev = None
 
     macro_count = 0
     macro_memory = 0
     macro = b""
 
-    def _retrieve_dynamic_entries(self, cmd, count, fmt):
-        out = []
-        for x in range(count):
-            data = self.usb_send(
-                self.dev,
-                struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, cmd, x),
-                retries=20
-            )
-            if data[0] != 0:
-                raise RuntimeError("failed retrieving dynamic={} entry {} from the device".format(cmd, x))
-            out.append(struct.unpack(fmt, data[1:1 + struct.calcsize(fmt)]))
+    def _send_batch(self, msgs, retries=20):
+        """ Sends a list of messages, yields the responses in order as they arrive; consume all of them """
+        with self.usb_lock:
+            if self.usb_send_batch is None:
+                for msg in msgs:
+                    yield self.usb_send(self.dev, msg, retries=retries)
+            else:
+                yield from self.usb_send_batch(self.dev, msgs, retries=retries)
+
+    def _iter_dynamic_entries(self, tables):
+        """
+        Fetches entries of several dynamic tables in one batch, tables is a list of (cmd, count, struct.Struct).
+        Yields (cmd, idx, unpacked entry) as responses arrive
+        """
+        requests = [(cmd, x, entry_struct) for cmd, count, entry_struct in tables for x in range(count)]
+        msgs = [struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, cmd, x) for cmd, x, _ in requests]
+        responses = self._send_batch(msgs)
+        error = None
+        try:
+            # read every response even after a bad one so none is left in flight
+            for (cmd, x, entry_struct), data in zip(requests, responses):
+                if data[0] != 0:
+                    if error is None:
+                        error = "failed retrieving dynamic={} entry {} from the device".format(cmd, x)
+                    continue
+                if error is None:
+                    yield cmd, x, entry_struct.unpack_from(data, 1)
+        finally:
+            # release usb_lock right away when the consumer stops early
+            responses.close()
+        if error is not None:
+            raise RuntimeError(error)
+
+    def _retrieve_dynamic_entries(self, cmd, count, entry_struct):
+        return [entry for _, _, entry in self._iter_dynamic_entries([(cmd, count, entry_struct)])]
+
+    def _dynamic_writes(self, cmd, entries, dirty, serialize, needs_unlock):
+        """ Lists pending writes for the dirty entries of a dynamic table as (cmd, idx, payload, needs_unlock) """
+        return [(cmd, idx, serialize(entries[idx]), needs_unlock(entries[idx])) for idx in sorted(dirty)]
+
+    def _commit_dynamic_writes(self, writes):
+        """
+        Sends writes from _dynamic_writes as one batch, unlocking the keyboard at most once.
+        Returns {(cmd, idx): success}, an entry that couldn't be sent at all counts as failed
+        """
+        if any(w[3] for w in writes):
+            Unlocker.unlock(self)
+        msgs = [struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, cmd, idx) + payload
+                for cmd, idx, payload, _ in writes]
+        results = {(cmd, idx): False for cmd, idx, _, _ in writes}
+        responses = self._send_batch(msgs)
+        try:
+            # each write sets an entry to a fixed value, safe to send again if the batch falls back
+            for (cmd, idx, _, _), data in zip(writes, responses):
+                results[(cmd, idx)] = data[0] == 0
+        except RuntimeError:
+            # the device stopped answering, the rest stays False
+            pass
+        finally:
+            responses.close()
+        return results
+
+    def _dynamic_committed(self, cmd, dirty, results):
+        """ Drops successfully written entries of one table from its dirty set, returns {idx: success} """
+        out = {}
+        for (c, idx), success in results.items():
+            if c == cmd:
+                out[idx] = success
+                if success:
+                    dirty.discard(idx)
         return out
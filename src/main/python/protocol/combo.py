@@ -3,36 +3,49 @@ import struct
 
 from keycodes.keycodes import Keycode, RESET_KEYCODE
 from protocol.base_protocol import BaseProtocol
-from protocol.constants import CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, DYNAMIC_VIAL_COMBO_GET, \
-    DYNAMIC_VIAL_COMBO_SET
-from unlocker import Unlocker
+from protocol.constants import DYNAMIC_VIAL_COMBO_GET, DYNAMIC_VIAL_COMBO_SET
+
+
+COMBO_ENTRY = struct.Struct("<HHHHH")
 
 
 class ProtocolCombo(BaseProtocol):
 
+    @staticmethod
+    def _combo_decode(entry):
+        return tuple(Keycode.serialize(kc) for kc in entry)
+
     def reload_combo(self):
-        self.combo_entries = self._retrieve_dynamic_entries(DYNAMIC_VIAL_COMBO_GET,
-                                                            self.combo_count, "<HHHHH")
-        for x, entry in enumerate(self.combo_entries):
-            self.combo_entries[x] = (Keycode.serialize(entry[0]), Keycode.serialize(entry[1]),
-                                     Keycode.serialize(entry[2]), Keycode.serialize(entry[3]),
-                                     Keycode.serialize(entry[4]))
+        self.combo_entries = [self._combo_decode(e) for e in self._retrieve_dynamic_entries(
+            DYNAMIC_VIAL_COMBO_GET, self.combo_count, COMBO_ENTRY)]
+        self.combo_dirty = set()
 
     def combo_get(self, idx):
         return self.combo_entries[idx]
 
-    def combo_set(self, idx, entry):
+    def combo_stage(self, idx, entry):
+        """ Changes an entry locally, it is sent to the keyboard by the next combo_commit """
         if self.combo_entries[idx] == entry:
             return
-        # for the replacement key
-        if entry[-1] == RESET_KEYCODE:
-            Unlocker.unlock(self)
         self.combo_entries[idx] = entry
-        entry = [Keycode.deserialize(entry[0]), Keycode.deserialize(entry[1]), Keycode.deserialize(entry[2]),
-                 Keycode.deserialize(entry[3]), Keycode.deserialize(entry[4])]
-        serialized = struct.pack("<HHHHH", *entry)
-        self.usb_send(self.dev, struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP,
-                                            DYNAMIC_VIAL_COMBO_SET, idx) + serialized, retries=20)
+        self.combo_dirty.add(idx)
+
+    def _combo_writes(self):
+        def serialize(entry):
+            return COMBO_ENTRY.pack(*[Keycode.deserialize(kc) for kc in entry])
+
+        # for the replacement key
+        return self._dynamic_writes(DYNAMIC_VIAL_COMBO_SET, self.combo_entries, self.combo_dirty,
+                                    serialize, lambda entry: entry[-1] == RESET_KEYCODE)
+
+    def combo_commit(self):
+        """ Sends all staged entries, returns {idx: success} """
+        results = self._commit_dynamic_writes(self._combo_writes())
+        return self._dynamic_committed(DYNAMIC_VIAL_COMBO_SET, self.combo_dirty, results)
+
+    def combo_set(self, idx, entry):
+        self.combo_stage(idx, entry)
+        self.combo_commit()
 
     def save_combo(self):
         combo = []
@@ -40,7 +53,9 @@ class ProtocolCombo(BaseProtocol):
             combo.append((entry[0], entry[1], entry[2], entry[3], entry[4]))
         return combo
 
-    def restore_combo(self, data):
+    def restore_combo(self, data, commit=True):
         for x, e in enumerate(data):
             if x < self.combo_count:
-                self.combo_set(x, e)
+                self.combo_stage(x, tuple(e))
+        if commit:
+            self.combo_commit()
@@ -3,7 +3,11 @@ import struct
 
 from protocol.base_protocol import BaseProtocol
 from protocol.constants import CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, DYNAMIC_VIAL_GET_NUMBER_OF_ENTRIES, \
-    VIAL_PROTOCOL_DYNAMIC
+    VIAL_PROTOCOL_DYNAMIC, DYNAMIC_VIAL_TAP_DANCE_SET, DYNAMIC_VIAL_COMBO_SET, DYNAMIC_VIAL_KEY_OVERRIDE_SET, \
+    DYNAMIC_VIAL_TAP_DANCE_GET, DYNAMIC_VIAL_COMBO_GET, DYNAMIC_VIAL_KEY_OVERRIDE_GET
+from protocol.combo import COMBO_ENTRY
+from protocol.key_override import KEY_OVERRIDE_ENTRY
+from protocol.tap_dance import TAP_DANCE_ENTRY
 
 
 class ProtocolDynamic(BaseProtocol):
@@ -22,3 +26,48 @@ class ProtocolDynamic(BaseProtocol):
         self.tap_dance_count = data[0]
         self.combo_count = data[1]
         self.key_override_count = data[2]
+
+    def iter_dynamic_entries(self):
+        """
+        Fetches tap dance, combo and key override entries as one batch. Every entry is stored as soon as
+        it arrives and then yielded as (table, idx), so partially loaded tables can already be shown;
+        entries not received yet are None
+        """
+        self.tap_dance_entries = [None] * self.tap_dance_count
+        self.combo_entries = [None] * self.combo_count
+        self.key_override_entries = [None] * self.key_override_count
+        self.tap_dance_dirty = set()
+        self.combo_dirty = set()
+        self.key_override_dirty = set()
+
+        tables = {
+            DYNAMIC_VIAL_TAP_DANCE_GET: ("tap_dance", self.tap_dance_entries, self._tap_dance_decode),
+            DYNAMIC_VIAL_COMBO_GET: ("combo", self.combo_entries, self._combo_decode),
+            DYNAMIC_VIAL_KEY_OVERRIDE_GET: ("key_override", self.key_override_entries, self._key_override_decode),
+        }
+        for cmd, idx, entry in self._iter_dynamic_entries([
+            (DYNAMIC_VIAL_TAP_DANCE_GET, self.tap_dance_count, TAP_DANCE_ENTRY),
+            (DYNAMIC_VIAL_COMBO_GET, self.combo_count, COMBO_ENTRY),
+            (DYNAMIC_VIAL_KEY_OVERRIDE_GET, self.key_override_count, KEY_OVERRIDE_ENTRY),
+        ]):
+            table, entries, decode = tables[cmd]
+            entries[idx] = decode(entry)
+            yield table, idx
+
+    def reload_dynamic_entries(self):
+        """
+        Loads all tap dance, combo and key override entries. Keyboard.reload runs before any editor exists,
+        so nothing renders partially loaded tables yet, iter_dynamic_entries is there for callers that can
+        """
+        for _ in self.iter_dynamic_entries():
+            pass
+
+    def dynamic_commit(self):
+        """ Sends staged tap dance, combo and key override entries as one batch, returns {table: {idx: success}} """
+        results = self._commit_dynamic_writes(self._tap_dance_writes() + self._combo_writes() +
+                                              self._key_override_writes())
+        return {
+            "tap_dance": self._dynamic_committed(DYNAMIC_VIAL_TAP_DANCE_SET, self.tap_dance_dirty, results),
+            "combo": self._dynamic_committed(DYNAMIC_VIAL_COMBO_SET, self.combo_dirty, results),
+            "key_override": self._dynamic_committed(DYNAMIC_VIAL_KEY_OVERRIDE_SET, self.key_override_dirty, results),
+        }
@@ -3,9 +3,10 @@ import struct
 
 from keycodes.keycodes import Keycode, RESET_KEYCODE
 from protocol.base_protocol import BaseProtocol
-from protocol.constants import DYNAMIC_VIAL_KEY_OVERRIDE_GET, CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP, \
-    DYNAMIC_VIAL_KEY_OVERRIDE_SET
-from unlocker import Unlocker
+from protocol.constants import DYNAMIC_VIAL_KEY_OVERRIDE_GET, DYNAMIC_VIAL_KEY_OVERRIDE_SET
+
+
+KEY_OVERRIDE_ENTRY = struct.Struct("<HHHBBBB")
 
 
 class KeyOverrideOptions:
@@ -43,9 +44,9 @@ class KeyOverrideEntry:
 
     def serialize(self):
         """ Serializes into a vial_key_override_entry_t object """
-        return struct.pack("<HHHBBBB", Keycode.deserialize(self.trigger), Keycode.deserialize(self.replacement),
-                           self.layers, self.trigger_mods, self.negative_mod_mask, self.suppressed_mods,
-                           self.options.serialize())
+        return KEY_OVERRIDE_ENTRY.pack(Keycode.deserialize(self.trigger), Keycode.deserialize(self.replacement),
+                                       self.layers, self.trigger_mods, self.negative_mod_mask, self.suppressed_mods,
+                                       self.options.serialize())
 
     def __repr__(self):
         return "KeyOverride<trigger={} replacement={} layers={} trigger_mods={} negative_mod_mask={} " \
@@ -82,32 +83,45 @@ class KeyOverrideEntry:
 
 class ProtocolKeyOverride(BaseProtocol):
 
+    @staticmethod
+    def _key_override_decode(e):
+        return KeyOverrideEntry((Keycode.serialize(e[0]), Keycode.serialize(e[1]), e[2], e[3], e[4], e[5], e[6]))
+
     def reload_key_override(self):
-        entries = self._retrieve_dynamic_entries(DYNAMIC_VIAL_KEY_OVERRIDE_GET,
-                                                 self.key_override_count, "<HHHBBBB")
-        self.key_override_entries = []
-        for e in entries:
-            e = (Keycode.serialize(e[0]), Keycode.serialize(e[1]), e[2], e[3], e[4], e[5], e[6])
-            self.key_override_entries.append(KeyOverrideEntry(e))
+        self.key_override_entries = [self._key_override_decode(e) for e in self._retrieve_dynamic_entries(
+            DYNAMIC_VIAL_KEY_OVERRIDE_GET, self.key_override_count, KEY_OVERRIDE_ENTRY)]
+        self.key_override_dirty = set()
 
     def key_override_get(self, idx):
         return self.key_override_entries[idx]
 
-    def key_override_set(self, idx, entry):
+    def key_override_stage(self, idx, entry):
+        """ Changes an entry locally, it is sent to the keyboard by the next key_override_commit """
         if entry != self.key_override_entries[idx]:
-            if entry.replacement == RESET_KEYCODE:
-                Unlocker.unlock(self)
-
             self.key_override_entries[idx] = entry
-            self.usb_send(self.dev, struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP,
-                                                DYNAMIC_VIAL_KEY_OVERRIDE_SET, idx) + entry.serialize())
+            self.key_override_dirty.add(idx)
+
+    def _key_override_writes(self):
+        return self._dynamic_writes(DYNAMIC_VIAL_KEY_OVERRIDE_SET, self.key_override_entries, self.key_override_dirty,
+                                    KeyOverrideEntry.serialize, lambda entry: entry.replacement == RESET_KEYCODE)
+
+    def key_override_commit(self):
+        """ Sends all staged entries, returns {idx: success} """
+        results = self._commit_dynamic_writes(self._key_override_writes())
+        return self._dynamic_committed(DYNAMIC_VIAL_KEY_OVERRIDE_SET, self.key_override_dirty, results)
+
+    def key_override_set(self, idx, entry):
+        self.key_override_stage(idx, entry)
+        self.key_override_commit()
 
     def save_key_override(self):
         return [e.save() for e in self.key_override_entries]
 
-    def restore_key_override(self, data):
+    def restore_key_override(self, data, commit=True):
         for x, e in enumerate(data):
             if x < self.key_override_count:
                 ko = KeyOverrideEntry()
                 ko.restore(e)
-                self.key_override_set(x, ko)
+                self.key_override_stage(x, ko)
+        if commit:
+            self.key_override_commit()
@@ -2,10 +2,11 @@
 import struct
 import json
 import lzma
+import threading
 from collections import OrderedDict
 
 from keycodes.keycodes import RESET_KEYCODE, Keycode, recreate_keyboard_keycodes
-from kle_serial import Serial as KleSerial
+from kle_serial import Serial as KleSerial, LayoutCache
 from protocol.combo import ProtocolCombo
 from protocol.constants import CMD_VIA_GET_PROTOCOL_VERSION, CMD_VIA_GET_KEYBOARD_VALUE, CMD_VIA_SET_KEYBOARD_VALUE, \
     CMD_VIA_SET_KEYCODE, CMD_VIA_LIGHTING_SET_VALUE, CMD_VIA_LIGHTING_GET_VALUE, CMD_VIA_LIGHTING_SAVE, \
@@ -22,7 +23,13 @@ from protocol.macro import ProtocolMacro
 from protocol.tap_dance import ProtocolTapDance
 from protocol.yr_mag import ProtocolYrMag
 from unlocker import Unlocker
-from util import MSG_LEN, hid_send
+from util import MSG_LEN, hid_send, hid_send_batch, synchronized
+
+# matrix bytes that fit in one VIA_SWITCH_MATRIX_STATE report
+MATRIX_SINGLE_REPORT = 28
+# first VIA protocol whose VIA_SWITCH_MATRIX_STATE takes a start row, older firmware ignores it and
+# answers every chunk with the first rows
+VIA_PROTOCOL_MATRIX_OFFSET = 12
 
 SUPPORTED_VIA_PROTOCOL = [-1, 9]
 SUPPORTED_VIAL_PROTOCOL = [-1, 0, 1, 2, 3, 4, 5, 6]
@@ -32,12 +39,65 @@ class ProtocolError(Exception):
     pass
 
 
+def parse_layout(keymap):
+    serial = KleSerial()
+    kb = serial.deserialize(keymap, keep_styling=False)
+
+    keys = []
+    encoders = []
+
+    for key in kb.keys:
+        key.row = key.col = None
+        key.encoder_idx = key.encoder_dir = None
+        if key.labels[4] == "e":
+            idx, direction = key.labels[0].split(",")
+            key.encoder_idx = int(idx)
+            key.encoder_dir = int(direction)
+            encoders.append(key)
+        elif key.decal or (key.labels[0] and "," in key.labels[0]):
+            row, col = 0, 0
+            if key.labels[0] and "," in key.labels[0]:
+                row, col = key.labels[0].split(",")
+                row, col = int(row), int(col)
+            key.row = row
+            key.col = col
+            keys.append(key)
+
+        # bottom right corner determines layout index and option in this layout
+        key.layout_index = -1
+        key.layout_option = -1
+        if key.labels[8]:
+            idx, opt = key.labels[8].split(",")
+            key.layout_index, key.layout_option = int(idx), int(opt)
+
+    return keys, encoders
+
+
+# only the last opened keyboard, so its kle keys and the geometry shared through them go away once it is closed
+# and another one is opened
+parsed_layouts = LayoutCache(parse_layout, size=1)
+
+
+def deserialize_layout(keymap):
+    """
+    Parses the KLE keymap of a keyboard definition into (keys, encoders), tagging every key with its
+    matrix position or encoder index/direction and with its layout option. Reopening the same keyboard
+    reuses the keys parsed the first time
+    """
+
+    keys, encoders = parsed_layouts.get(keymap)
+    return list(keys), list(encoders)
+
+
 class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo, ProtocolKeyOverride, ProtocolYrMag):
     """ Low-level communication with a vial-enabled keyboard """
 
     def __init__(self, dev, usb_send=hid_send):
         self.dev = dev
-        self.usb_send = usb_send
+        self.usb_lock = threading.RLock()
+        self.usb_send = synchronized(usb_send, self.usb_lock)
+        # requests can only be pipelined when talking to the device directly
+        self.usb_send_batch = hid_send_batch if usb_send is hid_send else None
         self.definition = None
 
         # n.b. using OrderedDict here to make order of layout requests consistent for tests
@@ -54,6 +114,8 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
         self.vibl = False
         self.custom_keycodes = None
         self.midi = None
+        # name -> MagnetProfile, kept in sync with the on-disk store by the magnet editor
+        self.magnet_profiles = dict()
 
         self.lighting_qmk_rgblight = self.lighting_qmk_backlight = self.lighting_vialrgb = False
 
@@ -93,17 +155,12 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
         # at this stage we have correct keycode info and can reload everything that depends on keycodes
         self.reload_keymap()
         self.reload_macros_late()
-        self.reload_tap_dance()
-        self.reload_combo()
-        self.reload_key_override()
+        self.reload_dynamic_entries()
 
         #reload apc/rt/dks if support
+        self.mag_dks = dict()
         if self.keyboard_type == "magnet":
-            self.mag_apc = dict()
-            self.reload_apc()
-            self.mag_rt = dict()
-            self.reload_rt()
-            self.mag_dks = dict()
+            self.reload_magnet()
             self.reload_dks()
             self.top_deadband_lv = 0
             self.bottom_deadband_lv = 0
@@ -171,40 +228,12 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
         self.custom_keycodes = payload.get("customKeycodes", None)
         self.keyboard_type = payload.get("keyboardType", None)
 
-
-        serial = KleSerial()
-        kb = serial.deserialize(payload["layouts"]["keymap"])
-
-        self.keys = []
-        self.encoders = []
-
-        for key in kb.keys:
-            key.row = key.col = None
-            key.encoder_idx = key.encoder_dir = None
-            if key.labels[4] == "e":
-                idx, direction = key.labels[0].split(",")
-                idx, direction = int(idx), int(direction)
-                key.encoder_idx = idx
-                key.encoder_dir = direction
-                self.encoderpos[idx] = True
-                self.encoder_count = max(self.encoder_count, idx + 1)
-                self.encoders.append(key)
-            elif key.decal or (key.labels[0] and "," in key.labels[0]):
-                row, col = 0, 0
-                if key.labels[0] and "," in key.labels[0]:
-                    row, col = key.labels[0].split(",")
-                    row, col = int(row), int(col)
-                key.row = row
-                key.col = col
-                self.rowcol[(row, col)] = True
-                self.keys.append(key)
-
-            # bottom right corner determines layout index and option in this layout
-            key.layout_index = -1
-            key.layout_option = -1
-            if key.labels[8]:
-                idx, opt = key.labels[8].split(",")
-                key.layout_index, key.layout_option = int(idx), int(opt)
+        self.keys, self.encoders = deserialize_layout(payload["layouts"]["keymap"])
+        for key in self.encoders:
+            self.encoderpos[key.encoder_idx] = True
+            self.encoder_count = max(self.encoder_count, key.encoder_idx + 1)
+        for key in self.keys:
+            self.rowcol[(key.row, key.col)] = True
 
     def reload_keymap(self):
         """ Load current key mapping from the keyboard """
@@ -414,12 +443,15 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
         data["tap_dance"] = self.save_tap_dance()
         data["combo"] = self.save_combo()
         data["key_override"] = self.save_key_override()
+        data["dks"] = self.save_dks()
+        if self.keyboard_type == "magnet":
+            data["magnet"] = self.save_magnet()
         data["settings"] = self.settings
 
         return json.dumps(data).encode("utf-8")
 
     def restore_layout(self, data):
-        """ Restores saved layout """
+        """ Restores saved layout, returns (table, idx) of dynamic entries the keyboard didn't accept """
 
         data = json.loads(data.decode("utf-8"))
 
@@ -439,9 +471,19 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
         self.set_layout_options(data["layout_options"])
         self.restore_macros(data.get("macro"))
 
-        self.restore_tap_dance(data.get("tap_dance", []))
-        self.restore_combo(data.get("combo", []))
-        self.restore_key_override(data.get("key_override", []))
+        self.restore_tap_dance(data.get("tap_dance", []), commit=False)
+        self.restore_combo(data.get("combo", []), commit=False)
+        self.restore_key_override(data.get("key_override", []), commit=False)
+        failed = []
+        for table, results in self.dynamic_commit().items():
+            for idx, success in sorted(results.items()):
+                if not success:
+                    print("Failed to restore {} entry {}".format(table, idx))
+                    failed.append((table, idx))
+
+        self.restore_dks(data.get("dks", []))
+        if self.keyboard_type == "magnet" and "magnet" in data:
+            self.restore_magnet(data["magnet"])
 
         for qsid, value in data.get("settings", dict()).items():
             from editor.qmk_settings import QmkSettings
@@ -450,6 +492,8 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
             if QmkSettings.is_qsid_supported(qsid):
                 self.qmk_settings_set(qsid, value)
 
+        return failed
+
     def reset(self):
         self.usb_send(self.dev, struct.pack("B", 0xB))
         self.dev.close()
@@ -520,6 +564,36 @@ class Keyboard(ProtocolMacro, ProtocolDynamic, ProtocolTapDance, ProtocolCombo,
                              retries=3)
         return data
 
+    def matrix_state_supported(self):
+        """ Whether the firmware can report this keyboard's whole switch matrix """
+        # same check the firmware does before answering the single report form
+        if (self.cols // 8 + 1) * self.rows <= MATRIX_SINGLE_REPORT:
+            return True
+        return self.via_protocol >= VIA_PROTOCOL_MATRIX_OFFSET
+
+    def matrix_state(self):
+        """
+        Returns the whole switch matrix, rows * ceil(cols / 8) bytes. Matrices which don't fit a single report
+        are read in chunks of rows, the start row goes in byte 2 and the rows come back from byte 3 on
+        """
+        if self.via_protocol < 0:
+            return
+
+        row_size = (self.cols + 7) // 8
+        if (self.cols // 8 + 1) * self.rows <= MATRIX_SINGLE_REPORT:
+            return self.matrix_poll()[2:2 + row_size * self.rows]
+        if not self.matrix_state_supported():
+            raise RuntimeError("switch matrix doesn't fit one report and the firmware can't read it in chunks")
+
+        rows_per_chunk = MATRIX_SINGLE_REPORT // row_size
+        offsets = list(range(0, self.rows, rows_per_chunk))
+        msgs = [struct.pack("BBB", CMD_VIA_GET_KEYBOARD_VALUE, VIA_SWITCH_MATRIX_STATE, offset) for offset in offsets]
+        data = b""
+        for offset, chunk in zip(offsets, self._send_batch(msgs, retries=3)):
+            rows = min(rows_per_chunk, self.rows - offset)
+            data += chunk[3:3 + row_size * rows]
+        return data
+
     def qmk_settings_set(self, qsid, value):
         from editor.qmk_settings import QmkSettings
         self.settings[qsid] = value
@@ -4,6 +4,7 @@ from keycodes.keycodes import Keycode
 from macro.macro_action import SS_TAP_CODE, SS_DOWN_CODE, SS_UP_CODE, ActionText, ActionTap, ActionDown, ActionUp, \
     SS_QMK_PREFIX, SS_DELAY_CODE, ActionDelay, VIAL_MACRO_EXT_TAP, VIAL_MACRO_EXT_DOWN, VIAL_MACRO_EXT_UP
 from macro.macro_action_ui import tag_to_action
+from macro.macro_compaction import MacroCompactionPlan
 from protocol.base_protocol import BaseProtocol
 from protocol.constants import CMD_VIA_MACRO_GET_COUNT, CMD_VIA_MACRO_GET_BUFFER_SIZE, CMD_VIA_MACRO_GET_BUFFER, \
     CMD_VIA_MACRO_SET_BUFFER, BUFFER_FETCH_CHUNK, VIAL_PROTOCOL_ADVANCED_MACROS
@@ -239,3 +240,11 @@ class ProtocolMacro(BaseProtocol):
             macros += [b""] * (self.macro_count - len(macros))
         macros = macros[:self.macro_count]
         return [self.macro_deserialize(x) for x in macros]
+
+    def macro_compaction_plan(self, data=None):
+        """
+        Proposes a smaller encoding for a macro buffer, by default the one currently on the keyboard
+        """
+        if data is None:
+            data = self.macro
+        return MacroCompactionPlan(self, data)
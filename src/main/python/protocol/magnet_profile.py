@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+
+class MagnetProfile:
+
+    """ Named snapshot of per-key APC/RT records and the global deadband of a magnet keyboard """
+
+    def __init__(self, name, records=None, deadband=(0, 0)):
+        self.name = name
+        # (row, col) -> (apc, rt_sw, rt_release, rt_press)
+        self.records = dict(records or {})
+        self.deadband = tuple(deadband)
+
+    @classmethod
+    def from_keyboard(cls, name, keyboard):
+        records = {(row, col): keyboard.mag.get_key_record(row, col) for row, col in keyboard.rowcol}
+        return cls(name, records, (keyboard.top_deadband_lv, keyboard.bottom_deadband_lv))
+
+    def diff(self, keyboard):
+        """
+        Returns what has to be written to switch the keyboard to this profile:
+        ({(row, col): record} for keys that differ, (top, bottom) deadband or None if it already matches)
+        """
+        records = dict()
+        for (row, col), record in self.records.items():
+            if (row, col) in keyboard.rowcol and keyboard.mag.get_key_record(row, col) != record:
+                records[(row, col)] = record
+        deadband = None
+        if (keyboard.top_deadband_lv, keyboard.bottom_deadband_lv) != self.deadband:
+            deadband = self.deadband
+        return records, deadband
+
+    def save(self):
+        """ Serializes into Vial layout file """
+        return {"name": self.name, "deadband": list(self.deadband),
+                "keys": [[row, col] + list(record) for (row, col), record in sorted(self.records.items())]}
+
+    @classmethod
+    def load(cls, data):
+        records = {(key[0], key[1]): tuple(key[2:6]) for key in data["keys"]}
+        return cls(data["name"], records, data["deadband"])
+
+    def __eq__(self, other):
+        return isinstance(other, MagnetProfile) and self.save() == other.save()
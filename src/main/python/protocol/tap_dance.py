@@ -3,36 +3,50 @@ import struct
 
 from keycodes.keycodes import Keycode, RESET_KEYCODE
 from protocol.base_protocol import BaseProtocol
-from protocol.constants import DYNAMIC_VIAL_TAP_DANCE_GET, CMD_VIA_VIAL_PREFIX, DYNAMIC_VIAL_TAP_DANCE_SET, \
-    CMD_VIAL_DYNAMIC_ENTRY_OP
-from unlocker import Unlocker
+from protocol.constants import DYNAMIC_VIAL_TAP_DANCE_GET, DYNAMIC_VIAL_TAP_DANCE_SET
+
+
+TAP_DANCE_ENTRY = struct.Struct("<HHHHH")
 
 
 class ProtocolTapDance(BaseProtocol):
 
+    @staticmethod
+    def _tap_dance_decode(entry):
+        return (Keycode.serialize(entry[0]), Keycode.serialize(entry[1]), Keycode.serialize(entry[2]),
+                Keycode.serialize(entry[3]), entry[4])
+
     def reload_tap_dance(self):
-        self.tap_dance_entries = self._retrieve_dynamic_entries(DYNAMIC_VIAL_TAP_DANCE_GET,
-                                                                self.tap_dance_count, "<HHHHH")
-        for x, entry in enumerate(self.tap_dance_entries):
-            self.tap_dance_entries[x] = (Keycode.serialize(entry[0]), Keycode.serialize(entry[1]),
-                                         Keycode.serialize(entry[2]), Keycode.serialize(entry[3]),
-                                         entry[4])
+        self.tap_dance_entries = [self._tap_dance_decode(e) for e in self._retrieve_dynamic_entries(
+            DYNAMIC_VIAL_TAP_DANCE_GET, self.tap_dance_count, TAP_DANCE_ENTRY)]
+        self.tap_dance_dirty = set()
 
     def tap_dance_get(self, idx):
         return self.tap_dance_entries[idx]
 
-    def tap_dance_set(self, idx, entry):
+    def tap_dance_stage(self, idx, entry):
+        """ Changes an entry locally, it is sent to the keyboard by the next tap_dance_commit """
         if self.tap_dance_entries[idx] == entry:
             return
-        for x in range(4):
-            if entry[x] == RESET_KEYCODE:
-                Unlocker.unlock(self)
         self.tap_dance_entries[idx] = entry
-        entry = [Keycode.deserialize(entry[0]), Keycode.deserialize(entry[1]), Keycode.deserialize(entry[2]),
-                 Keycode.deserialize(entry[3]), entry[4]]
-        serialized = struct.pack("<HHHHH", *entry)
-        self.usb_send(self.dev, struct.pack("BBBB", CMD_VIA_VIAL_PREFIX, CMD_VIAL_DYNAMIC_ENTRY_OP,
-                                            DYNAMIC_VIAL_TAP_DANCE_SET, idx) + serialized, retries=20)
+        self.tap_dance_dirty.add(idx)
+
+    def _tap_dance_writes(self):
+        def serialize(entry):
+            return TAP_DANCE_ENTRY.pack(Keycode.deserialize(entry[0]), Keycode.deserialize(entry[1]),
+                                        Keycode.deserialize(entry[2]), Keycode.deserialize(entry[3]), entry[4])
+
+        return self._dynamic_writes(DYNAMIC_VIAL_TAP_DANCE_SET, self.tap_dance_entries, self.tap_dance_dirty,
+                                    serialize, lambda entry: RESET_KEYCODE in entry[:4])
+
+    def tap_dance_commit(self):
+        """ Sends all staged entries, returns {idx: success} """
+        results = self._commit_dynamic_writes(self._tap_dance_writes())
+        return self._dynamic_committed(DYNAMIC_VIAL_TAP_DANCE_SET, self.tap_dance_dirty, results)
+
+    def tap_dance_set(self, idx, entry):
+        self.tap_dance_stage(idx, entry)
+        self.tap_dance_commit()
 
     def save_tap_dance(self):
         tap_dance = []
@@ -40,7 +54,9 @@ class ProtocolTapDance(BaseProtocol):
             tap_dance.append((entry[0], entry[1], entry[2], entry[3], entry[4]))
         return tap_dance
 
-    def restore_tap_dance(self, data):
+    def restore_tap_dance(self, data, commit=True):
         for x, e in enumerate(data):
             if x < self.tap_dance_count:
-                self.tap_dance_set(x, e)
+                self.tap_dance_stage(x, tuple(e))
+        if commit:
+            self.tap_dance_commit()
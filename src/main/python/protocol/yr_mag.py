@@ -1,7 +1,9 @@
 import struct
+from array import array
 
 from keycodes.keycodes import Keycode
 from protocol.base_protocol import BaseProtocol
+from protocol.magnet_profile import MagnetProfile
 from protocol.constants import CMD_VIA_MACRO_GET_COUNT, CMD_VIA_MACRO_GET_BUFFER_SIZE, CMD_VIA_MACRO_GET_BUFFER, \
     CMD_VIA_MACRO_SET_BUFFER, BUFFER_FETCH_CHUNK, VIAL_PROTOCOL_ADVANCED_MACROS
 from unlocker import Unlocker
@@ -29,6 +31,18 @@ YR_PROTOCOL_MAG_TRAVEL_SHOW = 10
 YR_PROTOCOL_MAG_DEADBAND = 11
 YR_PROTOCOL_MAG_ALL = 12
 
+# YR_PROTOCOL_MAG_ALL request: get/set, prefix, cmd, row, col, count, then count records of
+# apc, rt_sw, rt_release, rt_press for consecutive matrix positions starting at row, col
+MAG_ALL_HEADER = 6
+MAG_ALL_RECORD = 4
+MAG_ALL_KEYS_PER_PACKET = (32 - MAG_ALL_HEADER) // MAG_ALL_RECORD
+
+# fields of a YR_PROTOCOL_MAG_ALL record
+MAG_RECORD_APC = 0
+MAG_RECORD_RT_SW = 1
+MAG_RECORD_RT_RELEASE = 2
+MAG_RECORD_RT_PRESS = 3
+
 DKS_EVENT_0 = 0
 DKS_EVENT_1 = 1
 DKS_EVENT_2 = 2
@@ -37,30 +51,27 @@ DKS_EVENT_3 = 3
 DKS_EVENT_MAX = 4
 DKS_KEY_MAX = 4
 
+# event bitfields followed by the keycodes, as the firmware stores a DKS slot
+DKS_SLOT = struct.Struct(">{}s{}H".format(DKS_EVENT_MAX, DKS_KEY_MAX))
+
 class DksKey:
+
+    """
+    DKS slot of one key: up to four keycodes and, for each travel event, which of them go down or up.
+    Events are kept exactly as pack_dks sends them, bit j is key j going down and bit j + 4 is key j going up
+    """
+
     def __init__(self):
-        self.down_events = ([0,0,0,0],[0,0,0,0],[0,0,0,0],[0,0,0,0])
-        self.up_events = ([0,0,0,0],[0,0,0,0],[0,0,0,0],[0,0,0,0])
-        self.keys = ["KC_NO","KC_NO","KC_NO","KC_NO"]
+        self.events = bytearray(DKS_EVENT_MAX)
+        self.keys = ["KC_NO"] * DKS_KEY_MAX
         self.dirty = False
 
     def is_dirty(self):
         return self.dirty
-    
+
     def is_valid(self):
-        for k in self.keys:
-            if k != "KC_NO":
-                return True
-        for t in self.down_events:
-            for e in t:
-                if e != 0:
-                    return True
-        for t in self.up_events:
-            for e in t:
-                if e != 0:
-                    return True
-        return False
-    
+        return any(self.events) or any(k != "KC_NO" for k in self.keys)
+
     def set_dirty(self, dirty):
         self.dirty = dirty
 
@@ -77,12 +88,9 @@ class DksKey:
         kc = Keycode.find_outer_keycode(self.keys[index])
         if kc is None:
             return
-        
-        keycode = kc.qmk_id.replace("(kc)", "({})".format(key))
-        self.keys[index] = keycode
-        self.dirty = True
 
-        print("DKS keys: index={}, code={}".format(index, keycode))
+        self.keys[index] = kc.qmk_id.replace("(kc)", "({})".format(key))
+        self.dirty = True
 
     def add_key(self, index, key):
         if index < DKS_KEY_MAX:
@@ -93,20 +101,24 @@ class DksKey:
         else:
             print("DKS failed to add key: index ={}, key={}".format(index, key))
             return False
-    
+
     def del_key(self, index):
         if self.keys[index] != "KC_NO":
             self.keys[index] = "KC_NO"
             self.dirty = True
 
+    @staticmethod
+    def event_bit(key, down):
+        return 1 << (key if down else key + DKS_KEY_MAX)
+
     def add_event(self, event, key, down):
         if event >= DKS_EVENT_MAX:
             print("DKS failed to set event: index={}, key={}, down={}".format(event, key, down))
             return False
 
-        evts = self.down_events if down else self.up_events
-        if evts[event][key] == 0:
-            evts[event][key] = 1
+        bit = self.event_bit(key, down)
+        if not self.events[event] & bit:
+            self.events[event] |= bit
             self.dirty = True
         return True
 
@@ -115,125 +127,99 @@ class DksKey:
             print("DKS failed to clear event: index={}, key={}, down={}".format(event, key, down))
             return False
 
-        evts = self.down_events if down else self.up_events
-        if evts[event][key] == 1:
-            evts[event][key] = 0
+        bit = self.event_bit(key, down)
+        if self.events[event] & bit:
+            self.events[event] &= ~bit
             self.dirty = True
         return True
 
     def pack_dks(self):
-        evts = [0,0,0,0]
-        for i in range(DKS_EVENT_MAX):
-            for j in range(4):
-                if self.down_events[i][j] > 0:
-                    evts[i] |= 1 << j
-                if self.up_events[i][j] > 0:
-                    evts[i] |= 1 << (j+4)
-        
-        keys = [0,0,0,0]
-        for i in range(len(self.keys)):
-            keys[i] = Keycode.resolve(self.keys[i])
-        
-        data = struct.pack(">BBBBHHHH", 
-                        evts[0], evts[1], evts[2], evts[3],
-                        keys[0], keys[1], keys[2], keys[3])
-        return data
-    
+        return DKS_SLOT.pack(bytes(self.events), *[Keycode.deserialize(k) for k in self.keys])
+
     def save(self):
-        dks = {}
-        dks["down"] = self.down_events
-        dks["up"] = self.up_events
-        dks["codes"] = self.keys
-        return dks
+        return {"events": list(self.events), "codes": list(self.keys)}
 
     def load(self, dks):
-        for i in range(len(self.down_events)):
-            for j in range(len(self.down_events[i])):
-                self.down_events[i][j] = dks["down"][i][j]
-
-        for i in range(len(self.up_events)):
-            for j in range(len(self.up_events[i])):
-                self.down_events[i][j] = dks["up"][i][j]
-
-        for i in range(len(self.keys)):
-            self.keys[i] = dks["codes"][i]
+        if "events" in dks:
+            self.events = bytearray(dks["events"])
+        else:
+            # older layout files spell every event out as nested down/up lists
+            self.events = bytearray(DKS_EVENT_MAX)
+            for i in range(DKS_EVENT_MAX):
+                for j in range(DKS_KEY_MAX):
+                    if dks["down"][i][j]:
+                        self.events[i] |= self.event_bit(j, True)
+                    if dks["up"][i][j]:
+                        self.events[i] |= self.event_bit(j, False)
+        self.keys = list(dks["codes"])
 
     def is_same(self, dks):
-        for i in range(len(self.down_events)):
-            for j in range(len(self.down_events[i])):
-                if self.down_events[i][j] != dks["down"][i][j]:
-                    return False
-
-        for i in range(len(self.up_events)):
-            for j in range(len(self.up_events[i])):
-                if self.down_events[i][j] != dks["up"][i][j]:
-                    return False
-
-        for i in range(len(self.keys)):
-            if self.keys[i] != dks["codes"][i]:
-                return False
-
-        return True
+        other = DksKey()
+        other.load(dks)
+        return self.events == other.events and self.keys == other.keys
 
     def parse(self, data):
-        print("Parse DKS")
-        for i in range(4):
-            print("Event:{:b}".format(data[i]))
-            for j in range(4):
-                if data[i] & (1<<j) > 0:
-                    self.down_events[i][j] = 1
-                else:
-                    self.down_events[i][j] = 0
-
-                if data[i] & (1<<(j+4)) > 0:
-                    self.up_events[i][j] = 1
-                else:
-                    self.up_events[i][j] = 0
-
-        keys = struct.unpack(">HHHH", data[4:13])
-        for i in range(4):
-            self.keys[i] = Keycode.serialize(keys[i])
-            print("Keys", self.keys[i])
-
+        """ Loads the slot from the DKS_SLOT encoding used on the wire """
+        events, *keys = DKS_SLOT.unpack_from(bytes(data))
+        self.events = bytearray(events)
+        self.keys = [Keycode.serialize(k) for k in keys]
 
     def clear(self):
-        for i in range(len(self.keys)):
-            self.keys[i] = "KC_NO"
-
-        for i in range(DKS_EVENT_MAX):
-            for j in range(4):
-                self.down_events[i][j] = 0
-                self.up_events[i][j] = 0
-
+        self.events = bytearray(DKS_EVENT_MAX)
+        self.keys = ["KC_NO"] * DKS_KEY_MAX
         self.dirty = True
-    
+
     def get_key(self, index):
         if index < len(self.keys):
             return self.keys[index]
 
         return 0
-    
-    def is_event_on(self, event, index, down):
-        if event < DKS_EVENT_MAX:
-            if down:
-                if index < 4:
-                    return self.down_events[event][index] > 0
-            else:
-                if index < 4:
-                    return self.up_events[event][index] > 0
 
+    def is_event_on(self, event, index, down):
+        if event < DKS_EVENT_MAX and index < DKS_KEY_MAX:
+            return bool(self.events[event] & self.event_bit(index, down))
         return False
 
-    def dump(self):
-        return
-        print("Dump DKSKey")
-        for i in range(4):
-            print("Key({}) is {}".format(i, self.keys[i]))
 
-        for i in range(DKS_EVENT_MAX):
-            for j in range(4):
-                print("Event({}), Down({}) is {:b}".format(i, j, self.down_events[i][j]))
-                print("Event({}), Up({}) is {:b}".format(i, j, self.up_events[i][j]))
+class MagnetTable:
+
+    """ APC and RT settings for every matrix position, one byte array per field indexed by row * cols + col """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.apc = array("B", bytes(rows * cols))
+        self.rt_sw = array("B", bytes(rows * cols))
+        self.rt_release = array("B", bytes(rows * cols))
+        self.rt_press = array("B", bytes(rows * cols))
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def get_apc(self, row, col):
+        return self.apc[self.index(row, col)]
+
+    def set_apc(self, row, col, val):
+        self.apc[self.index(row, col)] = val
+
+    def get_rt(self, row, col):
+        """ Returns (rt_sw, rt_release, rt_press) """
+        idx = self.index(row, col)
+        return self.rt_sw[idx], self.rt_release[idx], self.rt_press[idx]
+
+    def set_rt(self, row, col, val):
+        idx = self.index(row, col)
+        self.rt_sw[idx], self.rt_release[idx], self.rt_press[idx] = val
+
+    def get_record(self, idx):
+        """ Returns the YR_PROTOCOL_MAG_ALL record of a matrix position """
+        return self.apc[idx], self.rt_sw[idx], self.rt_release[idx], self.rt_press[idx]
+
+    def get_key_record(self, row, col):
+        return self.get_record(self.index(row, col))
+
+    def set_record(self, idx, record):
+        self.apc[idx], self.rt_sw[idx], self.rt_release[idx], self.rt_press[idx] = record
 
 
 class ProtocolYrMag(BaseProtocol):
@@ -244,23 +230,57 @@ class ProtocolYrMag(BaseProtocol):
         print("Magment Version:", data[5])
         return data[5]
 
+    def reload_magnet(self):
+        """ Reload APC and RT information from keyboard, in bulk if the firmware supports it """
+        self.mag = MagnetTable(self.rows, self.cols)
+        self.mag_bulk = self.reload_mag_all()
+        if not self.mag_bulk:
+            self.reload_apc()
+            self.reload_rt()
+
+    def reload_mag_all(self):
+        """ Reads every matrix position with YR_PROTOCOL_MAG_ALL, returns False if the firmware doesn't know it """
+        total = self.rows * self.cols
+        headers = []
+        for start in range(0, total, MAG_ALL_KEYS_PER_PACKET):
+            row, col = divmod(start, self.cols)
+            headers.append(struct.pack("BBBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_ALL,
+                                       row, col, min(MAG_ALL_KEYS_PER_PACKET, total - start)))
+        # fill the payload with 0xFF: rt_sw is a flag, so 0xFF there means the request came back untouched
+        msgs = [header + b"\xFF" * (32 - MAG_ALL_HEADER) for header in headers]
+
+        records = []
+        supported = True
+        # read every response even after a bad one so none is left in flight for the fallback
+        for header, data in zip(headers, self._send_batch(msgs)):
+            if data[:MAG_ALL_HEADER] != header or data[MAG_ALL_HEADER + 1] == 0xFF:
+                supported = False
+            for x in range(header[5]):
+                off = MAG_ALL_HEADER + x * MAG_ALL_RECORD
+                records.append(data[off:off + MAG_ALL_RECORD])
+        if not supported:
+            return False
+
+        for idx, record in enumerate(records):
+            self.mag.set_record(idx, record)
+        return True
+
     def reload_apc(self):
-        """ Reload APC information from keyboard """
-        for row, col in self.rowcol.keys():
-            data = self.usb_send(self.dev, 
-                                struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_APC, row, col),
-                                retries=20)
-            data = data[5] & 0xff
-            self.mag_apc[(row, col)] = data
+        """ Reload APC information from keyboard, one key at a time """
+        keys = list(self.rowcol.keys())
+        msgs = [struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_APC, row, col)
+                for row, col in keys]
+        for (row, col), data in zip(keys, self._send_batch(msgs)):
+            self.mag.set_apc(row, col, data[5])
 
     def reload_rt(self):
-        """ Reload RT information from keyboard """
-        for row, col in self.rowcol.keys():
-            data = self.usb_send(self.dev, 
-                                struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_RT_ALL, row, col),
-                                retries=20)
+        """ Reload RT information from keyboard, one key at a time """
+        keys = list(self.rowcol.keys())
+        msgs = [struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_RT_ALL, row, col)
+                for row, col in keys]
+        for (row, col), data in zip(keys, self._send_batch(msgs)):
             # rt_sw, rt_th, rt_set_th
-            self.mag_rt[(row, col)] = [data[5]&0xff, data[6]&0xff, data[7]&0xff]
+            self.mag.set_rt(row, col, (data[5], data[6], data[7]))
             
     def reload_deadband(self):
         """ Reload RT information from keyboard """
@@ -270,49 +290,146 @@ class ProtocolYrMag(BaseProtocol):
         self.bottom_deadband_lv = data[1]
             
     def reload_dks(self):
-        pass
-        # """ Reload DKS information from keyboard """
-        # for row, col in self.rowcol.keys():
-        #     data = self.usb_send(self.dev, 
-        #                         struct.pack("BBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, row, col),
-        #                         retries=20)
-        #     print("DKS:")
-        #     print(data)
-            # dks_data = data[3:15]
-            # dks = DksKey()
-            # dks.parse(dks_data)
-            # self.amk_dks[(row, col)] = dks 
-            # print("AMK protocol: DKS={}, row={}, col={}".format(dks.pack_dks(), row, col))
+        """ Reads the DKS slot of every key in one batch, mag_dks stays empty if the firmware doesn't know DKS """
+        keys = list(self.rowcol.keys())
+        headers = [struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_ADVANCE_DKS, row, col)
+                   for row, col in keys]
+        dks = dict()
+        supported = True
+        # read every response even after a bad one so none is left in flight
+        for key, header, data in zip(keys, headers, self._send_batch(headers)):
+            if data[:len(header)] != header:
+                supported = False
+                continue
+            dks[key] = DksKey()
+            dks[key].parse(data[len(header):len(header) + DKS_SLOT.size])
+        self.mag_dks = dks if supported else dict()
+
+    def dks_stage(self, row, col, dks):
+        """ Changes the DKS slot of a key locally, dks is in the DksKey.save() format """
+        if self.mag_dks[(row, col)].is_same(dks):
+            return
+        self.mag_dks[(row, col)].load(dks)
+        self.mag_dks[(row, col)].set_dirty(True)
 
-    def apply_dks(self, row, col, dks=None):
-        pass
-        # if dks is not None:
-        #     if self.amk_dks[(row, col)].is_same(dks):
-        #         return
-        #     self.amk_dks[(row,col)].load(dks)
+    def dks_commit(self):
+        """ Writes every dirty DKS slot to the keyboard in one batch """
+        dirty = [(key, dks) for key, dks in self.mag_dks.items() if dks.is_dirty()]
+        if not dirty:
+            return
+        msgs = [struct.pack("BBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_ADVANCE_DKS, row, col)
+                + dks.pack_dks() for (row, col), dks in dirty]
+        for _ in self._send_batch(msgs):
+            pass
+        for _, dks in dirty:
+            dks.set_dirty(False)
 
-        # #self.amk_dks[(row,col)].dump()
-        # data = struct.pack("BBBB", AMK_PROTOCOL_PREFIX, AMK_PROTOCOL_SET_DKS, row, col) + self.amk_dks[(row,col)].pack_dks()
-        # data = self.usb_send(self.dev, data, retries=20)
+    def apply_dks(self, row, col, dks=None):
+        """ Stages dks if given, then writes it along with any other pending DKS change """
+        if dks is not None:
+            self.dks_stage(row, col, dks)
+        self.dks_commit()
+
+    def save_dks(self):
+        return [(row, col, dks.save()) for (row, col), dks in self.mag_dks.items() if dks.is_valid()]
+
+    def restore_dks(self, data, commit=True):
+        saved = {(row, col): dks for row, col, dks in data}
+        for (row, col), dks in self.mag_dks.items():
+            if (row, col) in saved:
+                self.dks_stage(row, col, saved[(row, col)])
+            elif dks.is_valid():
+                dks.clear()
+        if commit:
+            self.dks_commit()
 
     def apply_apc(self, row, col, val):
-        if self.mag_apc[(row,col)] == val:
-            return
-        print("Update APC at({},{}), old({}) -> new({})".format(row, col, self.mag_apc[(row,col)], val))
-        self.mag_apc[(row,col)] = val
-        data = struct.pack("BBBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_APC, row, col, val)
-        data = self.usb_send(self.dev, data, retries=20)
+        rt = self.mag.get_rt(row, col)
+        self.apply_magnet({(row, col): (val, rt[0], rt[1], rt[2])})
 
     def apply_rt(self, row, col, val):
-        ori_val = self.mag_rt[(row,col)]
-        if len(val) != 3 or len(ori_val) != 3:
-            return
-        if ori_val[0] == val[0] and ori_val[1] == val[1] and ori_val[2] == val[2] :
+        val = tuple(val)
+        if len(val) != 3:
             return
-        print("Update RT at({},{}), old({}) -> new({})".format(row, col, self.mag_rt[(row,col)], val))
-        self.mag_rt[(row,col)] = val
-        data = struct.pack("BBBBBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_RT_ALL, row, col, val[0], val[1], val[2])
-        data = self.usb_send(self.dev, data, retries=20)
+        self.apply_magnet({(row, col): (self.mag.get_apc(row, col),) + val})
+
+    def apply_magnet(self, records):
+        """
+        Writes APC and RT settings for many keys at once, records maps (row, col) to a YR_PROTOCOL_MAG_ALL record.
+        Keys which already have these settings are skipped, everything else goes out as one batch.
+        Returns the number of keys changed
+        """
+        changed = []
+        for (row, col), record in records.items():
+            idx = self.mag.index(row, col)
+            old = self.mag.get_record(idx)
+            record = tuple(record)
+            if old != record:
+                changed.append((idx, old, record))
+        if not changed:
+            return 0
+
+        for idx, old, record in changed:
+            self.mag.set_record(idx, record)
+        if self.mag_bulk:
+            msgs = self._mag_all_writes(sorted(idx for idx, _, _ in changed))
+        else:
+            msgs = self._mag_key_writes(changed)
+        for _ in self._send_batch(msgs):
+            pass
+        return len(changed)
+
+    def _mag_all_writes(self, indices):
+        """
+        YR_PROTOCOL_MAG_ALL writes covering the given sorted matrix indices. Every packet spans up to
+        MAG_ALL_KEYS_PER_PACKET consecutive positions, unchanged keys in between are sent with their current values
+        """
+        msgs = []
+        x = 0
+        while x < len(indices):
+            start = indices[x]
+            while x < len(indices) and indices[x] < start + MAG_ALL_KEYS_PER_PACKET:
+                x += 1
+            count = indices[x - 1] - start + 1
+            row, col = divmod(start, self.mag.cols)
+            msg = struct.pack("BBBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_ALL, row, col, count)
+            for idx in range(start, start + count):
+                msg += bytes(self.mag.get_record(idx))
+            msgs.append(msg)
+        return msgs
+
+    def _mag_key_writes(self, changed):
+        """ Per key APC and RT_ALL writes for firmware without YR_PROTOCOL_MAG_ALL, only for the fields that changed """
+        msgs = []
+        for idx, old, record in changed:
+            row, col = divmod(idx, self.mag.cols)
+            if old[MAG_RECORD_APC] != record[MAG_RECORD_APC]:
+                msgs.append(struct.pack("BBBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_APC,
+                                        row, col, record[MAG_RECORD_APC]))
+            if old[MAG_RECORD_RT_SW:] != record[MAG_RECORD_RT_SW:]:
+                msgs.append(struct.pack("BBBBBBBB", YR_PROTOCOL_MAG_SET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_RT_ALL,
+                                        row, col, *record[MAG_RECORD_RT_SW:]))
+        return msgs
+
+    def apply_magnet_profile(self, profile):
+        """ Switches to a MagnetProfile writing only what differs, returns the number of settings changed """
+        records, deadband = profile.diff(self)
+        changed = self.apply_magnet(records)
+        if deadband is not None:
+            self.apply_deadband(*deadband)
+            changed += 1
+        return changed
+
+    def save_magnet(self):
+        return {"current": MagnetProfile.from_keyboard("", self).save(),
+                "profiles": [profile.save() for profile in self.magnet_profiles.values()]}
+
+    def restore_magnet(self, data):
+        for profile in data.get("profiles", []):
+            profile = MagnetProfile.load(profile)
+            self.magnet_profiles[profile.name] = profile
+        if "current" in data:
+            self.apply_magnet_profile(MagnetProfile.load(data["current"]))
 
     def apply_deadband(self, top_lv, bottom_lv):
         if self.top_deadband_lv == top_lv and self.bottom_deadband_lv == bottom_lv:
@@ -333,6 +450,15 @@ class ProtocolYrMag(BaseProtocol):
         data = self.usb_send(self.dev, data, retries=20)
         travel = (data[5] & 0xff)
         return travel
+    def get_adc_travel(self, keys):
+        """ Reads ADC and travel of several (row, col) keys as one batch, returns a list of (adc, travel) """
+        msgs = []
+        for row, col in keys:
+            msgs.append(struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_ADC_SHOW, row, col))
+            msgs.append(struct.pack("BBBBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_TRAVEL_SHOW, row, col))
+        data = list(self._send_batch(msgs))
+        return [((adc[5] << 8) | (adc[6] & 0xff), travel[5] & 0xff) for adc, travel in zip(data[0::2], data[1::2])]
+
     def get_deadband(self):
         data = struct.pack("BBB", YR_PROTOCOL_MAG_GET, YR_PROTOCOL_MAG_PREFIX, YR_PROTOCOL_MAG_DEADBAND)
         data = self.usb_send(self.dev, data, retries=20)
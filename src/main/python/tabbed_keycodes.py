@@ -4,15 +4,13 @@ from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import QTabWidget, QWidget, QScrollArea, QApplication, QVBoxLayout
 from PyQt5.QtGui import QPalette
 
-from constants import KEYCODE_BTN_RATIO
 from widgets.display_keyboard import DisplayKeyboard
 from widgets.display_keyboard_defs import ansi_100, ansi_80, ansi_70, iso_100, iso_80, iso_70, mods, mods_narrow
-from widgets.flowlayout import FlowLayout
+from widgets.keycode_grid import KeycodeGrid, KeycodeCell, KeycodeModel
 from keycodes.keycodes import KEYCODES_BASIC, KEYCODES_ISO, KEYCODES_MACRO, KEYCODES_LAYERS, KEYCODES_QUANTUM, \
     KEYCODES_BOOT, KEYCODES_MODIFIERS, \
     KEYCODES_BACKLIGHT, KEYCODES_MEDIA, KEYCODES_SPECIAL, KEYCODES_SHIFTED, KEYCODES_USER, Keycode, \
     KEYCODES_TAP_DANCE, KEYCODES_MIDI, KEYCODES_BASIC_NUMPAD, KEYCODES_BASIC_NAV, KEYCODES_ISO_KR
-from widgets.square_button import SquareButton
 from util import tr, KeycodeDisplay
 
 
@@ -25,17 +23,12 @@ class AlternativeDisplay(QWidget):
 
         self.kb_display = None
         self.keycodes = keycodes
-        self.buttons = []
+        self.keycode_filter = keycode_filter_any
+        self.cells = []
+        self.prefix_cells = [KeycodeCell(title, title) for title, code in prefix_buttons or []]
 
-        self.key_layout = FlowLayout()
-
-        if prefix_buttons:
-            for title, code in prefix_buttons:
-                btn = SquareButton()
-                btn.setRelSize(KEYCODE_BTN_RATIO)
-                btn.setText(title)
-                btn.clicked.connect(lambda st, k=code: self.keycode_changed.emit(title))
-                self.key_layout.addWidget(btn)
+        self.key_grid = KeycodeGrid()
+        self.key_grid.keycode_changed.connect(self.keycode_changed)
 
         layout = QVBoxLayout()
         if kbdef:
@@ -43,38 +36,26 @@ class AlternativeDisplay(QWidget):
             self.kb_display.keycode_changed.connect(self.keycode_changed)
             layout.addWidget(self.kb_display)
             layout.setAlignment(self.kb_display, Qt.AlignHCenter)
-        layout.addLayout(self.key_layout)
+        layout.addWidget(self.key_grid)
         self.setLayout(layout)
 
     def recreate_buttons(self, keycode_filter):
-        for btn in self.buttons:
-            btn.deleteLater()
-        self.buttons = []
-
-        for keycode in self.keycodes:
-            if not keycode_filter(keycode.qmk_id):
-                continue
-            btn = SquareButton()
-            btn.setRelSize(KEYCODE_BTN_RATIO)
-            btn.setToolTip(Keycode.tooltip(keycode.qmk_id))
-            btn.clicked.connect(lambda st, k=keycode: self.keycode_changed.emit(k.qmk_id))
-            btn.keycode = keycode
-            self.key_layout.addWidget(btn)
-            self.buttons.append(btn)
-
+        self.keycode_filter = keycode_filter
         self.relabel_buttons()
 
     def relabel_buttons(self):
         if self.kb_display:
             self.kb_display.relabel_buttons()
 
-        KeycodeDisplay.relabel_buttons(self.buttons)
+        # cells come from the model shared with the other palettes, only the first palette builds them
+        self.cells = KeycodeModel.get().cells_for(self.keycodes, self.keycode_filter)
+        self.key_grid.set_cells(self.prefix_cells + self.cells)
 
     def required_width(self):
         return self.kb_display.sizeHint().width() if self.kb_display else 0
 
     def has_buttons(self):
-        return len(self.buttons) > 0
+        return len(self.cells) > 0
 
 
 class Tab(QScrollArea):
@@ -0,0 +1,94 @@
+import struct
+import unittest
+
+from benchmark import run_benchmark, percentile, BYTES_PER_REQUEST
+from protocol.constants import CMD_VIA_KEYMAP_GET_BUFFER, BUFFER_FETCH_CHUNK
+
+
+class FakeKeyboard:
+
+    def __init__(self, fail_every=0, garble_every=0, locked=False):
+        self.dev = None
+        self.locked = locked
+        self.layers, self.rows, self.cols = 2, 2, 3
+        self.fail_every = fail_every
+        self.garble_every = garble_every
+        self.sent = []
+
+    def usb_send(self, dev, msg, retries=20):
+        self.sent.append(msg)
+        if self.fail_every and len(self.sent) % self.fail_every == 0:
+            raise RuntimeError("failed to communicate with the device")
+        if self.garble_every and len(self.sent) % self.garble_every == 0:
+            return b"\xFF" * 32
+        return msg + b"\x00" * (32 - len(msg))
+
+    def get_unlock_status(self):
+        return 0 if self.locked else 1
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_mix(self):
+        kb = FakeKeyboard()
+        result = run_benchmark(kb, 9, ["protocol", "matrix", "keymap"])
+        self.assertEqual(len(kb.sent), 9)
+        self.assertEqual([len(result.latencies[name]) for name in result.mix], [3, 3, 3])
+        self.assertEqual(result.requests(), 9)
+
+    def test_keymap_offsets(self):
+        kb = FakeKeyboard()
+        run_benchmark(kb, 3, ["keymap"])
+        size = kb.layers * kb.rows * kb.cols * 2
+        offsets = [struct.unpack(">BHB", msg) for msg in kb.sent]
+        self.assertEqual(offsets[0], (CMD_VIA_KEYMAP_GET_BUFFER, 0, min(size, BUFFER_FETCH_CHUNK)))
+        for cmd, offset, sz in offsets:
+            self.assertLessEqual(offset + sz, size)
+
+    def test_weighted_mix(self):
+        result = run_benchmark(FakeKeyboard(), 30, ["matrix", "matrix", "protocol"])
+        self.assertEqual(result.mix, ["matrix", "protocol"])
+        self.assertEqual(len(result.latencies["matrix"]), 20)
+        self.assertEqual(len(result.latencies["protocol"]), 10)
+
+    def test_errors(self):
+        result = run_benchmark(FakeKeyboard(fail_every=4, garble_every=5), 20, ["protocol"])
+        self.assertEqual(result.errors["protocol"], 8)
+        self.assertEqual(len(result.latencies["protocol"]), 12)
+        self.assertIn("40.0%", result.report())
+
+    def test_errors_report_progress(self):
+        done = []
+        run_benchmark(FakeKeyboard(fail_every=1), 120, ["protocol"], done.append)
+        self.assertEqual(done, [0, 50, 100])
+
+    def test_locked(self):
+        kb = FakeKeyboard(locked=True)
+        result = run_benchmark(kb, 10, ["protocol", "matrix"])
+        self.assertEqual(result.mix, ["protocol"])
+        self.assertEqual(len(result.latencies["protocol"]), 10)
+        self.assertIn("Skipped matrix", result.report())
+        with self.assertRaises(ValueError):
+            run_benchmark(kb, 10, ["matrix"])
+
+    def test_throughput(self):
+        result = run_benchmark(FakeKeyboard(), 10, ["protocol"])
+        result.elapsed = 2
+        self.assertEqual(result.throughput(), 5 * BYTES_PER_REQUEST)
+
+    def test_unknown_command(self):
+        with self.assertRaises(ValueError):
+            run_benchmark(FakeKeyboard(), 10, ["nope"])
+
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        self.assertEqual(percentile(ordered, 50), 50)
+        self.assertEqual(percentile(ordered, 99), 99)
+        self.assertEqual(percentile(ordered, 100), 100)
+        self.assertEqual(percentile([], 50), 0)
+        # nearest rank rounds up, the slowest of 60 samples is p99
+        self.assertEqual(percentile(list(range(1, 61)), 99), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from protocol.yr_mag import DksKey, DKS_SLOT, YR_PROTOCOL_MAG_ADVANCE_DKS
+from test.test_magnet_batch import FakeMagnet
+
+
+class TestDks(unittest.TestCase):
+
+    def make_key(self):
+        dks = DksKey()
+        dks.add_key(0, "KC_A")
+        dks.add_key(2, "LSFT(KC_B)")
+        dks.add_event(0, 0, True)
+        dks.add_event(3, 0, False)
+        dks.add_event(1, 2, True)
+        return dks
+
+    def test_pack_parse(self):
+        dks = self.make_key()
+        data = dks.pack_dks()
+        self.assertEqual(len(data), DKS_SLOT.size)
+        self.assertEqual(data[:4], bytes([0x01, 0x04, 0x00, 0x10]))
+
+        parsed = DksKey()
+        parsed.parse(data)
+        self.assertEqual(parsed.keys, ["KC_A", "KC_NO", "LSFT(KC_B)", "KC_NO"])
+        self.assertTrue(parsed.is_event_on(3, 0, False))
+        self.assertFalse(parsed.is_event_on(3, 0, True))
+        self.assertTrue(parsed.is_same(dks.save()))
+
+    def test_legacy_load(self):
+        down = [[0] * 4 for _ in range(4)]
+        up = [[0] * 4 for _ in range(4)]
+        down[0][0] = down[1][2] = 1
+        up[3][0] = 1
+        legacy = {"down": down, "up": up, "codes": ["KC_A", "KC_NO", "LSFT(KC_B)", "KC_NO"]}
+
+        dks = DksKey()
+        dks.load(legacy)
+        # up events used to be compared against and loaded into the down events
+        self.assertTrue(dks.is_same(self.make_key().save()))
+        self.assertTrue(self.make_key().is_same(legacy))
+        up[3][0] = 0
+        self.assertFalse(self.make_key().is_same(legacy))
+
+    def test_dirty_only_commit(self):
+        kb = FakeMagnet(2, 2, True)
+        kb.mag_dks = {(r, c): DksKey() for r in range(2) for c in range(2)}
+        kb.restore_dks([(1, 0, self.make_key().save())])
+        self.assertEqual([msg[2:5] for msg in kb.sent], [bytes([YR_PROTOCOL_MAG_ADVANCE_DKS, 1, 0])])
+        self.assertEqual(kb.save_dks(), [(1, 0, self.make_key().save())])
+
+        kb.sent = []
+        kb.restore_dks([(1, 0, self.make_key().save())])
+        self.assertEqual(kb.sent, [])
+        kb.restore_dks([])
+        self.assertEqual(len(kb.sent), 1)
+        self.assertEqual(kb.save_dks(), [])
@@ -0,0 +1,105 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from keycodes.keycodes import recreate_keycodes
+from protocol.constants import DYNAMIC_VIAL_TAP_DANCE_SET, DYNAMIC_VIAL_COMBO_SET, DYNAMIC_VIAL_KEY_OVERRIDE_SET
+from protocol.dynamic import ProtocolDynamic
+from protocol.tap_dance import ProtocolTapDance
+from protocol.combo import ProtocolCombo
+from protocol.key_override import ProtocolKeyOverride, KeyOverrideEntry
+
+
+class FakeDynamic(ProtocolDynamic, ProtocolTapDance, ProtocolCombo, ProtocolKeyOverride):
+
+    """ Accepts every write except the (cmd, idx) listed in reject, counts unlock status queries """
+
+    def __init__(self, count=4):
+        self.tap_dance_count = self.combo_count = self.key_override_count = count
+        self.tap_dance_entries = [("KC_NO", "KC_NO", "KC_NO", "KC_NO", 200)] * count
+        self.combo_entries = [("KC_NO",) * 5] * count
+        self.key_override_entries = [KeyOverrideEntry() for _ in range(count)]
+        self.tap_dance_dirty = set()
+        self.combo_dirty = set()
+        self.key_override_dirty = set()
+        self.reject = set()
+        # stop answering once this many writes were sent
+        self.fail_after = None
+        self.sent = []
+        self.unlock_checks = 0
+
+    def usb_send(self, dev, msg, retries=1):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise RuntimeError("failed to communicate with the device")
+        self.sent.append((msg[2], msg[3]))
+        return b"\x01" if (msg[2], msg[3]) in self.reject else b"\x00"
+
+    def get_unlock_status(self, retries=20):
+        self.unlock_checks += 1
+        return 1
+
+
+class TestDynamicCommit(unittest.TestCase):
+
+    def setUp(self):
+        recreate_keycodes()
+
+    def test_unchanged_not_dirty(self):
+        kb = FakeDynamic()
+        kb.tap_dance_stage(0, ("KC_NO", "KC_NO", "KC_NO", "KC_NO", 200))
+        kb.combo_stage(1, ("KC_NO",) * 5)
+        kb.key_override_stage(2, KeyOverrideEntry())
+        self.assertEqual((kb.tap_dance_dirty, kb.combo_dirty, kb.key_override_dirty), (set(), set(), set()))
+        self.assertEqual(kb.dynamic_commit(), {"tap_dance": {}, "combo": {}, "key_override": {}})
+        self.assertEqual(kb.sent, [])
+
+    def test_unlock_only_for_reset(self):
+        kb = FakeDynamic()
+        kb.tap_dance_stage(0, ("KC_A", "KC_NO", "KC_NO", "KC_NO", 200))
+        kb.combo_stage(0, ("KC_A", "KC_B", "KC_NO", "KC_NO", "KC_C"))
+        kb.dynamic_commit()
+        self.assertEqual(kb.unlock_checks, 0)
+
+        kb.tap_dance_stage(1, ("RESET", "KC_NO", "KC_NO", "KC_NO", 200))
+        kb.tap_dance_stage(2, ("KC_NO", "RESET", "KC_NO", "KC_NO", 200))
+        kb.combo_stage(1, ("KC_A", "KC_B", "KC_NO", "KC_NO", "RESET"))
+        kb.dynamic_commit()
+        self.assertEqual(kb.unlock_checks, 1)
+
+    def test_failed_entry_stays_dirty(self):
+        kb = FakeDynamic()
+        kb.reject.add((DYNAMIC_VIAL_COMBO_SET, 2))
+        kb.combo_stage(1, ("KC_A", "KC_B", "KC_NO", "KC_NO", "KC_C"))
+        kb.combo_stage(2, ("KC_A", "KC_C", "KC_NO", "KC_NO", "KC_D"))
+        self.assertEqual(kb.combo_commit(), {1: True, 2: False})
+        self.assertEqual(kb.combo_dirty, {2})
+
+        # only the rejected entry is sent again
+        kb.reject.clear()
+        kb.sent.clear()
+        self.assertEqual(kb.combo_commit(), {2: True})
+        self.assertEqual(kb.sent, [(DYNAMIC_VIAL_COMBO_SET, 2)])
+        self.assertEqual(kb.combo_dirty, set())
+
+    def test_commit_all_tables(self):
+        kb = FakeDynamic()
+        kb.reject.add((DYNAMIC_VIAL_KEY_OVERRIDE_SET, 3))
+        kb.tap_dance_stage(2, ("KC_A", "KC_NO", "KC_NO", "KC_NO", 200))
+        kb.combo_stage(0, ("KC_A", "KC_B", "KC_NO", "KC_NO", "KC_C"))
+        kb.key_override_stage(3, KeyOverrideEntry(["KC_A", "KC_B", 1, 0, 0, 0, 0x80]))
+        self.assertEqual(kb.dynamic_commit(), {"tap_dance": {2: True}, "combo": {0: True},
+                                               "key_override": {3: False}})
+        self.assertEqual(kb.sent, [(DYNAMIC_VIAL_TAP_DANCE_SET, 2), (DYNAMIC_VIAL_COMBO_SET, 0),
+                                   (DYNAMIC_VIAL_KEY_OVERRIDE_SET, 3)])
+        self.assertEqual((kb.tap_dance_dirty, kb.combo_dirty, kb.key_override_dirty), (set(), set(), {3}))
+
+    def test_device_gone(self):
+        kb = FakeDynamic()
+        kb.fail_after = 1
+        kb.tap_dance_stage(2, ("KC_A", "KC_NO", "KC_NO", "KC_NO", 200))
+        kb.combo_stage(0, ("KC_A", "KC_B", "KC_NO", "KC_NO", "KC_C"))
+        self.assertEqual(kb.dynamic_commit(), {"tap_dance": {2: True}, "combo": {0: False}, "key_override": {}})
+        self.assertEqual(kb.combo_dirty, {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import struct
+import unittest
+
+from protocol.base_protocol import BaseProtocol
+from util import hid_send, hid_send_batch, MSG_LEN
+
+
+class FakeDevice:
+
+    """ Echoes every report back, optionally failing one of the writes """
+
+    def __init__(self, fail_write=None, reject=None):
+        self.queue = []
+        # answer reports whose 4th byte is reject with an error status, like a refused dynamic entry read
+        self.reject = reject
+        self.writes = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_write = fail_write
+
+    def write(self, data):
+        self.writes += 1
+        if self.writes - 1 == self.fail_write:
+            return 0
+        report = data[1:]
+        if self.reject is not None and report[3] == self.reject:
+            report = b"\x01" + report[1:]
+        self.queue.append(report)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return len(data)
+
+    def read(self, length, timeout_ms=0):
+        if not self.queue:
+            return b""
+        self.in_flight -= 1
+        return self.queue.pop(0)
+
+
+class TestHidBatch(unittest.TestCase):
+
+    def test_in_order(self):
+        dev = FakeDevice()
+        msgs = [bytes([x]) for x in range(20)]
+        out = list(hid_send_batch(dev, msgs, window=4))
+        self.assertEqual([data[0] for data in out], list(range(20)))
+        self.assertTrue(all(len(data) == MSG_LEN for data in out))
+        self.assertEqual(dev.max_in_flight, 4)
+
+    def test_fallback(self):
+        dev = FakeDevice(fail_write=5)
+        msgs = [bytes([x]) for x in range(10)]
+        out = list(hid_send_batch(dev, msgs, window=4))
+        self.assertEqual([data[0] for data in out], list(range(10)))
+
+    def test_close_early(self):
+        dev = FakeDevice()
+        responses = hid_send_batch(dev, [bytes([x]) for x in range(20)], window=4)
+        self.assertEqual(next(responses)[0], 0)
+        responses.close()
+        self.assertEqual(dev.queue, [])
+        self.assertEqual(hid_send(dev, b"\x42")[0], 0x42)
+
+    def test_failed_entry_drains(self):
+        dev = FakeDevice(reject=2)
+        kb = BaseProtocol()
+        kb.dev = dev
+        kb.usb_send = hid_send
+        kb.usb_send_batch = hid_send_batch
+        with self.assertRaises(RuntimeError):
+            kb._retrieve_dynamic_entries(0x01, 10, struct.Struct("<HHHHH"))
+        self.assertEqual(dev.queue, [])
+        self.assertEqual(hid_send(dev, b"\x42")[0], 0x42)
@@ -0,0 +1,92 @@
+import gc
+import unittest
+
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QTransform
+
+from kle_serial import Key
+from protocol.keyboard_comm import deserialize_layout
+from widgets.keyboard_widget import KeyWidget, EncoderWidget, KeyGeometry, EncoderGeometry, shared_geometries
+
+
+def make_desc(x=0, y=0, angle=0):
+    desc = Key()
+    desc.x, desc.y = x, y
+    desc.rotation_angle, desc.rotation_x, desc.rotation_y = angle, 1, 1
+    desc.encoder_dir = 1
+    return desc
+
+
+class TestKeyGeometry(unittest.TestCase):
+
+    def test_geometry_reused(self):
+        key = KeyWidget(make_desc(2, 1), 20)
+        geometry = key.geometry
+        key.update_position(20, 5, 7)
+        self.assertIs(key.geometry, geometry)
+        key.update_position(30, 5, 7)
+        self.assertIsNot(key.geometry, geometry)
+        key.update_position(20)
+        self.assertIs(key.geometry, geometry)
+
+    def test_shifted_polygon(self):
+        desc = make_desc(2, 1, 30)
+        key = KeyWidget(desc, 20, 5, 7)
+        g = key.geometry
+
+        # same as rotating every corner and then shifting it
+        t = QTransform()
+        t.translate(5, 7)
+        t.translate(g.rotation_x, g.rotation_y)
+        t.rotate(30)
+        t.translate(-g.rotation_x, -g.rotation_y)
+        corner = t.map(QPointF(g.rect.x(), g.rect.y()))
+        self.assertIn((round(corner.x(), 6), round(corner.y(), 6)),
+                      [(round(p.x(), 6), round(p.y(), 6)) for p in key.polygon])
+        center = t.map(QPointF(g.rect.center()))
+        self.assertTrue(key.polygon.containsPoint(center, Qt.OddEvenFill))
+        self.assertFalse(g.polygon.translated(100, 100).containsPoint(center, Qt.OddEvenFill))
+
+    def test_shared_between_views(self):
+        desc = make_desc(3, 0, 15)
+        a, b = KeyWidget(desc, 20, 4, 0), KeyWidget(desc, 20, 4, 0)
+        self.assertIs(a.geometry, b.geometry)
+        self.assertIs(a.polygon, b.polygon)
+        self.assertIs(a.paint_geometry(1.5)[0], b.paint_geometry(1.5)[0])
+
+        # per-view state stays per view
+        a.setPressed(True)
+        self.assertFalse(b.pressed)
+
+        # another physical key or another kind of widget gets its own geometry
+        self.assertIsNot(KeyWidget(make_desc(3, 0, 15), 20).geometry, a.geometry)
+        self.assertIsNot(EncoderWidget(desc, 20).geometry, a.geometry)
+
+    def test_shared_geometry_released(self):
+        desc = make_desc(1, 1)
+        KeyWidget(desc, 20)
+        self.assertIn(desc, shared_geometries)
+        count = len(shared_geometries)
+        del desc
+        gc.collect()
+        self.assertEqual(len(shared_geometries), count - 1)
+
+    def test_device_geometry_released(self):
+        keys, encoders = deserialize_layout([["0,0", "0,1"]])
+        KeyWidget(keys[0], 20)
+        count = len(shared_geometries)
+        # opening another keyboard drops the previous layout from the parsed layout cache
+        deserialize_layout([["0,0"]])
+        del keys, encoders
+        gc.collect()
+        self.assertEqual(len(shared_geometries), count - 1)
+
+    def test_geometry_class(self):
+        self.assertIsInstance(KeyWidget(make_desc(), 20).geometry, KeyGeometry)
+        encoder = EncoderWidget(make_desc(), 20)
+        self.assertIsInstance(encoder.geometry, EncoderGeometry)
+        self.assertFalse(encoder.geometry.extra_draw_path.isEmpty())
+
+
+if __name__ == "__main__":
+    unittest.main()
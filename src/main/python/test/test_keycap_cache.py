@@ -0,0 +1,54 @@
+import unittest
+
+from kle_serial import Key
+from themes import Theme
+from widgets.keyboard_widget import KeyWidget, EncoderWidget
+from widgets.keycap_cache import keycap_cache_key, KEYCAP_NORMAL, KEYCAP_PRESSED
+
+
+def make_key(x, y, width=1, cls=KeyWidget):
+    desc = Key()
+    desc.x, desc.y, desc.width, desc.width2 = x, y, width, width
+    desc.encoder_dir = 0
+    return cls(desc, 20)
+
+
+class TestKeycapCache(unittest.TestCase):
+
+    def test_same_shape_shares_pixmap(self):
+        a, b = make_key(0, 0), make_key(3, 2)
+        self.assertEqual(keycap_cache_key(a.geometry, 1, 1, KEYCAP_NORMAL, False),
+                         keycap_cache_key(b.geometry, 1, 1, KEYCAP_NORMAL, False))
+
+    def test_different_shape(self):
+        a, b = make_key(0, 0), make_key(0, 0, 1.5)
+        self.assertNotEqual(keycap_cache_key(a.geometry, 1, 1, KEYCAP_NORMAL, False),
+                            keycap_cache_key(b.geometry, 1, 1, KEYCAP_NORMAL, False))
+        c = make_key(0, 0, cls=EncoderWidget)
+        self.assertNotEqual(keycap_cache_key(a.geometry, 1, 1, KEYCAP_NORMAL, False),
+                            keycap_cache_key(c.geometry, 1, 1, KEYCAP_NORMAL, False))
+
+    def test_state_scale_theme(self):
+        key = make_key(0, 0)
+        base = keycap_cache_key(key.geometry, 1, 1, KEYCAP_NORMAL, False)
+        self.assertNotEqual(base, keycap_cache_key(key.geometry, 1, 1, KEYCAP_PRESSED, False))
+        self.assertNotEqual(base, keycap_cache_key(key.geometry, 1, 1, KEYCAP_NORMAL, True))
+        self.assertNotEqual(base, keycap_cache_key(key.geometry, 2, 1, KEYCAP_NORMAL, False))
+        self.assertNotEqual(base, keycap_cache_key(key.geometry, 1, 2, KEYCAP_NORMAL, False))
+        Theme.generation += 1
+        self.assertNotEqual(base, keycap_cache_key(key.geometry, 1, 1, KEYCAP_NORMAL, False))
+
+    def test_paint_geometry(self):
+        key = make_key(1, 0)
+        transform, rect, origin = key.paint_geometry(2)
+        self.assertIs(key.paint_geometry(2)[0], transform)
+        self.assertEqual(origin.x(), round(key.geometry.x) * 2)
+        self.assertTrue(rect.contains(transform.mapRect(key.geometry.background_draw_path.boundingRect()).toAlignedRect()))
+
+        # moving the key must not reuse the old geometry
+        key.update_position(20, 10, 0)
+        self.assertEqual(key.paint_geometry(2)[2].x(), (round(key.geometry.x) + 10) * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from PyQt5.QtCore import Qt, QPoint, QRect
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QApplication
+
+from keycodes.keycodes import KEYCODES_BASIC, KEYCODES_MACRO, recreate_keycodes
+from util import KeycodeDisplay
+from widgets.display_keyboard import DisplayKeyboard
+from widgets.display_keyboard_defs import ansi_70
+from widgets.keycode_grid import KeycodeModel, KeycodeGrid, KeycodeCell
+
+app = QApplication.instance() or QApplication([])
+
+
+def keycode_filter_any(kc):
+    return True
+
+
+class TestKeycodeModel(unittest.TestCase):
+
+    def test_shared_cells(self):
+        model = KeycodeModel.get()
+        cells = model.cells_for(KEYCODES_BASIC, keycode_filter_any)
+        self.assertEqual([c.qmk_id for c in cells], [kc.qmk_id for kc in KEYCODES_BASIC])
+        self.assertIs(model.cells_for(KEYCODES_BASIC, keycode_filter_any), cells)
+        self.assertIsNot(model.cells_for(KEYCODES_MACRO, keycode_filter_any), cells)
+
+        recreate_keycodes()
+        self.assertIsNot(model.cells_for(KEYCODES_BASIC, keycode_filter_any), cells)
+
+    def test_filter(self):
+        cells = KeycodeModel.get().cells_for(KEYCODES_BASIC, lambda kc: kc == "KC_A")
+        self.assertEqual([c.qmk_id for c in cells], ["KC_A"])
+
+    def test_keymap_override(self):
+        model = KeycodeModel.get()
+        cell = model.cell(KEYCODES_BASIC[0])
+        prev = KeycodeDisplay.keymap_override
+        KeycodeDisplay.keymap_override = {KEYCODES_BASIC[0].qmk_id: "X"}
+        try:
+            overridden = model.cell(KEYCODES_BASIC[0])
+            self.assertIsNot(overridden, cell)
+            self.assertEqual(overridden.label, "X")
+            self.assertTrue(overridden.highlighted)
+        finally:
+            KeycodeDisplay.keymap_override = prev
+
+
+class TestKeycodeGrid(unittest.TestCase):
+
+    def make_grid(self, count, columns):
+        grid = KeycodeGrid()
+        grid.set_cells([KeycodeCell("KC_{}".format(x), str(x)) for x in range(count)])
+        grid.resize(columns * grid.pitch(), grid.heightForWidth(columns * grid.pitch()))
+        return grid
+
+    def test_cell_at(self):
+        grid = self.make_grid(10, 4)
+        pitch = grid.pitch()
+        self.assertEqual(grid.cell_at(QPoint(1, 1)), 0)
+        self.assertEqual(grid.cell_at(QPoint(pitch + 1, pitch + 1)), 5)
+        self.assertEqual(grid.cell_at(QPoint(pitch - 1, 1)), None)
+        self.assertEqual(grid.cell_at(QPoint(3 * pitch + 1, 2 * pitch + 1)), None)
+        self.assertEqual(grid.heightForWidth(4 * pitch), 3 * pitch - grid.spacing())
+
+    def test_cells_in(self):
+        grid = self.make_grid(100, 4)
+        pitch = grid.pitch()
+        self.assertEqual(list(grid.cells_in(QRect(0, 10 * pitch, pitch + 1, pitch))), [40, 41])
+        self.assertEqual(list(grid.cells_in(QRect(0, 24 * pitch, 4 * pitch, 3 * pitch))), [96, 97, 98, 99])
+
+    def test_click(self):
+        grid = self.make_grid(10, 4)
+        clicked = []
+        grid.keycode_changed.connect(clicked.append)
+        QTest.mouseClick(grid, Qt.LeftButton, pos=grid.cell_rect(6).center())
+        self.assertEqual(clicked, ["KC_6"])
+
+
+class TestDisplayKeyboard(unittest.TestCase):
+
+    def test_cells(self):
+        kb = DisplayKeyboard(ansi_70)
+        self.assertEqual(kb.cells[0].qmk_id, "KC_ESCAPE")
+        self.assertEqual(kb.cell_at(kb.cell_rect(5).center()), 5)
+        self.assertTrue(QRect(QPoint(0, 0), kb.sizeHint()).contains(kb.cell_rect(len(kb.cells) - 1)))
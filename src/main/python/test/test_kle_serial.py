@@ -0,0 +1,210 @@
+import json
+import random
+import unittest
+from copy import copy
+
+from kle_serial import Serial, Key, LayoutCache, layout_digest
+from widgets import display_keyboard_defs
+
+
+def reference_deserialize(rows):
+    """ The original straightforward port of kle-serial, the tuned parser must give exactly the same keys """
+    serial = Serial()
+    current = Key()
+    current.row = current.col = None
+    current.encoder_idx = current.encoder_dir = None
+    current.layout_index = current.layout_option = -1
+    keys = []
+    align = 4
+    item = None
+
+    for r in range(len(rows)):
+        if isinstance(rows[r], list):
+            for k in range(len(rows[r])):
+                item = rows[r][k]
+                if isinstance(item, str):
+                    newKey = copy(current)
+                    newKey.width2 = current.width if newKey.width2 == 0 else current.width2
+                    newKey.height2 = current.height if newKey.height2 == 0 else current.height2
+                    newKey.labels = serial.reorderLabelsIn(item.split("\n"), align)
+                    newKey.textSize = serial.reorderLabelsIn(newKey.textSize, align)
+                    for i in range(12):
+                        if newKey.labels[i] is None:
+                            newKey.textSize[i] = newKey.textColor[i] = None
+                        if newKey.textSize[i] == newKey.default.textSize:
+                            newKey.textSize[i] = None
+                        if newKey.textColor[i] == newKey.default.textColor:
+                            newKey.textColor[i] = None
+                    keys.append(newKey)
+
+                    current.x += current.width
+                    current.width = current.height = 1
+                    current.x2 = current.y2 = current.width2 = current.height2 = 0
+                    current.nub = current.stepped = current.decal = False
+                else:
+                    if "r" in item:
+                        current.rotation_angle = item["r"]
+                    if "rx" in item:
+                        current.rotation_x = item["rx"]
+                        current.x, current.y = item["rx"], current.rotation_y
+                    if "ry" in item:
+                        current.rotation_y = item["ry"]
+                        current.x, current.y = current.rotation_x, item["ry"]
+                    if "a" in item:
+                        align = item["a"]
+                    if "f" in item:
+                        current.default.textSize = item["f"]
+                        current.textSize = []
+                    if "f2" in item:
+                        for i in range(1, 12):
+                            current.textSize[i] = item["f2"]
+                    if "fa" in item:
+                        current.textSize = item["fa"]
+                    if "p" in item:
+                        current.profile = item["p"]
+                    if "c" in item:
+                        current.color = item["c"]
+                    if "t" in item:
+                        split = item["t"].split("\n")
+                        if split[0] != "":
+                            current.default.textColor = split[0]
+                        current.textColor = serial.reorderLabelsIn(split, align)
+                    if "x" in item:
+                        current.x += item["x"]
+                    if "y" in item:
+                        current.y += item["y"]
+                    if "w" in item:
+                        current.width = current.width2 = item["w"]
+                    if "h" in item:
+                        current.height = current.height2 = item["h"]
+                    if "x2" in item:
+                        current.x2 = item["x2"]
+                    if "y2" in item:
+                        current.y2 = item["y2"]
+                    if "w2" in item:
+                        current.width2 = item["w2"]
+                    if "h2" in item:
+                        current.height2 = item["h2"]
+                    if "n" in item:
+                        current.nub = item["n"]
+                    if "l" in item:
+                        current.stepped = item["l"]
+                    if "d" in item:
+                        current.decal = item["d"]
+                    if "g" in item and item["g"]:
+                        current.ghost = item["g"]
+                    if "sm" in item:
+                        current.sm = item["sm"]
+                    if "sb" in item:
+                        current.sb = item["sb"]
+                    if "st" in item:
+                        current.st = item["st"]
+            current.y += 1
+            current.x = current.rotation_x
+    return keys
+
+
+def key_state(key):
+    state = [getattr(key, name) for name in Key.__slots__ if name not in ["default", "__weakref__"]]
+    if key.default is not None:
+        state += [key.default.textColor, key.default.textSize]
+    return state
+
+
+def random_rows(rng):
+    rows = [{"name": "random"}]
+    for r in range(rng.randrange(1, 8)):
+        row = []
+        if rng.random() < 0.2:
+            row.append({"r": rng.choice([-30, 15, 45]), "rx": rng.randrange(10), "ry": rng.randrange(5)})
+        for k in range(rng.randrange(1, 12)):
+            if rng.random() < 0.5:
+                props = {}
+                for name, values in [("a", range(8)), ("f", [2, 3, 4]), ("fa", [[2, 2, 3], [4, 0, 1, 3]]),
+                                     ("t", ["#111111", "#222222\n\n#333333", "\n#444444"]), ("c", ["#aaaaaa"]),
+                                     ("p", ["DSA", "SA R1"]), ("x", [0.25, 1]), ("y", [0.5]), ("w", [1.5, 2.25]),
+                                     ("h", [2]), ("x2", [-0.25]), ("y2", [0.5]), ("w2", [1.5]), ("h2", [1]),
+                                     ("n", [True]), ("l", [True]), ("d", [True]), ("g", [True, False]),
+                                     ("sm", ["cherry"]), ("sb", ["gateron"]), ("st", ["MX1A-11Nx"])]:
+                    if rng.random() < 0.15:
+                        props[name] = rng.choice(list(values))
+                row.append(props)
+            labels = [rng.choice(["", "{},{}".format(r, k), "e", "0,1", "Esc"]) for x in range(rng.randrange(1, 12))]
+            row.append("\n".join(labels))
+        rows.append(row)
+    return rows
+
+
+class TestKleSerial(unittest.TestCase):
+
+    rows = [[{"c": "#444444", "t": "#ff0000", "p": "DSA", "a": 4}, "0,0", {"n": True}, "0,1"],
+            [{"w": 2}, "1,0"]]
+
+    def test_keep_styling(self):
+        keys = Serial().deserialize(self.rows).keys
+        self.assertEqual(keys[0].color, "#444444")
+        self.assertEqual(keys[0].profile, "DSA")
+        self.assertTrue(keys[1].nub)
+
+    def test_drop_styling(self):
+        keys = Serial().deserialize(self.rows, keep_styling=False).keys
+        self.assertEqual([k.labels[0] for k in keys], ["0,0", "0,1", "1,0"])
+        self.assertEqual([(k.x, k.y, k.width) for k in keys], [(0, 0, 1), (1, 0, 1), (0, 1, 2)])
+        for key in keys:
+            self.assertEqual(key.color, "")
+            self.assertEqual(key.profile, "")
+            self.assertIsNone(key.textColor)
+            self.assertFalse(key.nub)
+
+    def assert_same_as_reference(self, rows):
+        expected = reference_deserialize(rows)
+        styled = Serial().deserialize(rows).keys
+        self.assertEqual([key_state(k) for k in styled], [key_state(k) for k in expected])
+
+        for key in expected:
+            key.drop_styling()
+        plain = Serial().deserialize(rows, keep_styling=False).keys
+        self.assertEqual([key_state(k) for k in plain], [key_state(k) for k in expected])
+
+    def test_same_as_reference(self):
+        for name in ["ansi_100", "ansi_80", "ansi_70", "iso_100", "iso_80", "iso_70", "mods", "mods_narrow"]:
+            self.assert_same_as_reference(json.loads(getattr(display_keyboard_defs, name)))
+        self.assert_same_as_reference(self.rows)
+
+    def test_random_same_as_reference(self):
+        rng = random.Random(1234)
+        for x in range(300):
+            self.assert_same_as_reference(random_rows(rng))
+
+    def test_layout_cache(self):
+        parsed = []
+        cache = LayoutCache(lambda rows: parsed.append(rows) or len(rows))
+        self.assertEqual(cache.get(self.rows), 2)
+        self.assertEqual(cache.get(json.loads(json.dumps(self.rows))), 2)
+        self.assertEqual(len(parsed), 1)
+        self.assertEqual(cache.get(self.rows + [["x"]]), 3)
+        self.assertEqual(cache.get(json.dumps(self.rows)), 2)
+        self.assertEqual(cache.get(json.dumps(self.rows)), 2)
+        self.assertEqual(len(parsed), 3)
+        self.assertNotEqual(layout_digest(self.rows), layout_digest(self.rows[:1]))
+
+    def test_layout_cache_size(self):
+        parsed = []
+        cache = LayoutCache(lambda rows: parsed.append(rows) or len(rows), size=2)
+        a, b, c = [["a"]], [["b"]], [["c"]]
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        self.assertEqual(len(parsed), 2)
+        # b is the least recently used one
+        cache.get(c)
+        cache.get(a)
+        self.assertEqual(len(parsed), 3)
+        cache.get(b)
+        self.assertEqual(len(parsed), 4)
+
+    def test_no_instance_dict(self):
+        key = Serial().deserialize(self.rows).keys[0]
+        self.assertFalse(hasattr(key, "__dict__"))
+        self.assertIsNone(key.row)
+        self.assertEqual(key.layout_index, -1)
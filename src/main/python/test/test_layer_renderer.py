@@ -0,0 +1,32 @@
+import unittest
+
+from layer_renderer import LayoutChoices, layer_paths
+
+
+class TestLayoutChoices(unittest.TestCase):
+
+    def test_decode(self):
+        labels = ["Split Backspace", ["Bottom Row", "ANSI", "ISO", "Tsangan"], "Split Space"]
+        # VIA packs the first option into the highest bits: 1, 10, 0
+        choices = LayoutChoices(labels, 0b1100)
+        self.assertEqual([choices.get_choice(x) for x in range(3)], [1, 2, 0])
+        choices = LayoutChoices(labels, 0b0011)
+        self.assertEqual([choices.get_choice(x) for x in range(3)], [0, 1, 1])
+
+    def test_no_options(self):
+        choices = LayoutChoices(None, -1)
+        self.assertEqual(choices.get_choice(0), 0)
+        choices = LayoutChoices(["Split"], -1)
+        self.assertEqual(choices.get_choice(0), 0)
+
+
+class TestLayerPaths(unittest.TestCase):
+
+    def test_paths(self):
+        self.assertEqual(layer_paths("/out/board.pdf", "pdf", 4), ["/out/board.pdf"])
+        self.assertEqual(layer_paths("/out/board.png", "png", 2), ["/out/board_layer0.png", "/out/board_layer1.png"])
+        self.assertEqual(layer_paths("/out/board", "svg", 1), ["/out/board_layer0.svg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
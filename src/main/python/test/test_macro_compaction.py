@@ -0,0 +1,39 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from macro.macro_action import ActionText, ActionTap, ActionDown, ActionUp, ActionDelay
+from macro.macro_compaction import macro_compact
+from protocol.dummy_keyboard import DummyKeyboard
+
+
+class TestMacroCompaction(unittest.TestCase):
+
+    def test_taps_to_text(self):
+        self.assertEqual(macro_compact([ActionText("ab"), ActionTap(["KC_C", "KC_SPACE", "LSFT(KC_1)"]),
+                                        ActionText("d")]), [ActionText("abc !d")])
+        # nothing send_string could type
+        self.assertEqual(macro_compact([ActionTap(["KC_ENTER", "LCTL(KC_C)"])]),
+                         [ActionTap(["KC_ENTER", "LCTL(KC_C)"])])
+
+    def test_down_up(self):
+        self.assertEqual(macro_compact([ActionDown(["KC_LCTRL", "KC_ENTER"]), ActionUp(["KC_ENTER", "KC_LCTRL"])]),
+                         [ActionDown(["KC_LCTRL"]), ActionTap(["KC_ENTER"]), ActionUp(["KC_LCTRL"])])
+
+    def test_delays(self):
+        self.assertEqual(macro_compact([ActionDelay(100), ActionDelay(0), ActionDelay(200), ActionText("a"),
+                                        ActionDelay(0)]), [ActionDelay(300), ActionText("a")])
+        self.assertEqual(macro_compact([ActionDelay(60000), ActionDelay(60000)]),
+                         [ActionDelay(64000), ActionDelay(56000)])
+
+    def test_plan(self):
+        kb = DummyKeyboard(None)
+        kb.vial_protocol = 2
+        kb.macro_count = 3
+        data = kb.macros_serialize([[ActionTap(["KC_H", "KC_I"])], [ActionText("ok")],
+                                    [ActionDelay(10), ActionDelay(10)]])
+        plan = kb.macro_compaction_plan(data)
+        self.assertEqual(plan.before, [6, 2, 8])
+        self.assertEqual(plan.after, [2, 2, 4])
+        self.assertEqual(plan.saved(), 8)
+        self.assertEqual(kb.macros_deserialize(plan.data), [[ActionText("hi")], [ActionText("ok")],
+                                                            [ActionDelay(20)]])
@@ -0,0 +1,34 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from keycodes.keycodes import Keycode
+from macro.macro_key import KeyDown, KeyUp, KeyTap, KeyString, KeyDelay
+from macro.macro_optimizer import insert_delays, quantize_delay, macro_optimize
+
+KC_A = Keycode.find_by_qmk_id("KC_A")
+KC_B = Keycode.find_by_qmk_id("KC_B")
+
+
+class TestMacroDelays(unittest.TestCase):
+
+    def test_quantize(self):
+        self.assertEqual(quantize_delay(123), [KeyDelay(120)])
+        self.assertEqual(quantize_delay(126), [KeyDelay(130)])
+        self.assertEqual(quantize_delay(4), [])
+        self.assertEqual(quantize_delay(100000), [KeyDelay(64000), KeyDelay(36000)])
+
+    def test_threshold(self):
+        seq = [(0.0, KeyDown(KC_A)), (0.05, KeyUp(KC_A)), (0.1, KeyDown(KC_B)), (1.1, KeyUp(KC_B))]
+        self.assertEqual(insert_delays(seq, 100), [KeyDown(KC_A), KeyUp(KC_A), KeyDown(KC_B), KeyDelay(1000),
+                                                   KeyUp(KC_B)])
+        self.assertEqual(macro_optimize(insert_delays(seq, 2000)), [KeyString("ab")])
+
+    def test_held_key(self):
+        # autorepeat is dropped, the hold becomes a single delay between down and up
+        seq = [(0.0, KeyDown(KC_A)), (0.5, KeyDown(KC_A)), (0.53, KeyDown(KC_A)), (0.6, KeyUp(KC_A))]
+        self.assertEqual(insert_delays(seq, 100), [KeyDown(KC_A), KeyDelay(600), KeyUp(KC_A)])
+
+    def test_delay_splits_string(self):
+        seq = [(0.0, KeyDown(KC_A)), (0.01, KeyUp(KC_A)), (0.02, KeyDown(KC_B)), (0.03, KeyUp(KC_B)),
+               (0.5, KeyDown(KC_A)), (0.51, KeyUp(KC_A))]
+        self.assertEqual(macro_optimize(insert_delays(seq, 200)), [KeyString("ab"), KeyDelay(470), KeyTap(KC_A)])
@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from protocol.yr_mag import ProtocolYrMag, MagnetTable, YR_PROTOCOL_MAG_ALL, YR_PROTOCOL_MAG_APC, \
+    YR_PROTOCOL_MAG_RT_ALL, MAG_ALL_HEADER, MAG_ALL_RECORD, MAG_ALL_KEYS_PER_PACKET
+
+
+class FakeMagnet(ProtocolYrMag):
+
+    """ Records every packet instead of talking to a device """
+
+    def __init__(self, rows, cols, bulk):
+        self.rows = rows
+        self.cols = cols
+        self.mag = MagnetTable(rows, cols)
+        self.mag_bulk = bulk
+        self.rowcol = {(row, col): [] for row in range(rows) for col in range(cols)}
+        self.top_deadband_lv = self.bottom_deadband_lv = 0
+        self.magnet_profiles = dict()
+        self.sent = []
+
+    def usb_send(self, dev, msg, retries=1):
+        self.sent.append(msg)
+        return msg
+
+
+class MagnetDevice(FakeMagnet):
+
+    """
+    Answers reads from a record per key. mag_all is what the firmware does with a YR_PROTOCOL_MAG_ALL
+    request: "answer", "echo" it untouched or "zero" it like an unknown command
+    """
+
+    def __init__(self, rows, cols, mag_all):
+        super().__init__(rows, cols, None)
+        self.mag_all = mag_all
+        self.records = [(100 + idx, idx % 2, idx, idx + 1) for idx in range(rows * cols)]
+
+    def usb_send(self, dev, msg, retries=1):
+        self.sent.append(msg)
+        cmd, row, col = msg[2], msg[3], msg[4]
+        idx = row * self.cols + col
+        if cmd == YR_PROTOCOL_MAG_ALL:
+            if self.mag_all == "echo":
+                return msg
+            if self.mag_all == "zero":
+                return bytes(32)
+            data = bytearray(msg)
+            for x in range(msg[5]):
+                off = MAG_ALL_HEADER + x * MAG_ALL_RECORD
+                data[off:off + MAG_ALL_RECORD] = bytes(self.records[idx + x])
+            return bytes(data)
+        if cmd == YR_PROTOCOL_MAG_APC:
+            return msg[:5] + bytes([self.records[idx][0]]) + bytes(26)
+        if cmd == YR_PROTOCOL_MAG_RT_ALL:
+            return msg[:5] + bytes(self.records[idx][1:]) + bytes(24)
+        raise RuntimeError("unexpected request {}".format(msg.hex()))
+
+
+class TestMagnetBatch(unittest.TestCase):
+
+    def test_skips_unchanged(self):
+        kb = FakeMagnet(2, 4, True)
+        kb.mag.set_apc(0, 1, 50)
+        self.assertEqual(kb.apply_magnet({(0, 1): (50, 0, 0, 0)}), 0)
+        self.assertEqual(kb.sent, [])
+
+    def test_bulk_packs_consecutive_keys(self):
+        kb = FakeMagnet(4, 8, True)
+        # 0..5 fit a single packet, 6 starts the next one which also takes 9, 20 needs its own
+        records = {divmod(idx, 8): (100, 1, 10, 20) for idx in [0, 2, 5, 6, 9, 20]}
+        self.assertEqual(kb.apply_magnet(records), 6)
+        self.assertEqual([(msg[2], msg[3], msg[4], msg[5]) for msg in kb.sent],
+                         [(YR_PROTOCOL_MAG_ALL, 0, 0, 6), (YR_PROTOCOL_MAG_ALL, 0, 6, 4),
+                          (YR_PROTOCOL_MAG_ALL, 2, 4, 1)])
+        # keys in between are rewritten with what they already had
+        self.assertEqual(kb.sent[0][6:6 + 8], bytes([100, 1, 10, 20, 0, 0, 0, 0]))
+        self.assertEqual(kb.mag.get_rt(1, 1), (1, 10, 20))
+
+    def test_per_key_fallback(self):
+        kb = FakeMagnet(2, 4, False)
+        kb.mag.set_rt(1, 2, (1, 10, 20))
+        kb.apply_magnet({(0, 0): (100, 0, 0, 0), (1, 2): (0, 1, 10, 30)})
+        self.assertEqual([(msg[2], msg[3], msg[4]) for msg in kb.sent],
+                         [(YR_PROTOCOL_MAG_APC, 0, 0), (YR_PROTOCOL_MAG_RT_ALL, 1, 2)])
+        self.assertEqual(kb.sent[1][5:], bytes([1, 10, 30]))
+
+    def test_reload_mag_all(self):
+        # 14 keys take two full packets and a last one with the remaining 2
+        kb = MagnetDevice(2, 7, "answer")
+        kb.reload_magnet()
+        self.assertTrue(kb.mag_bulk)
+        self.assertEqual([(msg[3], msg[4], msg[5]) for msg in kb.sent],
+                         [(0, 0, MAG_ALL_KEYS_PER_PACKET), (0, 6, MAG_ALL_KEYS_PER_PACKET), (1, 5, 2)])
+        self.assertEqual([kb.mag.get_record(idx) for idx in range(14)], kb.records)
+        self.assertEqual(kb.mag.get_apc(1, 6), 113)
+        self.assertEqual(kb.mag.get_rt(1, 6), (1, 13, 14))
+
+    def test_reload_fallback(self):
+        for mag_all in ["echo", "zero"]:
+            kb = MagnetDevice(2, 7, mag_all)
+            kb.reload_magnet()
+            self.assertFalse(kb.mag_bulk)
+            # every bulk read is still consumed, then each key is read separately
+            self.assertEqual([msg[2] for msg in kb.sent],
+                             [YR_PROTOCOL_MAG_ALL] * 3 + [YR_PROTOCOL_MAG_APC] * 14 + [YR_PROTOCOL_MAG_RT_ALL] * 14)
+            self.assertEqual([kb.mag.get_record(idx) for idx in range(14)], kb.records)
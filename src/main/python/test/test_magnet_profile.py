@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import shutil
+import tempfile
+import unittest
+
+from magnet.magnet_profile_store import MagnetProfileStore
+from protocol.magnet_profile import MagnetProfile
+from protocol.yr_mag import YR_PROTOCOL_MAG_APC, YR_PROTOCOL_MAG_DEADBAND
+from test.test_magnet_batch import FakeMagnet
+
+
+class TestMagnetProfile(unittest.TestCase):
+
+    def test_diff(self):
+        kb = FakeMagnet(2, 2, False)
+        kb.mag.set_apc(0, 0, 100)
+        gaming = MagnetProfile.from_keyboard("gaming", kb)
+        gaming.records[(0, 1)] = (20, 1, 5, 5)
+        gaming.records[(7, 7)] = (20, 1, 5, 5)
+        gaming.deadband = (4, 4)
+
+        records, deadband = gaming.diff(kb)
+        # keys which already match and keys the keyboard doesn't have are left out
+        self.assertEqual(records, {(0, 1): (20, 1, 5, 5)})
+        self.assertEqual(deadband, (4, 4))
+
+        self.assertEqual(kb.apply_magnet_profile(gaming), 2)
+        self.assertEqual([msg[2] for msg in kb.sent][-1], YR_PROTOCOL_MAG_DEADBAND)
+        kb.sent = []
+        self.assertEqual(kb.apply_magnet_profile(gaming), 0)
+        self.assertEqual(kb.sent, [])
+
+    def test_layout_roundtrip(self):
+        kb = FakeMagnet(2, 2, False)
+        kb.mag.set_apc(1, 1, 60)
+        kb.magnet_profiles["typing"] = MagnetProfile.from_keyboard("typing", kb)
+        saved = kb.save_magnet()
+
+        other = FakeMagnet(2, 2, False)
+        other.restore_magnet(saved)
+        self.assertEqual(other.magnet_profiles, kb.magnet_profiles)
+        self.assertEqual(other.mag.get_apc(1, 1), 60)
+        self.assertEqual([msg[2] for msg in other.sent], [YR_PROTOCOL_MAG_APC])
+
+    def test_store(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = MagnetProfileStore(-1, directory)
+            self.assertEqual(store.load(), dict())
+            profiles = {"a": MagnetProfile("a", {(0, 0): (1, 0, 2, 3)}, (1, 2))}
+            store.save(profiles)
+            self.assertEqual(MagnetProfileStore(-1, directory).load(), profiles)
+
+            # a restored profile replacing a stored one of the same name is written back
+            restored = {"a": MagnetProfile("a", {(0, 0): (5, 0, 2, 3)}, (1, 2)),
+                        "b": MagnetProfile("b", {}, (0, 0))}
+            store.merge(restored)
+            self.assertEqual(MagnetProfileStore(-1, directory).load(), restored)
+
+            kept = {"c": MagnetProfile("c", {}, (3, 3))}
+            store.merge(kept)
+            self.assertEqual(sorted(kept), ["a", "b", "c"])
+            self.assertEqual(MagnetProfileStore(-1, directory).load(), kept)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from magnet.magnet_telemetry import TelemetryBuffer, TelemetrySampler
+
+
+class FakeKeyboard:
+
+    def __init__(self):
+        self.sweeps = 0
+
+    def get_adc_travel(self, keys):
+        self.sweeps += 1
+        return [(1000 + row, self.sweeps + col) for row, col in keys]
+
+
+class TestMagnetTelemetry(unittest.TestCase):
+
+    def test_ring_wraps(self):
+        buf = TelemetryBuffer(4)
+        for x in range(6):
+            buf.append(x * 0.5, 100 + x, x)
+        self.assertEqual(buf.latest(), (2.5, 105, 5))
+        self.assertEqual(buf.snapshot(), ([1.0, 1.5, 2.0, 2.5], [102, 103, 104, 105], [2, 3, 4, 5]))
+        self.assertEqual(buf.snapshot(1.7)[2], [4, 5])
+        self.assertAlmostEqual(buf.rate(), 2.0)
+
+    def test_sampler(self):
+        kb = FakeKeyboard()
+        sampler = TelemetrySampler(kb, capacity=8)
+        ticks = iter(range(100))
+        sampler.clock = lambda: next(ticks)
+        self.assertEqual(sampler.sweep(), 0)
+
+        sampler.set_keys([(0, 1), (2, 3)])
+        sampler.sweep()
+        sampler.sweep()
+        self.assertEqual(sampler.latest((2, 3)), (1, 1002, 5))
+
+        # keys still sampled keep their history
+        sampler.set_keys([(2, 3)])
+        self.assertIsNone(sampler.latest((0, 1)))
+        self.assertEqual(sampler.snapshot((2, 3))[2], [4, 5])
@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import os
+import tempfile
+import unittest
+
+from matrix_event_log import MatrixEventLog
+
+
+class TestMatrixEventLog(unittest.TestCase):
+
+    def test_stats(self):
+        log = MatrixEventLog(4, 4)
+        log.record(10.0, [(0, 0, True)])
+        log.record(10.1, [(0, 0, False)])
+        # bounces back within the chatter interval
+        log.record(10.12, [(0, 0, True), (1, 1, True)])
+        log.record(10.3, [(0, 0, False)])
+
+        stats = {(s[0], s[1]): s[2:] for s in log.stats(10.4)}
+        presses, min_interval, chatter, ghost, stuck = stats[(0, 0)]
+        self.assertEqual((presses, chatter, ghost, stuck), (2, 1, 0, False))
+        self.assertAlmostEqual(min_interval, 0.02)
+        # (1, 1) was never released
+        self.assertEqual(log.stuck(20.0), [(1, 1)])
+        time, row, col, pressed = list(log.events())[3]
+        self.assertAlmostEqual(time, 0.12)
+        self.assertEqual((row, col, pressed), (1, 1, True))
+        self.assertEqual(log.summary(10.4), "5 events, 1 chatter, 0 ghosting, 0 stuck")
+        self.assertEqual(log.summary(20.0), "5 events, 1 chatter, 0 ghosting, 1 stuck")
+
+    def test_ghost(self):
+        log = MatrixEventLog(3, 3)
+        log.record(0.0, [(0, 0, True), (0, 2, True), (2, 0, True)])
+        log.record(0.1, [(2, 2, True)])
+        self.assertEqual(log.ghost[2 * 3 + 2], 1)
+        self.assertEqual(sum(log.ghost), 1)
+
+    def test_ring_and_csv(self):
+        log = MatrixEventLog(1, 2, capacity=3)
+        for x in range(5):
+            log.record(float(x), [(0, x % 2, True)])
+        self.assertEqual(log.dropped, 2)
+        self.assertEqual([e[0] for e in log.events()], [2.0, 3.0, 4.0])
+
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            log.export_csv(path)
+            with open(path) as inf:
+                lines = inf.read().splitlines()
+            self.assertEqual(lines[0], "time,row,col,event")
+            self.assertEqual(lines[1], "2.000000,0,0,press")
+        finally:
+            os.remove(path)
@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import unittest
+
+from editor.matrix_test import MatrixState
+from protocol.keyboard_comm import Keyboard, VIA_PROTOCOL_MATRIX_OFFSET
+
+
+class TestMatrixState(unittest.TestCase):
+
+    def test_diff(self):
+        state = MatrixState(2, 10)
+        self.assertEqual(state.size, 4)
+        self.assertEqual(state.update(bytes(4)), [])
+
+        # column 0 lives in the last byte of its row, column 9 in the first
+        self.assertEqual(state.update(bytes([0x00, 0x01, 0x02, 0x00])), [(0, 0, True), (1, 9, True)])
+        self.assertEqual(state.update(bytes([0x00, 0x01, 0x02, 0x00])), [])
+        self.assertEqual(state.update(bytes([0x00, 0x81, 0x00, 0x00])), [(0, 7, True), (1, 9, False)])
+
+        state.reset()
+        self.assertEqual(state.update(bytes([0x00, 0x01, 0x00, 0x00])), [(0, 0, True)])
+
+    def test_chunked_read(self):
+        requests = []
+
+        def usb_send(dev, msg, retries=1):
+            requests.append(msg)
+            # every row reads back as its own index, twice since a row takes 2 bytes
+            offset = msg[2]
+            rows = [x for x in range(offset, offset + 14) for _ in range(2)]
+            return msg[:3] + bytes(rows[:29])
+
+        kb = Keyboard(None, usb_send=usb_send)
+        kb.via_protocol = VIA_PROTOCOL_MATRIX_OFFSET
+        kb.rows, kb.cols = 20, 16
+        self.assertTrue(kb.matrix_state_supported())
+        data = kb.matrix_state()
+        self.assertEqual([msg[2] for msg in requests], [0, 14])
+        self.assertEqual(data, bytes(x for x in range(20) for _ in range(2)))
+
+    def test_chunked_unsupported(self):
+        kb = Keyboard(None, usb_send=lambda dev, msg, retries=1: msg)
+        kb.via_protocol = 9
+        # 10 rows of 16 columns fit 28 bytes, but the firmware counts 3 bytes per row
+        kb.rows, kb.cols = 10, 16
+        self.assertFalse(kb.matrix_state_supported())
+        with self.assertRaises(RuntimeError):
+            kb.matrix_state()
+        kb.rows, kb.cols = 9, 16
+        self.assertTrue(kb.matrix_state_supported())
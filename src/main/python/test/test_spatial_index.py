@@ -0,0 +1,46 @@
+import random
+import unittest
+
+from PyQt5.QtCore import QRectF, QPointF, Qt
+
+from kle_serial import Key
+from widgets.keyboard_widget import KeyWidget
+from widgets.spatial_index import SpatialGrid
+
+
+class TestSpatialGrid(unittest.TestCase):
+
+    def test_point(self):
+        rects = [QRectF(0, 0, 10, 10), QRectF(5, 5, 10, 10), QRectF(30, 30, 5, 5)]
+        grid = SpatialGrid("abc", rects, 10)
+        self.assertEqual(grid.query_point(7, 7), ["a", "b"])
+        self.assertEqual(grid.query_point(32, 32), ["c"])
+        self.assertEqual(grid.query_point(-50, 100), [])
+
+    def test_rect(self):
+        rects = [QRectF(0, 0, 10, 10), QRectF(5, 5, 10, 10), QRectF(30, 30, 5, 5)]
+        grid = SpatialGrid("abc", rects, 10)
+        self.assertEqual(grid.query_rect(QRectF(25, 25, 20, 20)), ["c"])
+        self.assertEqual(grid.query_rect(QRectF(-5, -5, 50, 50)), ["a", "b", "c"])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        keys = []
+        for x in range(60):
+            desc = Key()
+            desc.x, desc.y = rng.uniform(0, 15), rng.uniform(0, 6)
+            desc.width = desc.width2 = rng.choice([1, 1.25, 1.5, 2.25])
+            desc.rotation_angle = rng.choice([0, 0, 15, -30])
+            desc.rotation_x, desc.rotation_y = rng.uniform(0, 15), rng.uniform(0, 6)
+            keys.append(KeyWidget(desc, 20))
+
+        grid = SpatialGrid(keys, [k.polygon.boundingRect() for k in keys], keys[0].geometry.size)
+        for x in range(2000):
+            pos = QPointF(rng.uniform(-50, 400), rng.uniform(-50, 200))
+            expected = [k for k in keys if k.polygon.containsPoint(pos, Qt.OddEvenFill)]
+            found = [k for k in grid.query_point(pos.x(), pos.y()) if k.polygon.containsPoint(pos, Qt.OddEvenFill)]
+            self.assertEqual(found, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
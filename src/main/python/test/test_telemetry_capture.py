@@ -0,0 +1,69 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import os
+import tempfile
+import unittest
+
+from magnet.telemetry_analysis import analyze_capture, press_depths
+from magnet.telemetry_capture import TelemetryRecorder, load_capture
+
+
+class TestTelemetryCapture(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".vmt")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_roundtrip(self):
+        rec = TelemetryRecorder(self.path, (10, 12))
+        rec.write(1.0, [(0, 1), (2, 3)], [(1000, 0), (2000, 1)])
+        rec.write(2.0, [(0, 1), (2, 3)], [(1001, 2), (2001, 3)])
+        # changing the sampled keys starts a new segment
+        rec.write(3.0, [(2, 3)], [(2002, 4)])
+        rec.close()
+
+        captures, deadband = load_capture(self.path)
+        self.assertEqual(deadband, (10, 12))
+        self.assertEqual(list(captures[(0, 1)].time), [1.0, 2.0])
+        self.assertEqual(list(captures[(0, 1)].adc), [1000, 1001])
+        self.assertEqual(list(captures[(2, 3)].time), [1.0, 2.0, 3.0])
+        self.assertEqual(list(captures[(2, 3)].travel), [1, 3, 4])
+
+    def test_truncated(self):
+        rec = TelemetryRecorder(self.path, (10, 12))
+        rec.write(1.0, [(0, 1), (2, 3)], [(1000, 0), (2000, 1)])
+        rec.write(2.0, [(0, 1), (2, 3)], [(1001, 2), (2001, 3)])
+        rec.write(3.0, [(2, 3)], [(2002, 4)])
+        rec.close()
+        with open(self.path, "rb") as inf:
+            data = inf.read()
+
+        # cut inside the last sweep, inside the second segment header, right after the first segment's
+        # sweeps and inside its second sweep
+        for size, times in [(len(data) - 1, [1.0, 2.0]), (len(data) - 15, [1.0, 2.0]), (len(data) - 19, [1.0, 2.0]),
+                            (len(data) - 30, [1.0])]:
+            with open(self.path, "wb") as outf:
+                outf.write(data[:size])
+            captures, deadband = load_capture(self.path)
+            self.assertEqual(deadband, (10, 12))
+            self.assertEqual(list(captures[(2, 3)].time), times)
+
+    def test_analysis(self):
+        self.assertEqual(press_depths([0, 30, 190, 185, 0, 0, 195, 40, 2, 100]), [190, 195, 100])
+
+        rec = TelemetryRecorder(self.path)
+        travel = ([0, 1, 0, 2] * 10 + [50, 150, 195, 198, 120, 30]) * 5
+        for x, value in enumerate(travel):
+            rec.write(x * 0.001, [(0, 0)], [(3000 + (x % 3), value)])
+        rec.close()
+
+        (key,), _ = analyze_capture(self.path)
+        self.assertEqual(key.samples, len(travel))
+        self.assertEqual(key.presses, 5)
+        self.assertEqual(key.bottom_out_stats(), (198, 198, 198, 198, 198))
+        self.assertEqual(key.adc_p2p, 2)
+        self.assertEqual(key.travel_jitter, 2)
+        self.assertEqual(key.suggested_top_deadband(), 6)
+        self.assertEqual(key.suggested_rt(), 6)
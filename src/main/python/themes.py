@@ -160,10 +160,13 @@ for name, colors in themes:
 class Theme:
 
     theme = ""
+    # bumped on every theme change so cached brushes and keycap pixmaps get rebuilt
+    generation = 0
 
     @classmethod
     def set_theme(cls, theme):
         cls.theme = theme
+        cls.generation += 1
         if theme in palettes:
             QApplication.setPalette(palettes[theme])
             QApplication.setStyle("Fusion")
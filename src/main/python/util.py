@@ -24,6 +24,9 @@ VIBL_SERIAL_NUMBER_MAGIC = "vibl:d4f8159c"
 
 MSG_LEN = 32
 
+# how many requests hid_send_batch keeps in flight, well below what the OS buffers for a raw HID device
+BATCH_WINDOW = 8
+
 # these should match what we have in vial-qmk/keyboards/vial_example
 # so that people don't accidentally reuse a sample keyboard UID
 EXAMPLE_KEYBOARDS = [
@@ -67,6 +70,65 @@ def hid_send(dev, msg, retries=1):
     return data
 
 
+def synchronized(fn, lock):
+    """ Wraps fn so that calls made from different threads never overlap """
+    def wrapper(*args, **kwargs):
+        with lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def hid_send_batch(dev, msgs, retries=1, window=BATCH_WINDOW):
+    """
+    Sends a list of messages keeping up to window of them in flight, yields the responses in order.
+    Raw HID answers reports in the order they were sent, so responses are matched by position; if a write
+    or read fails, whatever is still in flight is dropped and the rest falls back to hid_send. Responses
+    still in flight when the consumer stops early are read and discarded on close.
+    That fallback sends again requests the device may already have executed, only batch idempotent
+    commands (reads and "set X to Y" writes), never ones like "append" or "toggle".
+    """
+    for msg in msgs:
+        if len(msg) > MSG_LEN:
+            raise RuntimeError("message must be less than 32 bytes")
+
+    # the web build talks to the device through a request/response bridge, no pipelining there
+    if sys.platform == "emscripten":
+        window = 1
+
+    sent = received = 0
+    try:
+        try:
+            while received < len(msgs):
+                while sent < len(msgs) and sent - received < window:
+                    msg = msgs[sent] + b"\x00" * (MSG_LEN - len(msgs[sent]))
+                    if dev.write(b"\x00" + msg) != MSG_LEN + 1:
+                        raise OSError("short write")
+                    sent += 1
+                data = bytes(dev.read(MSG_LEN, timeout_ms=500))
+                if not data:
+                    raise OSError("read timed out")
+                received += 1
+                yield data
+        except OSError:
+            # drain late responses so they are not mistaken for answers to the retried requests
+            try:
+                while dev.read(MSG_LEN, timeout_ms=50):
+                    pass
+            except OSError:
+                pass
+            sent = received
+            for msg in msgs[received:]:
+                yield hid_send(dev, msg, retries)
+    finally:
+        # the consumer stopped early, don't leave responses behind to answer later requests
+        try:
+            for _ in range(sent - received):
+                if not dev.read(MSG_LEN, timeout_ms=500):
+                    break
+        except OSError:
+            pass
+
+
 def is_rawhid(desc, quiet):
     if desc["usage_page"] != 0xFF60 or desc["usage"] != 0x61:
         if not quiet:
@@ -177,7 +239,7 @@ class KeycodeDisplay:
         """ Get label for a specific keycode """
         if cls.code_is_overriden(code):
             return cls.keymap_override[Keycode.find_outer_keycode(code).qmk_id]
-        return Keycode.label(code)
+        return Keycode.label_for(code)
 
     @classmethod
     def code_is_overriden(cls, code):
@@ -188,7 +250,7 @@ class KeycodeDisplay:
     @classmethod
     def display_keycode(cls, widget, code):
         text = cls.get_label(code)
-        tooltip = Keycode.tooltip(code)
+        tooltip = Keycode.tooltip_for(code)
         mask = Keycode.is_mask(code)
         mask_text = ""
         inner = Keycode.find_inner_keycode(code)
@@ -223,16 +285,3 @@ class KeycodeDisplay:
     @classmethod
     def unregister_keymap_override(cls, client):
         cls.clients.remove(client)
-
-    @classmethod
-    def relabel_buttons(cls, buttons):
-        for widget in buttons:
-            qmk_id = widget.keycode.qmk_id
-            if qmk_id in KeycodeDisplay.keymap_override:
-                label = KeycodeDisplay.keymap_override[qmk_id]
-                highlight_color = QApplication.palette().color(QPalette.Link).getRgb()
-                widget.setStyleSheet("QPushButton {color: rgb%s;}" % str(highlight_color))
-            else:
-                label = widget.keycode.label
-                widget.setStyleSheet("QPushButton {}")
-            widget.setText(label.replace("&", "&&"))
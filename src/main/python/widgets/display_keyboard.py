@@ -1,43 +1,80 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
-import json
+from PyQt5.QtCore import QRect, QSize, QEvent
+from PyQt5.QtWidgets import QSizePolicy, QStyle
 
-from PyQt5.QtCore import pyqtSignal
-from PyQt5.QtWidgets import QGridLayout, QWidget, QSizePolicy
-
-from constants import KEYCODE_BTN_RATIO
 from keycodes.keycodes import Keycode
-from util import KeycodeDisplay
-from widgets.square_button import SquareButton
-from kle_serial import Serial as KleSerial
+from widgets.keycode_grid import KeycodeCellView, KeycodeModel
+from widgets.spatial_index import SpatialGrid
+from kle_serial import Serial as KleSerial, LayoutCache
 
+# the same built-in keyboards are shown in the editor and in the tray and rebuilt on every keyboard change,
+# there are only a handful of them so they are kept for the whole session
+display_layouts = LayoutCache(lambda rows: KleSerial().deserialize(rows, keep_styling=False).keys)
 
-class DisplayKeyboard(QWidget):
 
-    keycode_changed = pyqtSignal(str)
+class DisplayKeyboard(KeycodeCellView):
 
     def __init__(self, kbdef):
         super().__init__()
 
-        self.layout = QGridLayout()
         self.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
-        self.buttons = []
+        self.keys = display_layouts.get(kbdef)
+        self.keycodes = [Keycode.find_by_qmk_id(key.labels[0]) for key in self.keys]
+        # (cell size, spacing) the rects below were laid out for
+        self.metrics = None
+        self.rects = []
+        self.grid = None
+        self.size_hint = QSize()
 
-        keymap = KleSerial().deserialize(json.loads(kbdef))
-        for key in keymap.keys:
-            kc = Keycode.find_by_qmk_id(key.labels[0])
-            btn = SquareButton()
-            btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-            btn.setRelSize(KEYCODE_BTN_RATIO)
-            btn.setContentsMargins(0, 0, 0, 0)
-            btn.setToolTip(Keycode.tooltip(kc.qmk_id))
-            btn.setText(kc.label)
-            btn.clicked.connect(lambda st, k=kc: self.keycode_changed.emit(k.qmk_id))
-            btn.keycode = kc
+        self.relabel_buttons()
 
-            self.buttons.append(btn)
-            self.layout.addWidget(btn, round(key.y * 4), round(key.x * 4), round(key.height * 4), round(key.width * 4))
+    def relabel_buttons(self):
+        model = KeycodeModel.get()
+        self.set_cells([model.cell(kc) for kc in self.keycodes])
 
-        self.setLayout(self.layout)
+    def layout_cells(self):
+        """ Places keys on a grid of quarter units, same as the QGridLayout of buttons this replaces """
+        metrics = (self.cell_size(), self.spacing())
+        if metrics == self.metrics:
+            return
+        self.metrics = metrics
+        size, spacing = metrics
+        margin = self.style().pixelMetric(QStyle.PM_LayoutLeftMargin)
+        quarter = (size + spacing) / 4
 
-    def relabel_buttons(self):
-        KeycodeDisplay.relabel_buttons(self.buttons)
+        self.rects = []
+        for key in self.keys:
+            x, y = margin + round(round(key.x * 4) * quarter), margin + round(round(key.y * 4) * quarter)
+            w = round(round(key.width * 4) * quarter) - spacing
+            h = round(round(key.height * 4) * quarter) - spacing
+            self.rects.append(QRect(x, y, w, h))
+        self.grid = SpatialGrid(range(len(self.rects)), self.rects, size + spacing)
+
+        bounds = QRect()
+        for rect in self.rects:
+            bounds = bounds.united(rect)
+        self.size_hint = QSize(bounds.right() + 1 + margin, bounds.bottom() + 1 + margin)
+
+    def sizeHint(self):
+        self.layout_cells()
+        return self.size_hint
+
+    def cell_rect(self, idx):
+        self.layout_cells()
+        return self.rects[idx]
+
+    def cell_at(self, pos):
+        self.layout_cells()
+        for idx in self.grid.query_point(pos.x(), pos.y()):
+            if self.rects[idx].contains(pos):
+                return idx
+        return None
+
+    def cells_in(self, rect):
+        self.layout_cells()
+        return self.grid.query_rect(rect)
+
+    def changeEvent(self, e):
+        if e.type() in [QEvent.FontChange, QEvent.StyleChange]:
+            self.updateGeometry()
+        super().changeEvent(e)
@@ -1,104 +1,156 @@
+import weakref
 from collections import defaultdict
 
-from PyQt5.QtGui import QPainter, QColor, QPainterPath, QTransform, QBrush, QPolygonF, QPalette
-from PyQt5.QtWidgets import QWidget, QToolTip, QApplication
+from PyQt5.QtGui import QPainter, QColor, QPainterPath, QTransform, QPolygonF
+from PyQt5.QtWidgets import QWidget, QToolTip, QRubberBand
 from PyQt5.QtCore import Qt, QSize, QRect, QPointF, pyqtSignal, QEvent, QRectF
 
 from constants import KEY_SIZE_RATIO, KEY_SPACING_RATIO, KEYBOARD_WIDGET_PADDING, \
     KEYBOARD_WIDGET_MASK_HEIGHT, KEY_ROUNDNESS, SHADOW_SIDE_PADDING, SHADOW_TOP_PADDING, SHADOW_BOTTOM_PADDING, \
     KEYBOARD_WIDGET_NONMASK_PADDING
-from themes import Theme
+from widgets.spatial_index import SpatialGrid
+from widgets.keycap_cache import RenderPalette, keycap_state, keycap_shape, keycap_pixmap, KEYCAP_PADDING
 
 
-class KeyWidget:
+# kle key -> {(geometry class, scale): KeyGeometry}, shared by every KeyboardWidget showing the same keyboard
+shared_geometries = weakref.WeakKeyDictionary()
 
-    def __init__(self, desc, scale, shift_x=0, shift_y=0):
-        self.active = False
-        self.on = False
-        self.masked = False
-        self.pressed = False
-        self.desc = desc
-        self.text = ""
-        self.mask_text = ""
-        self.tooltip = ""
-        self.color = None
-        self.mask_color = None
-        self.scale = 0
 
-        self.rotation_angle = desc.rotation_angle
+def key_geometry(desc, cls, scale):
+    """ Returns the geometry of a key, computing it only for the first view asking for it """
+    geometries = shared_geometries.get(desc)
+    if geometries is None:
+        geometries = shared_geometries[desc] = dict()
+    geometry = geometries.get((cls, scale))
+    if geometry is None:
+        geometry = geometries[(cls, scale)] = cls(desc, scale)
+    return geometry
+
+
+class KeyGeometry:
+
+    """
+    Shape of a key at one scale, in keyboard coordinates before any layout option shift.
+    Shared between all views of a keyboard, so it must never be modified after construction. It must not
+    reference the kle key either, that would keep the key alive in shared_geometries forever
+    """
+
+    __slots__ = ["scale", "rotation_angle", "has2", "size", "rotation_x", "rotation_y", "transform",
+                 "x", "y", "w", "h", "rect", "text_rect", "x2", "y2", "w2", "h2", "rect2", "bbox", "bbox2", "polygon",
+                 "corner", "background_draw_path", "foreground_draw_path", "extra_draw_path", "nonmask_rect",
+                 "mask_rect", "mask_bbox", "mask_polygon", "shape", "placements", "paint_geometries"]
 
+    def __init__(self, desc, scale):
+        self.scale = scale
+
+        self.rotation_angle = desc.rotation_angle
         self.has2 = desc.width2 != desc.width or desc.height2 != desc.height or desc.x2 != 0 or desc.y2 != 0
 
-        self.update_position(scale, shift_x, shift_y)
+        self.size = self.scale * (KEY_SIZE_RATIO + KEY_SPACING_RATIO)
+        spacing = self.scale * KEY_SPACING_RATIO
 
-    def update_position(self, scale, shift_x=0, shift_y=0):
-        if self.scale != scale or self.shift_x != shift_x or self.shift_y != shift_y:
-            self.scale = scale
-            self.size = self.scale * (KEY_SIZE_RATIO + KEY_SPACING_RATIO)
-            spacing = self.scale * KEY_SPACING_RATIO
+        self.rotation_x = self.size * desc.rotation_x
+        self.rotation_y = self.size * desc.rotation_y
 
-            self.rotation_x = self.size * self.desc.rotation_x
-            self.rotation_y = self.size * self.desc.rotation_y
+        # the same rotation applies to every corner of the key
+        self.transform = QTransform()
+        self.transform.translate(self.rotation_x, self.rotation_y)
+        self.transform.rotate(self.rotation_angle)
+        self.transform.translate(-self.rotation_x, -self.rotation_y)
 
-            self.shift_x = shift_x
-            self.shift_y = shift_y
-            self.x = self.size * self.desc.x
-            self.y = self.size * self.desc.y
-            self.w = self.size * self.desc.width - spacing
-            self.h = self.size * self.desc.height - spacing
-
-            self.rect = QRect(
-                round(self.x),
-                round(self.y),
-                round(self.w),
-                round(self.h)
-            )
-            self.text_rect = QRect(
-                round(self.x),
-                round(self.y + self.size * SHADOW_TOP_PADDING),
-                round(self.w),
-                round(self.h - self.size * (SHADOW_BOTTOM_PADDING + SHADOW_TOP_PADDING))
-            )
+        self.x = self.size * desc.x
+        self.y = self.size * desc.y
+        self.w = self.size * desc.width - spacing
+        self.h = self.size * desc.height - spacing
+
+        self.rect = QRect(
+            round(self.x),
+            round(self.y),
+            round(self.w),
+            round(self.h)
+        )
+        self.text_rect = QRect(
+            round(self.x),
+            round(self.y + self.size * SHADOW_TOP_PADDING),
+            round(self.w),
+            round(self.h - self.size * (SHADOW_BOTTOM_PADDING + SHADOW_TOP_PADDING))
+        )
 
-            self.x2 = self.x + self.size * self.desc.x2
-            self.y2 = self.y + self.size * self.desc.y2
-            self.w2 = self.size * self.desc.width2 - spacing
-            self.h2 = self.size * self.desc.height2 - spacing
+        self.x2 = self.x + self.size * desc.x2
+        self.y2 = self.y + self.size * desc.y2
+        self.w2 = self.size * desc.width2 - spacing
+        self.h2 = self.size * desc.height2 - spacing
 
-            self.rect2 = QRect(
-                round(self.x2),
-                round(self.y2),
-                round(self.w2),
-                round(self.h2)
-            )
+        self.rect2 = QRect(
+            round(self.x2),
+            round(self.y2),
+            round(self.w2),
+            round(self.h2)
+        )
 
-            self.bbox = self.calculate_bbox(self.rect)
-            self.bbox2 = self.calculate_bbox(self.rect2)
-            self.polygon = QPolygonF(self.bbox + [self.bbox[0]])
-            self.polygon2 = QPolygonF(self.bbox2 + [self.bbox2[0]])
-            self.polygon = self.polygon.united(self.polygon2)
-            self.corner = self.size * KEY_ROUNDNESS
-            self.background_draw_path = self.calculate_background_draw_path()
-            self.foreground_draw_path = self.calculate_foreground_draw_path()
-            self.extra_draw_path = self.calculate_extra_draw_path()
-
-            # calculate areas where the inner keycode will be located
-            # nonmask = outer (e.g. Rsft_T)
-            # mask = inner (e.g. KC_A)
-            self.nonmask_rect = QRect(
-                round(self.x),
-                round(self.y + self.size * KEYBOARD_WIDGET_NONMASK_PADDING),
-                round(self.w),
-                round(self.h * (1 - KEYBOARD_WIDGET_MASK_HEIGHT))
-            )
-            self.mask_rect = QRect(
-                round(self.x + self.size * SHADOW_SIDE_PADDING),
-                round(self.y + self.h * (1 - KEYBOARD_WIDGET_MASK_HEIGHT)),
-                round(self.w - 2 * self.size * SHADOW_SIDE_PADDING),
-                round(self.h * KEYBOARD_WIDGET_MASK_HEIGHT - self.size * SHADOW_BOTTOM_PADDING)
-            )
-            self.mask_bbox = self.calculate_bbox(self.mask_rect)
-            self.mask_polygon = QPolygonF(self.mask_bbox + [self.mask_bbox[0]])
+        self.bbox = self.calculate_bbox(self.rect)
+        self.bbox2 = self.calculate_bbox(self.rect2)
+        self.polygon = QPolygonF(self.bbox + [self.bbox[0]])
+        if self.has2:
+            self.polygon = self.polygon.united(QPolygonF(self.bbox2 + [self.bbox2[0]]))
+        self.corner = self.size * KEY_ROUNDNESS
+        self.background_draw_path = self.calculate_background_draw_path()
+        self.foreground_draw_path = self.calculate_foreground_draw_path()
+        self.extra_draw_path = self.calculate_extra_draw_path()
+
+        # calculate areas where the inner keycode will be located
+        # nonmask = outer (e.g. Rsft_T)
+        # mask = inner (e.g. KC_A)
+        self.nonmask_rect = QRect(
+            round(self.x),
+            round(self.y + self.size * KEYBOARD_WIDGET_NONMASK_PADDING),
+            round(self.w),
+            round(self.h * (1 - KEYBOARD_WIDGET_MASK_HEIGHT))
+        )
+        self.mask_rect = QRect(
+            round(self.x + self.size * SHADOW_SIDE_PADDING),
+            round(self.y + self.h * (1 - KEYBOARD_WIDGET_MASK_HEIGHT)),
+            round(self.w - 2 * self.size * SHADOW_SIDE_PADDING),
+            round(self.h * KEYBOARD_WIDGET_MASK_HEIGHT - self.size * SHADOW_BOTTOM_PADDING)
+        )
+        self.mask_bbox = self.calculate_bbox(self.mask_rect)
+        self.mask_polygon = QPolygonF(self.mask_bbox + [self.mask_bbox[0]])
+
+        self.shape = keycap_shape(self)
+
+        # (shift_x, shift_y) -> (polygon, mask_polygon)
+        self.placements = dict()
+        # (shift_x, shift_y, scale) -> (transform, rect, origin)
+        self.paint_geometries = dict()
+
+    def placed(self, shift_x, shift_y):
+        """ Returns (polygon, mask_polygon) of the key shifted by a layout option """
+        placement = self.placements.get((shift_x, shift_y))
+        if placement is None:
+            # shifting happens after rotation, so the shifted polygons are just translated copies
+            placement = self.placements[(shift_x, shift_y)] = (self.polygon.translated(shift_x, shift_y),
+                                                               self.mask_polygon.translated(shift_x, shift_y))
+        return placement
+
+    def paint_geometry(self, shift_x, shift_y, scale):
+        """
+        Returns (transform, rect, origin) for a shifted key in a KeyboardWidget drawn at this scale: the transform
+        mapping keycap coordinates to widget coordinates, the widget area covered by the key and the widget
+        position of the top-left corner of its keycap
+        """
+        params = (shift_x, shift_y, scale)
+        paint_geometry = self.paint_geometries.get(params)
+        if paint_geometry is None:
+            t = self.transform * QTransform.fromTranslate(shift_x, shift_y) * QTransform.fromScale(scale, scale)
+
+            rect = self.placed(shift_x, shift_y)[0].boundingRect()
+            rect = QRectF(rect.x() * scale, rect.y() * scale, rect.width() * scale, rect.height() * scale)
+            # leave room for the highlight pen and antialiasing
+            rect = rect.toAlignedRect().adjusted(-2, -2, 2, 2)
+
+            origin = t.map(self.background_draw_path.boundingRect().topLeft())
+            paint_geometry = self.paint_geometries[params] = (t, rect, origin)
+        return paint_geometry
 
     def calculate_bbox(self, rect):
         x1 = rect.topLeft().x()
@@ -106,16 +158,7 @@ class KeyWidget:
         x2 = rect.bottomRight().x()
         y2 = rect.bottomRight().y()
         points = [(x1, y1), (x1, y2), (x2, y2), (x2, y1)]
-        bbox = []
-        for p in points:
-            t = QTransform()
-            t.translate(self.shift_x, self.shift_y)
-            t.translate(self.rotation_x, self.rotation_y)
-            t.rotate(self.rotation_angle)
-            t.translate(-self.rotation_x, -self.rotation_y)
-            p = t.map(QPointF(p[0], p[1]))
-            bbox.append(p)
-        return bbox
+        return [self.transform.map(QPointF(p[0], p[1])) for p in points]
 
     def calculate_background_draw_path(self):
         path = QPainterPath()
@@ -172,6 +215,51 @@ class KeyWidget:
     def calculate_extra_draw_path(self):
         return QPainterPath()
 
+
+class KeyWidget:
+
+    __slots__ = ["active", "on", "masked", "pressed", "heat", "desc", "text", "mask_text", "tooltip", "color",
+                 "mask_color", "scale", "shift_x", "shift_y", "paint_geometry_cache", "geometry", "polygon",
+                 "mask_polygon"]
+
+    geometry_class = KeyGeometry
+
+    def __init__(self, desc, scale, shift_x=0, shift_y=0):
+        self.active = False
+        self.on = False
+        self.masked = False
+        self.pressed = False
+        # 0..1 overlay intensity, None for no overlay
+        self.heat = None
+        self.desc = desc
+        self.text = ""
+        self.mask_text = ""
+        self.tooltip = ""
+        self.color = None
+        self.mask_color = None
+        self.scale = 0
+
+        self.update_position(scale, shift_x, shift_y)
+
+    def geometry_for(self, scale):
+        return key_geometry(self.desc, self.geometry_class, scale)
+
+    def update_position(self, scale, shift_x=0, shift_y=0):
+        if self.scale != scale or self.shift_x != shift_x or self.shift_y != shift_y:
+            self.scale = scale
+            self.shift_x = shift_x
+            self.shift_y = shift_y
+            self.paint_geometry_cache = None
+
+            self.geometry = self.geometry_for(scale)
+            self.polygon, self.mask_polygon = self.geometry.placed(shift_x, shift_y)
+
+    def paint_geometry(self, scale):
+        """ Returns (transform, rect, origin) for a KeyboardWidget drawn at this scale, see KeyGeometry """
+        if self.paint_geometry_cache is None or self.paint_geometry_cache[0] != scale:
+            self.paint_geometry_cache = (scale, self.geometry.paint_geometry(self.shift_x, self.shift_y, scale))
+        return self.paint_geometry_cache[1]
+
     def setText(self, text):
         self.text = text
 
@@ -187,6 +275,9 @@ class KeyWidget:
     def setOn(self, on):
         self.on = on
 
+    def setHeat(self, heat):
+        self.heat = heat
+
     def setPressed(self, pressed):
         self.pressed = pressed
 
@@ -205,7 +296,13 @@ class KeyWidget:
         return " ".join(qualifiers)
 
 
-class EncoderWidget(KeyWidget):
+class EncoderGeometry(KeyGeometry):
+
+    __slots__ = ["encoder_dir"]
+
+    def __init__(self, desc, scale):
+        self.encoder_dir = desc.encoder_dir
+        super().__init__(desc, scale)
 
     def calculate_background_draw_path(self):
         path = QPainterPath()
@@ -228,7 +325,7 @@ class EncoderWidget(KeyWidget):
         p = self.h
         x = self.x
         y = self.y + p / 2
-        if self.desc.encoder_dir == 0:
+        if self.encoder_dir == 0:
             # counterclockwise - pointing down
             path.moveTo(round(x), round(y))
             path.lineTo(round(x + p / 10), round(y - p / 10))
@@ -244,10 +341,138 @@ class EncoderWidget(KeyWidget):
             path.lineTo(round(x), round(y))
         return path
 
+
+class EncoderWidget(KeyWidget):
+
+    __slots__ = []
+
+    geometry_class = EncoderGeometry
+
     def __repr__(self):
         return "EncoderWidget"
 
 
+def calculate_placement(common_widgets, widgets_for_layout, get_choice, scale_factor, padding):
+    """
+    Returns (widget, shift_x, shift_y) for every widget shown with the layout options chosen by get_choice(index),
+    positioned so the top-left key is padding away from the origin
+    """
+
+    # common widgets, that is, ones which are always displayed, require no extra transforms
+    placement = [(widget, 0, 0) for widget in common_widgets]
+
+    # top-left position for specific layout
+    layout_x = defaultdict(lambda: defaultdict(lambda: 1e6))
+    layout_y = defaultdict(lambda: defaultdict(lambda: 1e6))
+
+    # determine top-left position for every layout option
+    for widget in widgets_for_layout:
+        idx, opt = widget.desc.layout_index, widget.desc.layout_option
+        p = widget.geometry_for(scale_factor).polygon.boundingRect().topLeft()
+        layout_x[idx][opt] = min(layout_x[idx][opt], p.x())
+        layout_y[idx][opt] = min(layout_y[idx][opt], p.y())
+
+    # obtain widgets for all layout options now that we know how to shift them
+    for widget in widgets_for_layout:
+        idx, opt = widget.desc.layout_index, widget.desc.layout_option
+        if opt == get_choice(idx):
+            shift_x = layout_x[idx][opt] - layout_x[idx][0]
+            shift_y = layout_y[idx][opt] - layout_y[idx][0]
+            placement.append((widget, -shift_x, -shift_y))
+
+    # at this point some widgets on left side might be cutoff, or there may be too much empty space
+    # calculate top left position of visible widgets and shift everything around
+    top_x = top_y = 1e6
+    for widget, shift_x, shift_y in placement:
+        if not widget.desc.decal:
+            p = widget.geometry_for(scale_factor).polygon.boundingRect().topLeft()
+            top_x = min(top_x, p.x() + shift_x)
+            top_y = min(top_y, p.y() + shift_y)
+    return [(widget, shift_x - top_x + padding, shift_y - top_y + padding)
+            for widget, shift_x, shift_y in placement]
+
+
+def paint_keys(qp, widgets, palette, scale, dpr=1, dirty=None, active_key=None, active_mask=False,
+               magnet_text=False, cached=True):
+    """
+    Paints keys onto an antialiased painter at the given scale, skipping the ones outside the dirty rect.
+    With cached set the keycaps come from the QPixmapCache, which only works in the GUI thread
+    """
+    regular_font = qp.font()
+    mask_font = qp.font()
+    if magnet_text:
+        mask_font.setPointSize(round(mask_font.pointSize() * 0.5))
+    else:
+        mask_font.setPointSize(round(mask_font.pointSize() * 0.8))
+
+    for key in widgets:
+        geometry = key.geometry
+        transform, rect, origin = key.paint_geometry(scale)
+        if dirty is not None and not dirty.intersects(rect):
+            continue
+
+        active = key.active or (active_key == key and not active_mask)
+        state = keycap_state(key)
+
+        if cached and geometry.rotation_angle == 0:
+            # static keycap layers come pre-rendered, placed on whole device pixels so they stay sharp
+            qp.resetTransform()
+            qp.drawPixmap(QPointF((round(origin.x() * dpr) - KEYCAP_PADDING) / dpr,
+                                  (round(origin.y() * dpr) - KEYCAP_PADDING) / dpr),
+                          keycap_pixmap(geometry, scale, dpr, state, active))
+            qp.setTransform(transform)
+        else:
+            # a rotated pixmap would come out blurry and pixmaps can't be used outside the GUI thread, draw the paths
+            qp.setTransform(transform)
+
+            # draw keycap background/drop-shadow
+            qp.setPen(palette.active_pen if active else Qt.NoPen)
+            qp.setBrush(palette.background[state])
+            qp.drawPath(geometry.background_draw_path)
+
+            # draw keycap foreground
+            qp.setPen(Qt.NoPen)
+            qp.setBrush(palette.foreground[state])
+            qp.drawPath(geometry.foreground_draw_path)
+
+        # draw heatmap overlay
+        if key.heat is not None:
+            heat_color = QColor(palette.highlight)
+            heat_color.setAlpha(round(max(0.0, min(1.0, key.heat)) * 200))
+            qp.setPen(Qt.NoPen)
+            qp.setBrush(heat_color)
+            qp.drawPath(geometry.foreground_draw_path)
+
+        # draw key text
+        if key.masked:
+            # draw the outer legend
+            qp.setFont(mask_font)
+            qp.setPen(key.color if key.color else palette.regular_pen)
+            qp.drawText(geometry.nonmask_rect, Qt.AlignCenter, key.text)
+
+            # draw the inner highlight rect
+            qp.setPen(palette.active_pen if active_key == key and active_mask else Qt.NoPen)
+            qp.setBrush(palette.mask_brush)
+            qp.drawRoundedRect(geometry.mask_rect, geometry.corner, geometry.corner)
+
+            # draw the inner legend
+            qp.setPen(key.mask_color if key.mask_color else palette.regular_pen)
+            qp.drawText(geometry.mask_rect, Qt.AlignCenter, key.mask_text)
+        else:
+            # draw the legend
+            qp.setFont(regular_font)
+            qp.setPen(key.color if key.color else palette.regular_pen)
+            qp.drawText(geometry.text_rect, Qt.AlignCenter, key.text)
+
+        # draw the extra shape (encoder arrow)
+        if not geometry.extra_draw_path.isEmpty():
+            qp.setPen(palette.extra_pen)
+            qp.setBrush(palette.extra_brush)
+            qp.drawPath(geometry.extra_draw_path)
+
+    qp.resetTransform()
+
+
 class KeyboardWidget(QWidget):
 
     clicked = pyqtSignal()
@@ -270,9 +495,15 @@ class KeyboardWidget(QWidget):
 
         # layout-specific widgets
         self.widgets_for_layout = []
+        # layout indices used by widgets_for_layout
+        self.layout_indices = []
+        # (scale, padding, layout choices) -> [(widget, shift_x, shift_y)]
+        self.placements = dict()
 
         # widgets in current layout
         self.widgets = []
+        # self.widgets indexed by area, rebuilt whenever the geometry changes
+        self.grid = SpatialGrid([], [], 1)
 
         self.width = self.height = 0
         self.active_key = None
@@ -280,11 +511,19 @@ class KeyboardWidget(QWidget):
 
         self.magnet_text = False
 
+        # when enabled, ctrl+click adds keys to the selection and dragging over empty space selects a region,
+        # selected keys other than active_key are marked with KeyWidget.active
+        self.multiselect = False
+        self.rubber_band = QRubberBand(QRubberBand.Rectangle, self)
+        self.rubber_origin = None
+
     def set_keys(self, keys, encoders):
         self.common_widgets = []
         self.widgets_for_layout = []
 
         self.add_keys([(x, KeyWidget) for x in keys] + [(x, EncoderWidget) for x in encoders])
+        self.layout_indices = sorted(set(w.desc.layout_index for w in self.widgets_for_layout))
+        self.placements = dict()
         self.update_layout()
 
     def add_keys(self, keys):
@@ -299,46 +538,19 @@ class KeyboardWidget(QWidget):
     def place_widgets(self):
         scale_factor = self.fontMetrics().height()
 
-        self.widgets = []
+        # placements are remembered per combination of layout options, toggling back and forth is just a lookup
+        placement_key = (scale_factor, self.padding,
+                         tuple(self.layout_editor.get_choice(idx) for idx in self.layout_indices))
+        placement = self.placements.get(placement_key)
+        if placement is None:
+            placement = self.placements[placement_key] = calculate_placement(
+                self.common_widgets, self.widgets_for_layout, self.layout_editor.get_choice, scale_factor, self.padding)
 
-        # place common widgets, that is, ones which are always displayed and require no extra transforms
-        for widget in self.common_widgets:
-            widget.update_position(scale_factor)
+        self.widgets = []
+        for widget, shift_x, shift_y in placement:
+            widget.update_position(scale_factor, shift_x, shift_y)
             self.widgets.append(widget)
 
-        # top-left position for specific layout
-        layout_x = defaultdict(lambda: defaultdict(lambda: 1e6))
-        layout_y = defaultdict(lambda: defaultdict(lambda: 1e6))
-
-        # determine top-left position for every layout option
-        for widget in self.widgets_for_layout:
-            widget.update_position(scale_factor)
-            idx, opt = widget.desc.layout_index, widget.desc.layout_option
-            p = widget.polygon.boundingRect().topLeft()
-            layout_x[idx][opt] = min(layout_x[idx][opt], p.x())
-            layout_y[idx][opt] = min(layout_y[idx][opt], p.y())
-
-        # obtain widgets for all layout options now that we know how to shift them
-        for widget in self.widgets_for_layout:
-            idx, opt = widget.desc.layout_index, widget.desc.layout_option
-            if opt == self.layout_editor.get_choice(idx):
-                shift_x = layout_x[idx][opt] - layout_x[idx][0]
-                shift_y = layout_y[idx][opt] - layout_y[idx][0]
-                widget.update_position(scale_factor, -shift_x, -shift_y)
-                self.widgets.append(widget)
-
-        # at this point some widgets on left side might be cutoff, or there may be too much empty space
-        # calculate top left position of visible widgets and shift everything around
-        top_x = top_y = 1e6
-        for widget in self.widgets:
-            if not widget.desc.decal:
-                p = widget.polygon.boundingRect().topLeft()
-                top_x = min(top_x, p.x())
-                top_y = min(top_y, p.y())
-        for widget in self.widgets:
-            widget.update_position(widget.scale, widget.shift_x - top_x + self.padding,
-                                   widget.shift_y - top_y + self.padding)
-
     def update_layout(self):
         """ Updates self.widgets for the currently active layout """
 
@@ -346,7 +558,11 @@ class KeyboardWidget(QWidget):
         self.place_widgets()
         self.widgets = list(filter(lambda w: not w.desc.decal, self.widgets))
 
-        self.widgets.sort(key=lambda w: (w.y, w.x))
+        self.widgets.sort(key=lambda w: (w.geometry.y, w.geometry.x))
+
+        # index keys by area so hit tests only look at the few keys around the point, cells are one key unit
+        self.grid = SpatialGrid(self.widgets, [w.polygon.boundingRect() for w in self.widgets],
+                                self.widgets[0].geometry.size if self.widgets else 1)
 
         # determine maximum width and height of container
         max_w = max_h = 0
@@ -365,128 +581,25 @@ class KeyboardWidget(QWidget):
         qp = QPainter()
         qp.begin(self)
         qp.setRenderHint(QPainter.Antialiasing)
-
-        # for regular keycaps
-        regular_pen = qp.pen()
-        regular_pen.setColor(QApplication.palette().color(QPalette.ButtonText))
-        qp.setPen(regular_pen)
-
-        background_brush = QBrush()
-        background_brush.setColor(QApplication.palette().color(QPalette.Button))
-        background_brush.setStyle(Qt.SolidPattern)
-
-        foreground_brush = QBrush()
-        foreground_brush.setColor(QApplication.palette().color(QPalette.Button).lighter(120))
-        foreground_brush.setStyle(Qt.SolidPattern)
-
-        mask_brush = QBrush()
-        mask_brush.setColor(QApplication.palette().color(QPalette.Button).lighter(Theme.mask_light_factor()))
-        mask_brush.setStyle(Qt.SolidPattern)
-
-        # for currently selected keycap
-        active_pen = qp.pen()
-        active_pen.setColor(QApplication.palette().color(QPalette.Highlight))
-        active_pen.setWidthF(1.5)
-
-        # for the encoder arrow
-        extra_pen = regular_pen
-        extra_brush = QBrush()
-        extra_brush.setColor(QApplication.palette().color(QPalette.ButtonText))
-        extra_brush.setStyle(Qt.SolidPattern)
-
-        # for pressed keycaps
-        background_pressed_brush = QBrush()
-        background_pressed_brush.setColor(QApplication.palette().color(QPalette.Highlight))
-        background_pressed_brush.setStyle(Qt.SolidPattern)
-
-        foreground_pressed_brush = QBrush()
-        foreground_pressed_brush.setColor(QApplication.palette().color(QPalette.Highlight).lighter(120))
-        foreground_pressed_brush.setStyle(Qt.SolidPattern)
-
-        background_on_brush = QBrush()
-        background_on_brush.setColor(QApplication.palette().color(QPalette.Highlight).darker(150))
-        background_on_brush.setStyle(Qt.SolidPattern)
-
-        foreground_on_brush = QBrush()
-        foreground_on_brush.setColor(QApplication.palette().color(QPalette.Highlight).darker(120))
-        foreground_on_brush.setStyle(Qt.SolidPattern)
-
-        mask_font = qp.font()
-        if self.magnet_text:
-            mask_font.setPointSize(round(mask_font.pointSize() * 0.5))
-        else:
-            mask_font.setPointSize(round(mask_font.pointSize() * 0.8))
-
-        for idx, key in enumerate(self.widgets):
-            qp.save()
-
-            qp.scale(self.scale, self.scale)
-            qp.translate(key.shift_x, key.shift_y)
-            qp.translate(key.rotation_x, key.rotation_y)
-            qp.rotate(key.rotation_angle)
-            qp.translate(-key.rotation_x, -key.rotation_y)
-
-            active = key.active or (self.active_key == key and not self.active_mask)
-
-            # draw keycap background/drop-shadow
-            qp.setPen(active_pen if active else Qt.NoPen)
-            brush = background_brush
-            if key.pressed:
-                brush = background_pressed_brush
-            elif key.on:
-                brush = background_on_brush
-            qp.setBrush(brush)
-            qp.drawPath(key.background_draw_path)
-
-            # draw keycap foreground
-            qp.setPen(Qt.NoPen)
-            brush = foreground_brush
-            if key.pressed:
-                brush = foreground_pressed_brush
-            elif key.on:
-                brush = foreground_on_brush
-            qp.setBrush(brush)
-            qp.drawPath(key.foreground_draw_path)
-
-            # draw key text
-            if key.masked:
-                # draw the outer legend
-                qp.setFont(mask_font)
-                qp.setPen(key.color if key.color else regular_pen)
-                qp.drawText(key.nonmask_rect, Qt.AlignCenter, key.text)
-
-                # draw the inner highlight rect
-                qp.setPen(active_pen if self.active_key == key and self.active_mask else Qt.NoPen)
-                qp.setBrush(mask_brush)
-                qp.drawRoundedRect(key.mask_rect, key.corner, key.corner)
-
-                # draw the inner legend
-                qp.setPen(key.mask_color if key.mask_color else regular_pen)
-                qp.drawText(key.mask_rect, Qt.AlignCenter, key.mask_text)
-            else:
-                # draw the legend
-                qp.setPen(key.color if key.color else regular_pen)
-                qp.drawText(key.text_rect, Qt.AlignCenter, key.text)
-
-            # draw the extra shape (encoder arrow)
-            qp.setPen(extra_pen)
-            qp.setBrush(extra_brush)
-            qp.drawPath(key.extra_draw_path)
-
-            qp.restore()
-
+        paint_keys(qp, self.widgets, RenderPalette.get(), self.scale, self.devicePixelRatioF(), event.rect(),
+                   self.active_key, self.active_mask, self.magnet_text)
         qp.end()
 
     def minimumSizeHint(self):
         return QSize(self.width, self.height)
 
+    def update_key(self, key):
+        """ Schedules a repaint of just the area covered by this key """
+        self.update(key.paint_geometry(self.scale)[1])
+
     def hit_test(self, pos):
         """ Returns key, hit_masked_part """
 
-        for key in self.widgets:
-            if key.masked and key.mask_polygon.containsPoint(pos/self.scale, Qt.OddEvenFill):
+        pos = QPointF(pos) / self.scale
+        for key in self.grid.query_point(pos.x(), pos.y()):
+            if key.masked and key.mask_polygon.containsPoint(pos, Qt.OddEvenFill):
                 return key, True
-            if key.polygon.containsPoint(pos/self.scale, Qt.OddEvenFill):
+            if key.polygon.containsPoint(pos, Qt.OddEvenFill):
                 return key, False
 
         return None, False
@@ -495,6 +608,10 @@ class KeyboardWidget(QWidget):
         if not self.enabled:
             return
 
+        if self.multiselect:
+            self.multiselect_press(ev)
+            return
+
         self.active_key, self.active_mask = self.hit_test(ev.pos())
         if self.active_key is not None:
             self.clicked.emit()
@@ -502,6 +619,65 @@ class KeyboardWidget(QWidget):
             self.deselected.emit()
         self.update()
 
+    def multiselect_press(self, ev):
+        key = self.hit_test(ev.pos())[0]
+        additive = bool(ev.modifiers() & Qt.ControlModifier)
+
+        if key is None:
+            if not additive:
+                self.set_selection([])
+            self.rubber_origin = ev.pos()
+            self.rubber_band.setGeometry(QRect(self.rubber_origin, QSize()))
+            self.rubber_band.show()
+        elif not additive:
+            self.set_selection([key])
+        elif key in self.selected_keys():
+            selection = self.selected_keys()
+            selection.remove(key)
+            self.set_selection(selection[-1:] + selection[:-1])
+        else:
+            self.set_selection([key] + self.selected_keys())
+
+    def mouseMoveEvent(self, ev):
+        if self.rubber_origin is not None:
+            self.rubber_band.setGeometry(QRect(self.rubber_origin, ev.pos()).normalized())
+
+    def mouseReleaseEvent(self, ev):
+        if self.rubber_origin is None:
+            return
+
+        region = self.rubber_band.geometry()
+        region = QRectF(region.x() / self.scale, region.y() / self.scale,
+                        region.width() / self.scale, region.height() / self.scale)
+        self.rubber_band.hide()
+        self.rubber_origin = None
+
+        hits = [key for key in self.grid.query_rect(region) if region.contains(key.polygon.boundingRect().center())]
+        if hits:
+            self.set_selection(hits + [key for key in self.selected_keys() if key not in hits])
+
+    def selected_keys(self):
+        """ Returns all selected keys, in keymap order """
+        return [key for key in self.widgets if key.active or key == self.active_key]
+
+    def set_selection(self, keys):
+        """ Replaces the selection, the first key becomes active_key """
+        for key in self.common_widgets + self.widgets_for_layout:
+            key.setActive(False)
+        for key in keys[1:]:
+            key.setActive(True)
+
+        self.active_key = keys[0] if keys else None
+        self.active_mask = False
+        if self.active_key is not None:
+            self.clicked.emit()
+        else:
+            self.deselected.emit()
+        self.update()
+
+    def select_all(self):
+        self.set_selection(list(self.widgets))
+
     def resizeEvent(self, ev):
         if self.isEnabled():
             self.update_layout()
@@ -518,6 +694,9 @@ class KeyboardWidget(QWidget):
                 return
 
     def deselect(self):
+        if self.multiselect:
+            for key in self.common_widgets + self.widgets_for_layout:
+                key.setActive(False)
         if self.active_key is not None:
             self.active_key = None
             self.deselected.emit()
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import math
+
+from PyQt5.QtGui import QBrush, QPen, QPalette, QPixmap, QPixmapCache, QPainter
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+
+from themes import Theme
+
+KEYCAP_NORMAL = "normal"
+KEYCAP_PRESSED = "pressed"
+KEYCAP_ON = "on"
+
+# room around the keycap pixmap for the highlight pen and antialiasing, in device pixels
+KEYCAP_PADDING = 2
+
+
+class RenderPalette:
+
+    """ Brushes and pens used to paint keycaps, built once per theme """
+
+    cached = None
+
+    def __init__(self):
+        palette = QApplication.palette()
+        button = palette.color(QPalette.Button)
+        button_text = palette.color(QPalette.ButtonText)
+        highlight = palette.color(QPalette.Highlight)
+
+        self.generation = Theme.generation
+        self.highlight = highlight
+
+        # for regular keycaps
+        self.regular_pen = QPen(button_text)
+        # for currently selected keycap
+        self.active_pen = QPen(highlight)
+        self.active_pen.setWidthF(1.5)
+        # for the encoder arrow
+        self.extra_pen = self.regular_pen
+        self.extra_brush = QBrush(button_text, Qt.SolidPattern)
+
+        self.mask_brush = QBrush(button.lighter(Theme.mask_light_factor()), Qt.SolidPattern)
+
+        self.background = {
+            KEYCAP_NORMAL: QBrush(button, Qt.SolidPattern),
+            KEYCAP_PRESSED: QBrush(highlight, Qt.SolidPattern),
+            KEYCAP_ON: QBrush(highlight.darker(150), Qt.SolidPattern),
+        }
+        self.foreground = {
+            KEYCAP_NORMAL: QBrush(button.lighter(120), Qt.SolidPattern),
+            KEYCAP_PRESSED: QBrush(highlight.lighter(120), Qt.SolidPattern),
+            KEYCAP_ON: QBrush(highlight.darker(120), Qt.SolidPattern),
+        }
+
+    @classmethod
+    def get(cls):
+        """ Returns the palette for the current theme, rebuilding it after Theme.set_theme """
+        if cls.cached is None or cls.cached.generation != Theme.generation:
+            cls.cached = RenderPalette()
+        return cls.cached
+
+
+def keycap_state(key):
+    if key.pressed:
+        return KEYCAP_PRESSED
+    if key.on:
+        return KEYCAP_ON
+    return KEYCAP_NORMAL
+
+
+def keycap_shape(geometry):
+    """ Everything that determines how a keycap looks regardless of where it is placed """
+    g = geometry
+    return (type(g).__name__, round(g.w, 3), round(g.h, 3), g.has2,
+            round(g.x2 - g.x, 3), round(g.y2 - g.y, 3), round(g.w2, 3), round(g.h2, 3))
+
+
+# (shape, scale, dpr, state, active, theme generation) -> QPixmapCache key, saves formatting it on every repaint
+cache_keys = dict()
+
+
+def keycap_cache_key(geometry, scale, dpr, state, active):
+    params = (geometry.shape, scale, dpr, state, active, Theme.generation)
+    cache_key = cache_keys.get(params)
+    if cache_key is None:
+        cache_key = cache_keys[params] = "vial-keycap:{}:{}:{}:{}:{}:{}".format(
+            geometry.shape, scale, dpr, state, int(active), Theme.generation)
+    return cache_key
+
+
+def keycap_pixmap(geometry, scale, dpr, state, active):
+    """
+    Returns the keycap background and foreground of a KeyGeometry pre-rendered at the given scale and
+    device pixel ratio, keys of the same shape share one pixmap
+    """
+    cache_key = keycap_cache_key(geometry, scale, dpr, state, active)
+    pixmap = QPixmapCache.find(cache_key)
+    if pixmap is not None:
+        return pixmap
+
+    palette = RenderPalette.get()
+    rect = geometry.background_draw_path.boundingRect()
+    pixmap = QPixmap(math.ceil(rect.width() * scale * dpr) + 2 * KEYCAP_PADDING,
+                     math.ceil(rect.height() * scale * dpr) + 2 * KEYCAP_PADDING)
+    pixmap.fill(Qt.transparent)
+
+    qp = QPainter(pixmap)
+    qp.setRenderHint(QPainter.Antialiasing)
+    qp.translate(KEYCAP_PADDING, KEYCAP_PADDING)
+    qp.scale(scale * dpr, scale * dpr)
+    qp.translate(-rect.x(), -rect.y())
+
+    # keycap background/drop-shadow
+    qp.setPen(palette.active_pen if active else Qt.NoPen)
+    qp.setBrush(palette.background[state])
+    qp.drawPath(geometry.background_draw_path)
+
+    # keycap foreground
+    qp.setPen(Qt.NoPen)
+    qp.setBrush(palette.foreground[state])
+    qp.drawPath(geometry.foreground_draw_path)
+    qp.end()
+
+    pixmap.setDevicePixelRatio(dpr)
+    QPixmapCache.insert(cache_key, pixmap)
+    return pixmap
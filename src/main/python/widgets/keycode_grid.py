@@ -0,0 +1,239 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import math
+
+from PyQt5.QtCore import Qt, QRect, QSize, QEvent, pyqtSignal
+from PyQt5.QtGui import QPainter, QPalette
+from PyQt5.QtWidgets import QWidget, QStyle, QStyleOptionButton, QSizePolicy, QToolTip
+
+from constants import KEYCODE_BTN_RATIO
+from keycodes.keycodes import Keycode
+from util import KeycodeDisplay
+
+
+class KeycodeCell:
+
+    """ What a palette shows for one keycode """
+
+    __slots__ = ["qmk_id", "label", "tooltip", "highlighted"]
+
+    def __init__(self, qmk_id, label, tooltip=None, highlighted=False):
+        self.qmk_id = qmk_id
+        self.label = label
+        self.tooltip = tooltip
+        # label comes from the keymap override
+        self.highlighted = highlighted
+
+
+class KeycodeModel:
+
+    """
+    Cells for every keycode list shown in a palette, one instance is shared by the keymap editor and the
+    tray. Everything is rebuilt lazily once keycodes are recreated or the keymap override changes
+    """
+
+    instance = None
+
+    def __init__(self):
+        self.generation = None
+        self.keymap_override = None
+        self.cells = dict()
+        self.filtered = dict()
+
+    @classmethod
+    def get(cls):
+        if cls.instance is None:
+            cls.instance = KeycodeModel()
+        return cls.instance
+
+    def check_stale(self):
+        if self.generation != Keycode.generation or self.keymap_override is not KeycodeDisplay.keymap_override:
+            self.generation = Keycode.generation
+            self.keymap_override = KeycodeDisplay.keymap_override
+            self.cells.clear()
+            self.filtered.clear()
+
+    def cell(self, keycode):
+        self.check_stale()
+        cell = self.cells.get(keycode.qmk_id)
+        if cell is None:
+            qmk_id = keycode.qmk_id
+            if qmk_id in self.keymap_override:
+                cell = KeycodeCell(qmk_id, self.keymap_override[qmk_id], Keycode.tooltip_for(qmk_id), True)
+            else:
+                cell = KeycodeCell(qmk_id, keycode.label, Keycode.tooltip_for(qmk_id))
+            self.cells[qmk_id] = cell
+        return cell
+
+    def cells_for(self, keycodes, keycode_filter):
+        """ Cells of the keycodes that pass keycode_filter, every palette showing this list gets the same cells """
+        self.check_stale()
+        key = (id(keycodes), keycode_filter)
+        entry = self.filtered.get(key)
+        # keep the list itself in the entry so its id can't be reused while cached
+        if entry is None or entry[0] is not keycodes:
+            entry = self.filtered[key] = (keycodes, [self.cell(kc) for kc in keycodes if keycode_filter(kc.qmk_id)])
+        return entry[1]
+
+
+class KeycodeCellView(QWidget):
+
+    """
+    Paints keycode cells the way the style paints push buttons, without a widget per keycode. Only cells
+    within the repainted area are drawn, subclasses decide where every cell goes
+    """
+
+    keycode_changed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+
+        self.cells = []
+        self.hovered = None
+        self.pressed = None
+        self.setMouseTracking(True)
+
+    def cell_size(self):
+        return int(round(self.fontMetrics().height() * KEYCODE_BTN_RATIO))
+
+    def spacing(self):
+        return self.style().pixelMetric(QStyle.PM_LayoutHorizontalSpacing)
+
+    def cell_rect(self, idx):
+        raise NotImplementedError
+
+    def cell_at(self, pos):
+        """ Index of the cell under pos or None """
+        raise NotImplementedError
+
+    def cells_in(self, rect):
+        """ Indices of the cells which may intersect rect """
+        raise NotImplementedError
+
+    def set_cells(self, cells):
+        self.cells = cells
+        self.hovered = self.pressed = None
+        self.updateGeometry()
+        self.update()
+
+    def update_cell(self, idx):
+        if idx is not None and idx < len(self.cells):
+            self.update(self.cell_rect(idx))
+
+    def paintEvent(self, e):
+        qp = QPainter(self)
+        style = self.style()
+        palette = self.palette()
+        highlight_palette = QPalette(palette)
+        highlight_palette.setColor(QPalette.ButtonText, palette.color(QPalette.Link))
+
+        option = QStyleOptionButton()
+        for idx in self.cells_in(e.rect()):
+            cell = self.cells[idx]
+            option.initFrom(self)
+            option.rect = self.cell_rect(idx)
+            option.state &= ~(QStyle.State_MouseOver | QStyle.State_HasFocus)
+            if idx == self.pressed and idx == self.hovered:
+                option.state |= QStyle.State_Sunken
+            else:
+                option.state |= QStyle.State_Raised
+            if idx == self.hovered:
+                option.state |= QStyle.State_MouseOver
+            style.drawControl(QStyle.CE_PushButtonBevel, option, qp, self)
+            style.drawItemText(qp, style.subElementRect(QStyle.SE_PushButtonContents, option, self),
+                               Qt.AlignCenter, highlight_palette if cell.highlighted else palette,
+                               self.isEnabled(), cell.label, QPalette.ButtonText)
+        qp.end()
+
+    def event(self, e):
+        if e.type() == QEvent.ToolTip:
+            idx = self.cell_at(e.pos())
+            if idx is not None and self.cells[idx].tooltip:
+                QToolTip.showText(e.globalPos(), self.cells[idx].tooltip, self, self.cell_rect(idx))
+            else:
+                QToolTip.hideText()
+                e.ignore()
+            return True
+        return super().event(e)
+
+    def mouseMoveEvent(self, e):
+        idx = self.cell_at(e.pos())
+        if idx != self.hovered:
+            self.update_cell(self.hovered)
+            self.hovered = idx
+            self.update_cell(idx)
+
+    def mousePressEvent(self, e):
+        if e.button() != Qt.LeftButton:
+            return
+        self.pressed = self.cell_at(e.pos())
+        self.update_cell(self.pressed)
+
+    def mouseReleaseEvent(self, e):
+        if e.button() != Qt.LeftButton or self.pressed is None:
+            return
+        pressed, self.pressed = self.pressed, None
+        self.update_cell(pressed)
+        # same as a push button, only a release over the pressed cell clicks it
+        if self.cell_at(e.pos()) == pressed:
+            self.keycode_changed.emit(self.cells[pressed].qmk_id)
+
+    def leaveEvent(self, e):
+        self.update_cell(self.hovered)
+        self.hovered = None
+
+
+class KeycodeGrid(KeycodeCellView):
+
+    """ Keycode cells wrapping from left to right like a FlowLayout of buttons """
+
+    def __init__(self):
+        super().__init__()
+
+        policy = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+        policy.setHeightForWidth(True)
+        self.setSizePolicy(policy)
+
+    def pitch(self):
+        return self.cell_size() + self.spacing()
+
+    def columns(self, width):
+        return max(1, (width + self.spacing()) // self.pitch())
+
+    def hasHeightForWidth(self):
+        return True
+
+    def heightForWidth(self, width):
+        rows = math.ceil(len(self.cells) / self.columns(width))
+        return max(rows * self.pitch() - self.spacing(), 0)
+
+    def sizeHint(self):
+        return QSize(self.cell_size(), self.heightForWidth(self.width()))
+
+    def minimumSizeHint(self):
+        size = self.cell_size() if self.cells else 0
+        return QSize(size, size)
+
+    def cell_rect(self, idx):
+        columns, pitch = self.columns(self.width()), self.pitch()
+        return QRect(idx % columns * pitch, idx // columns * pitch, self.cell_size(), self.cell_size())
+
+    def cell_at(self, pos):
+        columns, pitch = self.columns(self.width()), self.pitch()
+        if pos.x() < 0 or pos.y() < 0:
+            return None
+        col, row = pos.x() // pitch, pos.y() // pitch
+        idx = row * columns + col
+        # the gap between cells belongs to no cell
+        if col >= columns or idx >= len(self.cells) or not self.cell_rect(idx).contains(pos):
+            return None
+        return idx
+
+    def cells_in(self, rect):
+        columns, pitch = self.columns(self.width()), self.pitch()
+        first_col, last_col = max(rect.left() // pitch, 0), min(rect.right() // pitch, columns - 1)
+        for row in range(max(rect.top() // pitch, 0), rect.bottom() // pitch + 1):
+            for col in range(first_col, last_col + 1):
+                idx = row * columns + col
+                if idx >= len(self.cells):
+                    return
+                yield idx
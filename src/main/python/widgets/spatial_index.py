@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+import math
+from collections import defaultdict
+
+
+class SpatialGrid:
+
+    """
+    Uniform grid over the bounding rects of a list of items, point and rect queries return the
+    candidate items in their original order
+    """
+
+    def __init__(self, items, rects, cell_size):
+        self.items = list(items)
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+        for idx, rect in enumerate(rects):
+            for cell in self.cells_covering(rect.left(), rect.top(), rect.right(), rect.bottom()):
+                self.cells[cell].append(idx)
+
+    def cells_covering(self, x1, y1, x2, y2):
+        for cx in range(math.floor(x1 / self.cell_size), math.floor(x2 / self.cell_size) + 1):
+            for cy in range(math.floor(y1 / self.cell_size), math.floor(y2 / self.cell_size) + 1):
+                yield cx, cy
+
+    def query_point(self, x, y):
+        """ Items whose bounding rect may contain the point """
+        idx = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)), [])
+        return [self.items[i] for i in idx]
+
+    def query_rect(self, rect):
+        """ Items whose bounding rect may intersect the rect """
+        found = set()
+        for cell in self.cells_covering(rect.left(), rect.top(), rect.right(), rect.bottom()):
+            found.update(self.cells.get(cell, []))
+        return [self.items[i] for i in sorted(found)]
@@ -1,5 +1,5 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
-from PyQt5.QtWidgets import QTabWidget
+from PyQt5.QtWidgets import QTabWidget, QWidget, QVBoxLayout
 
 from tabbed_keycodes import TabbedKeycodes
 
@@ -15,3 +15,52 @@ class TabWidgetWithKeycodes(QTabWidget):
 
     def on_changed(self, index):
         TabbedKeycodes.close_tray()
+
+
+class LazyTabWidgetWithKeycodes(TabWidgetWithKeycodes):
+
+    """
+    Tab widget for editors with one page per entry. Pages are only built by factory(idx) when their tab
+    is shown for the first time, and built pages are kept to be reused when the tab count changes
+    """
+
+    def __init__(self, factory, label=str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory = factory
+        self.label = label
+        self.count_visible = 0
+        self.entries = []
+        self.placeholders = []
+        self.currentChanged.connect(self.on_current_changed)
+
+    def set_count(self, count):
+        self.blockSignals(True)
+        while self.count() > 0:
+            self.removeTab(0)
+        while len(self.placeholders) < count:
+            w = QWidget()
+            layout = QVBoxLayout()
+            layout.setContentsMargins(0, 0, 0, 0)
+            w.setLayout(layout)
+            self.placeholders.append(w)
+            self.entries.append(None)
+        self.count_visible = count
+        for x in range(count):
+            self.addTab(self.placeholders[x], self.label(x))
+        self.blockSignals(False)
+        self.on_current_changed(self.currentIndex())
+
+    def entry(self, idx):
+        """ Returns the entry for tab idx, building it if it wasn't shown yet """
+        if self.entries[idx] is None:
+            self.entries[idx] = self.factory(idx)
+            self.placeholders[idx].layout().addWidget(self.entries[idx].widget())
+        return self.entries[idx]
+
+    def built_entries(self):
+        """ Returns (idx, entry) for every entry that has been built among the current tabs """
+        return [(x, e) for x, e in enumerate(self.entries[:self.count_visible]) if e is not None]
+
+    def on_current_changed(self, index):
+        if 0 <= index < self.count_visible:
+            self.entry(index)
@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+from PyQt5.QtCore import QSize, Qt, QPointF
+from PyQt5.QtGui import QPainter, QPolygonF, QPen, QColor, QPalette
+from PyQt5.QtWidgets import QWidget, QApplication
+
+# seconds of history shown, newest sample on the right
+TELEMETRY_WINDOW = 3.0
+# travel is reported in 0.02mm units, 200 is fully pressed
+TELEMETRY_FULL_TRAVEL = 200
+
+CURVE_COLORS = [Qt.red, Qt.darkGreen, Qt.blue, Qt.darkMagenta, Qt.darkCyan, Qt.darkYellow]
+
+
+class TelemetryPlot(QWidget):
+
+    """ Scrolling travel plot of the keys sampled by a TelemetrySampler, with the APC drawn as a line """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sampler = None
+        self.keys = []
+        self.apc = None
+        self.window = TELEMETRY_WINDOW
+
+    def set_sampler(self, sampler):
+        self.sampler = sampler
+        self.update()
+
+    def set_keys(self, keys):
+        """ Plots these (row, col) keys, only the first few get a curve """
+        self.keys = list(keys)[:len(CURVE_COLORS)]
+        self.update()
+
+    def set_apc(self, apc):
+        self.apc = apc
+        self.update()
+
+    def sizeHint(self):
+        return QSize(300, 120)
+
+    def minimumSizeHint(self):
+        return QSize(150, 80)
+
+    def travel_y(self, travel):
+        return min(travel, TELEMETRY_FULL_TRAVEL) / TELEMETRY_FULL_TRAVEL * (self.height() - 1)
+
+    def paintEvent(self, event):
+        qp = QPainter()
+        qp.begin(self)
+        qp.setRenderHint(QPainter.Antialiasing)
+
+        palette = QApplication.palette()
+        qp.fillRect(self.rect(), palette.color(QPalette.Base))
+        qp.setPen(palette.color(QPalette.Mid))
+        qp.drawRect(0, 0, self.width() - 1, self.height() - 1)
+
+        if self.apc is not None:
+            pen = QPen(palette.color(QPalette.Highlight))
+            pen.setStyle(Qt.DashLine)
+            qp.setPen(pen)
+            y = self.travel_y(self.apc)
+            qp.drawLine(QPointF(0, y), QPointF(self.width(), y))
+
+        if self.sampler is not None:
+            start = self.sampler.clock() - self.window
+            scale_x = self.width() / self.window
+            for key, color in zip(self.keys, CURVE_COLORS):
+                times, _, travels = self.sampler.snapshot(key, start)
+                if len(times) < 2:
+                    continue
+                qp.setPen(QPen(QColor(color), 1.5))
+                qp.drawPolyline(QPolygonF([QPointF((t - start) * scale_x, self.travel_y(travel))
+                                           for t, travel in zip(times, travels)]))
+
+        qp.end()